@@ -1,27 +1,63 @@
 #main.py
+import asyncio
+import hashlib
+import json
 import logging
-from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException
+import os
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from typing import List
 import traceback
 
-# Interior models (existing)
-from services.boq_service import BOQService
-from services.wbs_service import WBSService
-from services.bom_service import BOMService
-from services.cost_service import CostService
-
-# Tank Cleaning models (new)
-from services.tank_boq_service import TankBOQService
-from services.tank_wbs_service import TankWBSService
-from services.tank_bom_service import TankBOMService
-from services.tank_cost_service import TankCostService
+# Interior and Tank Cleaning services are imported on first use (see services/registry.py)
+from services.registry import create_service, warm_up
+from services.hedging import hedge_stats
+from services.llm_client import single_flight_stats
+from services.model_router import cascade_stats
+from services.state_store import get_store
+from services.prefetch import iter_bom, iter_cost, run_wbs, schedule_prefetch
+from services.streaming import stream_estimate, stream_list
+from services.planner import plan_stage, within_budget
+from services.portfolio_service import PortfolioService
+from services.progress import TERMINAL, Cancelled, Job, cancel_job, job_state
+from services.project_store import STAGES, SOURCE_STAGE, ProjectNotFound, SnapshotNotFound, compute_stage, get_project_store
+from services.prompt_utils import compact_json
+from services.scheduler import scheduler_stats, tenant_id
+from services.verbosity import normalize_verbosity, result_key_extra
+from services.uploads import MAX_IMAGE_BYTES, MAX_UPLOAD_BYTES, UploadLimitMiddleware, UploadTooLarge, spool_upload
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="LogicLeap API")
+# LOGICLEAP_WARMUP: unset/0 = load services on first request, 1 = load in the background
+# after startup, "blocking" = load before accepting traffic
+WARMUP = os.getenv("LOGICLEAP_WARMUP", "0").lower()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP == "blocking":
+        await run_in_threadpool(warm_up)
+    elif WARMUP not in ("", "0", "false"):
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+
+app = FastAPI(title="LogicLeap API", lifespan=lifespan)
+
+BOQ_CACHE_TTL = float(os.getenv("LOGICLEAP_BOQ_CACHE_TTL", str(24 * 3600)))
+PROGRESS_POLL_SECONDS = 0.5
+# How long /progress waits for a request ID that has not started yet
+PROGRESS_WAIT_SECONDS = 30
+
+# Reject oversized uploads from Content-Length before the multipart body is parsed
+# (added before CORS so the 413 still carries CORS headers)
+app.add_middleware(UploadLimitMiddleware, paths=("/generate-boq",), max_bytes=MAX_UPLOAD_BYTES)
 
 # CORS Setup
 app.add_middleware(
@@ -31,50 +67,173 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+TANK_KEYWORDS = ["tank", "cleaning", "water", "septic", "sump", "overhead", "underground", "disinfect", "chlorination"]
+
+def detect_project_type(stage: str, rows: list) -> str:
+    """Tank Cleaning when the first row reads like tank work (Work for WBS/BOM input, Room/Material for cost)."""
+    if not rows:
+        return "Interior"
+    first = rows[0]
+    if stage == "cost":
+        keywords = TANK_KEYWORDS + ["sodium hypochlorite", "chlorine"]
+        texts = [(first.get("Room", "") or first.get("Tank/Area", "")).lower(), first.get("Material", "").lower()]
+    else:
+        keywords = TANK_KEYWORDS
+        texts = [first.get("Work", "").lower()]
+    return "Tank Cleaning" if any(k in text for text in texts for k in keywords) else "Interior"
+
 @app.get("/")
 def health_check():
     return {"status": "running", "message": "LogicLeap Backend is Online"}
 
+async def run_tracked(request: Request, stage: str, fn, *args):
+    """
+    Runs a service call in the threadpool as a job keyed by the X-Request-ID header, so
+    /progress can report batches done/total and cancel it. When the client disconnects,
+    the remaining batches are cancelled instead of spending quota on an abandoned job.
+    """
+    # Batches are scheduled fairly per tenant (API key) and per request; see services/scheduler.py
+    tenant = tenant_id(request.headers.get("x-gemini-api-key", ""))
+    job = Job(request.headers.get("x-request-id") or uuid.uuid4().hex, stage, tenant)
+
+    async def cancel_on_disconnect():
+        while not await request.is_disconnected():
+            await asyncio.sleep(PROGRESS_POLL_SECONDS)
+        logger.info(f"🔌 Client disconnected, cancelling {stage} {job.request_id}")
+        job.cancel()
+
+    watcher = asyncio.create_task(cancel_on_disconnect())
+    try:
+        return await run_in_threadpool(job.run, fn, *args)
+    except Cancelled:
+        # 499: client closed request (nginx convention); nobody is usually left to read it
+        raise HTTPException(status_code=499, detail=f"Request {job.request_id} cancelled")
+    finally:
+        watcher.cancel()
+
+@app.get("/progress/{request_id}")
+async def stream_progress(request_id: str, request: Request):
+    """Server-sent events carrying {stage, done, total, status} for a running request until it finishes."""
+    async def events():
+        last = None
+        deadline = time.time() + PROGRESS_WAIT_SECONDS
+        while not await request.is_disconnected():
+            state = await run_in_threadpool(job_state, request_id)
+            if state is None and time.time() > deadline:
+                yield f"data: {json.dumps({'request_id': request_id, 'status': 'unknown'})}\n\n"
+                return
+            if state is not None and state != last:
+                last = state
+                yield f"data: {json.dumps(state)}\n\n"
+                if state["status"] in TERMINAL:
+                    return
+            await asyncio.sleep(PROGRESS_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/progress/{request_id}/cancel")
+def cancel_request(request_id: str):
+    """Stops a running request at its next batch boundary (works from any worker)."""
+    cancel_job(request_id)
+    return {"request_id": request_id, "status": "cancelling"}
+
+@app.get("/metrics/llm")
+def llm_metrics():
+    return {
+        "single_flight": single_flight_stats(),
+        "cascade": cascade_stats(),
+        "latency": hedge_stats(),
+        "scheduler": scheduler_stats(),
+        "state_backend": type(get_store()).__name__,
+    }
+
 @app.post("/generate-boq")
 async def generate_boq(
+    response: Response,
     x_gemini_api_key: str = Header(...),
     x_gemini_model: str = Header("gemini-2.5-flash-lite"),
     project_name: str = Form(...),
     project_type: str = Form(...),
     location: str = Form(...),
     file: UploadFile = File(None),
-    text_input: str = Form(None)
+    text_input: str = Form(None),
+    prefetch: bool = Form(False),
+    city_tier: str = Form("T1"),
+    project_id: str = Form(None)
 ):
     try:
         logger.info(f"🚀 Starting BOQ Gen | Model: {x_gemini_model} | Project: {project_name} | Type: {project_type}")
+        if project_id:
+            # An unknown project is a 404 before the upload is read or the model is paid for
+            get_project_store().get_project(project_id)
         
         # Route to appropriate service based on project_type
-        if project_type.lower() == "tank cleaning":
-            service = TankBOQService(api_key=x_gemini_api_key, model_name=x_gemini_model)
-        else:  # Interior or default
-            service = BOQService(api_key=x_gemini_api_key, model_name=x_gemini_model)
+        pipeline = "Tank Cleaning" if project_type.lower() == "tank cleaning" else "Interior"
+        service = create_service(pipeline, "boq", x_gemini_api_key, x_gemini_model)
         
         context = {"project_name": project_name, "project_type": project_type, "location": location}
         
         content = ""
         image_parts = None
+        spooled = None
         if file:
-            file_bytes = await file.read()
-            if file.content_type.startswith("image"):
-                image_parts = [{"mime_type": file.content_type, "data": file_bytes}]
-            else:
-                content = service.extract_text(file_bytes, file.filename)
+            # Stream into a bounded spool while hashing; memory stays flat however large the upload is
+            spooled, digest, size = await spool_upload(file)
         elif text_input:
             content = text_input
+            digest = hashlib.sha256(text_input.encode("utf-8")).hexdigest()
         else:
             raise HTTPException(status_code=400, detail="No input provided (File or Text)")
+
+        # Same input + context + model -> reuse the earlier BOQ before any extraction or model call
+        cache_key = "boq:" + hashlib.sha256(
+            compact_json([digest, project_name, project_type, location, x_gemini_model]).encode("utf-8")
+        ).hexdigest()
+        result = get_store().get(cache_key)
+
+        try:
+            if result is not None:
+                logger.info("♻️ BOQ served from cache (identical input)")
+            else:
+                if spooled is not None:
+                    if file.content_type.startswith("image"):
+                        if size > MAX_IMAGE_BYTES:
+                            raise UploadTooLarge(MAX_IMAGE_BYTES)
+                        image_parts = [{"mime_type": file.content_type, "data": spooled.read()}]
+                    else:
+                        # Already tabulated BOQs map straight to rows; the model only reads what the headers can't explain
+                        result = await run_in_threadpool(service.from_tables, spooled, file.filename, context)
+                        if not result:
+                            spooled.seek(0)
+                            content = await run_in_threadpool(service.extract_text, spooled, file.filename)
+
+                if not result:
+                    # Run in the threadpool so concurrent requests overlap and identical LLM calls can coalesce
+                    result = await run_in_threadpool(service.process, content, context, image_parts)
+                if result:
+                    get_store().set(cache_key, result, ttl=BOQ_CACHE_TTL)
+        finally:
+            if spooled is not None:
+                spooled.close()
         
-        result = service.process(content, context, image_parts)
-        
+        if result and project_id:
+            # Keep the BOQ server-side; later steps can reference it by project/version
+            version = get_project_store().save_snapshot(project_id, "boq", result)
+            response.headers["X-Project-Version"] = str(version)
+
         if not result:
             logger.warning("⚠️ BOQ Generation returned empty list")
+        elif prefetch:
+            # Opt-in: use the user's review time to generate WBS/BOM/Cost for the unedited rows
+            schedule_prefetch(pipeline, result, x_gemini_api_key, x_gemini_model, city_tier)
             
         return result
+    except HTTPException:
+        raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ProjectNotFound as e:
+        raise HTTPException(status_code=404, detail=f"Project {e} not found")
     except Exception as e:
         logger.error(f"❌ Error in Generate BOQ: {str(e)}")
         traceback.print_exc()
@@ -82,7 +241,9 @@ async def generate_boq(
 
 @app.post("/generate-wbs")
 async def generate_wbs(
+    request: Request,
     request_data: List[dict],
+    verbosity: str = "full",
     x_gemini_api_key: str = Header(...),
     x_gemini_model: str = Header("gemini-2.5-flash-lite")
 ):
@@ -90,24 +251,18 @@ async def generate_wbs(
         logger.info(f"🚀 Starting WBS Gen | Model: {x_gemini_model}")
         
         # Auto-detect project_type from the BOQ data
-        project_type = "Interior"  # Default
-        if request_data and len(request_data) > 0:
-            # Check the Work field to determine project type
-            first_work = request_data[0].get("Work", "").lower()
-            # Tank cleaning keywords
-            tank_keywords = ["tank", "cleaning", "water", "septic", "sump", "overhead", "underground", "disinfect", "chlorination"]
-            if any(keyword in first_work for keyword in tank_keywords):
-                project_type = "Tank Cleaning"
-        
+        project_type = detect_project_type("wbs", request_data)
         logger.info(f"📊 Detected Project Type: {project_type}")
         
         # Route to appropriate service
-        if project_type == "Tank Cleaning":
-            service = TankWBSService(api_key=x_gemini_api_key, model_name=x_gemini_model)
-        else:
-            service = WBSService(api_key=x_gemini_api_key, model_name=x_gemini_model)
+        # full | compact | numbers: leaner levels skip narrative fields; expanded rows can be re-asked at full
+        level = normalize_verbosity(verbosity)
+        service = create_service(project_type, "wbs", x_gemini_api_key, x_gemini_model, verbosity=level)
         
-        return service.process(request_data)
+        # Rows unchanged since a prefetch (or an earlier run) come straight from the result cache
+        return await run_tracked(request, "wbs", run_wbs, service, request_data, *result_key_extra(x_gemini_model, level))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error in WBS: {str(e)}")
         traceback.print_exc()
@@ -115,6 +270,7 @@ async def generate_wbs(
 
 @app.post("/generate-bom")
 async def generate_bom(
+    request: Request,
     request_data: List[dict],
     x_gemini_api_key: str = Header(...),
     x_gemini_model: str = Header("gemini-2.5-flash-lite")
@@ -122,24 +278,18 @@ async def generate_bom(
     try:
         logger.info(f"🚀 Starting BOM Gen | Model: {x_gemini_model}")
         
-        # Auto-detect project_type from WBS data
-        project_type = "Interior"  # Default
-        if request_data and len(request_data) > 0:
-            first_work = request_data[0].get("Work", "").lower()
-            # Tank cleaning keywords
-            tank_keywords = ["tank", "cleaning", "water", "septic", "sump", "overhead", "underground", "disinfect", "chlorination"]
-            if any(keyword in first_work for keyword in tank_keywords):
-                project_type = "Tank Cleaning"
-        
+        # Auto-detect project_type from the WBS data
+        project_type = detect_project_type("bom", request_data)
         logger.info(f"📊 Detected Project Type: {project_type}")
         
         # Route to appropriate service
-        if project_type == "Tank Cleaning":
-            service = TankBOMService(api_key=x_gemini_api_key, model_name=x_gemini_model)
-        else:
-            service = BOMService(api_key=x_gemini_api_key, model_name=x_gemini_model)
+        service = create_service(project_type, "bom", x_gemini_api_key, x_gemini_model)
         
-        return service.process(request_data)
+        # Model calls run tracked; the exploded lines are then streamed out without being collected
+        lines = await run_tracked(request, "bom", iter_bom, service, request_data, x_gemini_model)
+        return StreamingResponse(stream_list(lines), media_type="application/json")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error in BOM: {str(e)}")
         traceback.print_exc()
@@ -147,37 +297,181 @@ async def generate_bom(
 
 @app.post("/generate-cost")
 async def generate_cost(
+    request: Request,
     request_data: List[dict],
     city_tier: str = "T1",
+    compare_tiers: bool = False,
+    verbosity: str = "full",
     x_gemini_api_key: str = Header(...),
     x_gemini_model: str = Header("gemini-2.5-flash-lite")
 ):
     try:
         logger.info(f"🚀 Starting Cost Gen | Model: {x_gemini_model}")
         
-        # Auto-detect project_type from BOM data
-        project_type = "Interior"  # Default
-        if request_data and len(request_data) > 0:
-            # Check both "Room" (Interior) and "Tank/Area" (Tank Cleaning) fields
-            first_location = request_data[0].get("Room", "") or request_data[0].get("Tank/Area", "")
-            first_material = request_data[0].get("Material", "").lower()
-            
-            # Tank cleaning keywords
-            tank_keywords = ["tank", "cleaning", "water", "septic", "sump", "overhead", "underground", "disinfect", "chlorination", "sodium hypochlorite", "chlorine"]
-            if any(keyword in first_location.lower() for keyword in tank_keywords) or \
-               any(keyword in first_material for keyword in tank_keywords):
-                project_type = "Tank Cleaning"
-        
+        # Auto-detect project_type from the BOM data
+        project_type = detect_project_type("cost", request_data)
         logger.info(f"📊 Detected Project Type: {project_type}")
         
         # Route to appropriate service
-        if project_type == "Tank Cleaning":
-            service = TankCostService(api_key=x_gemini_api_key, model_name=x_gemini_model)
-        else:
-            service = CostService(api_key=x_gemini_api_key, model_name=x_gemini_model)
+        level = normalize_verbosity(verbosity)
+        service = create_service(project_type, "cost", x_gemini_api_key, x_gemini_model, verbosity=level)
         
-        return service.process(request_data, city_tier)
+        if compare_tiers:
+            # T1/T2/T3 side by side from a single pricing pass
+            return await run_tracked(request, "cost", service.process_tiers, request_data)
+        lines = await run_tracked(request, "cost", iter_cost, service, request_data, city_tier, *result_key_extra(x_gemini_model, level))
+        # Totals are rolled up as the lines stream out, so the summary follows them
+        return StreamingResponse(stream_estimate(lines, service.rollup(city_tier)), media_type="application/json")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error in Cost: {str(e)}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/plan/{stage}")
+async def plan(
+    stage: str,
+    request_data: List[dict],
+    city_tier: str = "T1",
+    max_calls: int = None,
+    max_tokens: int = None,
+    max_seconds: float = None,
+    verbosity: str = "full",
+    x_gemini_api_key: str = Header(...),
+    x_gemini_model: str = Header("gemini-2.5-flash-lite")
+):
+    """
+    Dry run of /generate-{stage} on the same body: predicted LLM calls, tokens and wall time
+    after caches, plus whether it fits the optional budget. No model is called.
+    """
+    if stage not in ("wbs", "bom", "cost"):
+        raise HTTPException(status_code=400, detail="Stage must be one of wbs, bom, cost")
+    project_type = detect_project_type(stage, request_data)
+    options = {} if stage == "bom" else {"verbosity": normalize_verbosity(verbosity)}
+    service = create_service(project_type, stage, x_gemini_api_key, x_gemini_model, **options)
+    result = await run_in_threadpool(plan_stage, service, stage, request_data, x_gemini_model, city_tier if stage == "cost" else None)
+    result["project_type"] = project_type
+    result["within_budget"] = within_budget(result, max_calls, max_tokens, max_seconds)
+    return result
+
+@app.post("/generate-portfolio")
+async def generate_portfolio(
+    request_data: dict,
+    x_gemini_api_key: str = Header(...),
+    x_gemini_model: str = Header("gemini-2.5-flash-lite")
+):
+    """
+    Body: {"city_tier": "T1", "projects": [{"project_id": "...", "project_type": "Interior" | "Tank Cleaning", "boq": [...]}]}
+    Runs WBS, BOM and Cost once over the merged portfolio and returns per-project estimates plus the portfolio total.
+    """
+    try:
+        projects = request_data.get("projects") or []
+        if not projects:
+            raise HTTPException(status_code=400, detail="No projects provided")
+        logger.info(f"🚀 Starting Portfolio Gen | Model: {x_gemini_model} | Projects: {len(projects)}")
+        
+        service = PortfolioService(api_key=x_gemini_api_key, model_name=x_gemini_model)
+        return await run_in_threadpool(service.process, projects, request_data.get("city_tier", "T1"))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error in Portfolio: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- Server-side projects: versioned BOQ/WBS/BOM/Cost snapshots referenced by project/version ---
+
+def _check_stage(stage: str, stages=STAGES):
+    if stage not in stages:
+        raise HTTPException(status_code=400, detail=f"Unknown stage '{stage}' (expected one of: {', '.join(stages)})")
+
+@app.post("/projects")
+def create_project(request_data: dict):
+    """Body: {"name": "...", "project_type": "Interior" | "Tank Cleaning", "location": "...", "city_tier": "T1"}"""
+    return get_project_store().create_project(
+        name=request_data.get("name", "Untitled"),
+        project_type=request_data.get("project_type", "Interior"),
+        location=request_data.get("location", ""),
+        city_tier=request_data.get("city_tier", "T1"),
+    )
+
+@app.get("/projects/{project_id}")
+def get_project(project_id: str):
+    try:
+        return get_project_store().get_project(project_id)
+    except ProjectNotFound:
+        raise HTTPException(status_code=404, detail=f"Project {project_id} not found")
+
+@app.put("/projects/{project_id}/boq")
+def save_boq(project_id: str, request_data: List[dict]):
+    """Stores the user's edited BOQ as a new version."""
+    try:
+        version = get_project_store().save_snapshot(project_id, "boq", request_data)
+        return {"project_id": project_id, "stage": "boq", "version": version}
+    except ProjectNotFound:
+        raise HTTPException(status_code=404, detail=f"Project {project_id} not found")
+
+@app.get("/projects/{project_id}/{stage}")
+def get_snapshot(project_id: str, stage: str, version: int = None):
+    _check_stage(stage)
+    try:
+        return get_project_store().get_snapshot(project_id, stage, version)
+    except (ProjectNotFound, SnapshotNotFound) as e:
+        raise HTTPException(status_code=404, detail=f"Not found: {e}")
+
+@app.get("/projects/{project_id}/{stage}/versions")
+def list_versions(project_id: str, stage: str):
+    _check_stage(stage)
+    try:
+        return get_project_store().list_versions(project_id, stage)
+    except ProjectNotFound:
+        raise HTTPException(status_code=404, detail=f"Project {project_id} not found")
+
+@app.get("/projects/{project_id}/{stage}/diff")
+def diff_versions(project_id: str, stage: str, from_version: int, to_version: int = None):
+    _check_stage(stage)
+    try:
+        return get_project_store().diff(project_id, stage, from_version, to_version)
+    except (ProjectNotFound, SnapshotNotFound) as e:
+        raise HTTPException(status_code=404, detail=f"Not found: {e}")
+
+@app.post("/projects/{project_id}/{stage}")
+async def compute_project_stage(
+    request: Request,
+    project_id: str,
+    stage: str,
+    source_version: int = None,
+    city_tier: str = None,
+    x_gemini_api_key: str = Header(...),
+    x_gemini_model: str = Header("gemini-2.5-flash-lite")
+):
+    """
+    Computes WBS (from BOQ), BOM (from WBS) or Cost (from BOM) out of the stored source
+    snapshot (latest unless source_version is given) and saves the result as a new version.
+    Only rows that changed since the previous version of the stage are sent to the model.
+    """
+    _check_stage(stage, tuple(SOURCE_STAGE))
+    try:
+        logger.info(f"🚀 Project {project_id}: computing {stage} | Model: {x_gemini_model}")
+        return await run_tracked(
+            request, stage, compute_stage, project_id, stage, x_gemini_api_key, x_gemini_model, source_version, city_tier
+        )
+    except HTTPException:
+        raise
+    except (ProjectNotFound, SnapshotNotFound) as e:
+        raise HTTPException(status_code=404, detail=f"Not found: {e}")
+    except Exception as e:
+        logger.error(f"❌ Error in Project {stage}: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+if __name__ == "__main__":
+    import uvicorn
+    # Workers share rate limits, caches and prices through the state store (LOGICLEAP_STATE_BACKEND)
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("LOGICLEAP_WORKERS", str(os.cpu_count() or 1))),
+    )
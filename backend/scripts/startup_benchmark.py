@@ -0,0 +1,119 @@
+"""
+Cold-start benchmark for the API.
+
+Imports main.py in fresh interpreters (python -X importtime) and reports the
+median cold import time plus the import cost of each module, so regressions
+in startup time can be tracked over time.
+
+    cd backend && python scripts/startup_benchmark.py --runs 5 --top 15
+    cd backend && python scripts/startup_benchmark.py --json > startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules whose presence at startup we always want to see in the report
+TRACKED = ["main", "fastapi", "google.generativeai", "pdfplumber", "docx", "services.registry"]
+
+
+def import_profile(target: str) -> tuple:
+    """Returns (wall seconds, {module: (self_us, cumulative_us)}) for one cold import."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise SystemExit(f"import {target} failed:\n{proc.stderr[-2000:]}")
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if self_us.isdigit():
+            modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return wall, modules
+
+
+def warm_up_profile() -> dict:
+    code = "import json, main; from services.registry import warm_up; print(json.dumps(warm_up()))"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "warm-up failed"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to average over")
+    parser.add_argument("--top", type=int, default=15, help="modules to list by cumulative import time")
+    parser.add_argument("--target", default="main", help="module to import (default: main)")
+    parser.add_argument("--warm-up", action="store_true", help="also time services.registry.warm_up()")
+    parser.add_argument("--json", action="store_true", help="print a JSON report instead of a table")
+    args = parser.parse_args()
+
+    walls, runs = [], []
+    for _ in range(max(1, args.runs)):
+        wall, modules = import_profile(args.target)
+        walls.append(wall)
+        runs.append(modules)
+
+    names = set().union(*runs)
+    median = {
+        name: (
+            statistics.median(r[name][0] for r in runs if name in r),
+            statistics.median(r[name][1] for r in runs if name in r),
+        )
+        for name in names
+    }
+    ranked = sorted(median.items(), key=lambda kv: kv[1][1], reverse=True)
+
+    report = {
+        "target": args.target,
+        "runs": len(walls),
+        "cold_start_s": round(statistics.median(walls), 4),
+        "cold_start_min_s": round(min(walls), 4),
+        "modules_imported": len(names),
+        "tracked": {
+            name: (round(median[name][1] / 1e6, 4) if name in median else None)
+            for name in TRACKED
+        },
+        "top_modules": [
+            {"module": name, "self_s": round(s / 1e6, 4), "cumulative_s": round(c / 1e6, 4)}
+            for name, (s, c) in ranked[: args.top]
+        ],
+    }
+    if args.warm_up:
+        report["warm_up_s"] = warm_up_profile()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Cold import of '{args.target}': median {report['cold_start_s']:.3f}s, "
+          f"min {report['cold_start_min_s']:.3f}s over {report['runs']} run(s), {len(names)} modules")
+    print("\nTracked modules (cumulative import time at startup, '-' = not imported):")
+    for name, seconds in report["tracked"].items():
+        print(f"  {name:<28} {'-' if seconds is None else f'{seconds:.4f}s'}")
+    print(f"\nTop {args.top} modules by cumulative import time:")
+    print(f"  {'module':<44} {'self':>9} {'cumulative':>11}")
+    for row in report["top_modules"]:
+        print(f"  {row['module']:<44} {row['self_s']:>8.4f}s {row['cumulative_s']:>10.4f}s")
+    if args.warm_up:
+        print("\nWarm-up (seconds per module):")
+        for name, seconds in report["warm_up_s"].items():
+            print(f"  {name:<28} {seconds}")
+
+
+if __name__ == "__main__":
+    main()
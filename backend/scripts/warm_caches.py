@@ -0,0 +1,65 @@
+"""
+Off-peak cache warming for the WBS / BOM / Cost stages.
+
+Runs a catalogue of common work items (the built-in one in services/cache_warming.py,
+or a JSON file such as a saved /generate-boq response) through the same services the
+API uses, so WBS templates, per-tier prices and row results are cached before the
+first project of the day. Model calls are paced at --rps per API key.
+
+    cd backend && python scripts/warm_caches.py --api-key $GEMINI_API_KEY
+    cd backend && python scripts/warm_caches.py --catalogue boq.json --tiers T1,T2 --rps 0.5
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api-key", default=os.getenv("GEMINI_API_KEY", ""), help="provider API key (default: $GEMINI_API_KEY)")
+    parser.add_argument("--model", default="gemini-2.5-flash-lite", help="model the API requests will name")
+    parser.add_argument("--catalogue", help="JSON catalogue or list of BOQ rows (default: built-in catalogue)")
+    parser.add_argument("--project-type", choices=["Interior", "Tank Cleaning"], help="warm only this project type")
+    parser.add_argument("--tiers", default="T1,T2,T3", help="comma-separated city tiers to price")
+    parser.add_argument("--rps", type=float, help="model requests per second per API key (default: LOGICLEAP_LLM_RPS)")
+    parser.add_argument("--json", action="store_true", help="print a JSON report instead of a table")
+    args = parser.parse_args()
+
+    # Read by the services at import time, so it must be set before they load
+    if args.rps is not None:
+        os.environ["LOGICLEAP_LLM_RPS"] = str(args.rps)
+    sys.path.insert(0, BACKEND_DIR)
+    logging.basicConfig(level=logging.INFO)
+
+    from services.cache_warming import CATALOGUE, load_catalogue, warm
+    from services.llm_provider import provider_name_for
+
+    if not args.api_key and any(provider_name_for(s) == "gemini" for s in ("wbs", "bom", "cost")):
+        raise SystemExit("An API key is required (--api-key or $GEMINI_API_KEY)")
+
+    catalogue = load_catalogue(args.catalogue) if args.catalogue else CATALOGUE
+    if args.project_type:
+        catalogue = {args.project_type: catalogue.get(args.project_type, [])}
+    tiers = [t.strip() for t in args.tiers.split(",") if t.strip()]
+
+    start = time.perf_counter()
+    report = warm(catalogue, args.api_key or "offline", args.model, tiers)
+    total = round(time.perf_counter() - start, 2)
+
+    if args.json:
+        print(json.dumps({"total_s": total, "project_types": report}, indent=2))
+        return
+
+    print(f"\nWarmed {sum(r['rows'] for r in report.values())} rows in {total:.1f}s")
+    for project_type, timings in report.items():
+        steps = ", ".join(f"{k[:-2]} {v}s" for k, v in timings.items() if k.endswith("_s"))
+        print(f"  {project_type:<14} {timings['rows']:>3} rows  {steps}")
+
+
+if __name__ == "__main__":
+    main()
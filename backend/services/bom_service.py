@@ -1,109 +1,147 @@
-import google.generativeai as genai
-import json
-import time
 import logging
-import re
+from services.prompt_utils import compact_json
+from services.model_router import ModelCascade, is_number
+from services.llm_client import RateLimiter, generate_text
+from services import progress
+from services.streaming import intern_text
+from services.schemas import BOMLine, accepts, decode_list
 
 logger = logging.getLogger(__name__)
 
+
+def quantity_scale(row: dict, reference_qty) -> float:
+    """Row quantity relative to the quantity its BOM was generated for (1 when either is unknown)."""
+    try:
+        qty, reference = float(row.get("Quantity")), float(reference_qty)
+    except (TypeError, ValueError):
+        return 1.0
+    return qty / reference if qty > 0 and reference > 0 else 1.0
+
+
+def scale_materials(materials: list, scale: float) -> list:
+    if scale == 1.0:
+        return materials
+    return [
+        {**m, "quantity": round(m["quantity"] * scale, 2)} if is_number(m.get("quantity")) else m
+        for m in materials
+    ]
+
+
+SYSTEM_PROMPT = """Role: Senior Quantity Surveyor.
+Task: Calculate exact material quantities for the work item in ITEM.
+
+INPUT: ITEM is JSON {"w": work name, "d": quantity with unit, "m": procurement list from the WBS}.
+
+INSTRUCTIONS:
+1. Ignore empty "m" lists. INFER standard civil engineering materials for the work item "w".
+2. Apply 5% wastage for solids, 10% for liquids.
+3. Keep "note" brief (max 10 words). NO special characters or ellipses (...).
+
+OUTPUT: a JSON list of {"material", "quantity", "unit", "note"} objects."""
+
 class BOMService:
     def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite"):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
-        self.config = genai.types.GenerationConfig(
-            temperature=0.1,
-            max_output_tokens=8192,
-            response_mime_type="application/json"
-        )
+        self.cascade = ModelCascade("bom", api_key, model_name, SYSTEM_PROMPT)
+        self.model = self.cascade.model(0)
+        self.rate_limiter = RateLimiter(api_key)
+        self.config = {
+            "temperature": 0.1,
+            "max_output_tokens": 8192,
+            "response_mime_type": "application/json",
+            "response_schema": list[BOMLine],
+        }
         self.BATCH_SIZE = 10
 
-    def clean_and_parse_json(self, raw_text: str):
-        try:
-            text = raw_text.replace("```json", "").replace("```", "").strip()
-            text = re.sub(r',\s*\}', '}', text)
-            text = re.sub(r',\s*\]', ']', text)
-            return json.loads(text)
-        except json.JSONDecodeError:
-            try:
-                match = re.search(r'\[[\s\S]*\]', text)
-                if match: return json.loads(match.group(0))
-            except: pass
-        return []
-
-    def calculate_bom_batch(self, batch_items: list) -> dict:
+    def is_valid_bom(self, materials) -> bool:
+        return bool(materials) and isinstance(materials, list) and all(
+            isinstance(m, dict) and m.get("material") and is_number(m.get("quantity")) for m in materials
+        )
+
+    def batch_prompt(self, batch_items: list) -> str:
         item = batch_items[0]
-        prompt = f"""
-        Role: Senior Quantity Surveyor.
-        Task: Calculate exact material quantities for: "{item['work_name']}".
-        
-        INPUT DATA:
-        {json.dumps(item, indent=2)}
+        payload = {"w": item["work_name"], "d": item["dims"], "m": item["materials"]}
+        return f"ITEM:{compact_json(payload)}"
 
-        INSTRUCTIONS:
-        1. Ignore empty 'materials' lists. INFER standard civil engineering materials for "{item['work_name']}".
-        2. Apply 5% wastage for solids, 10% for liquids.
-        3. Keep "note" brief (max 10 words). NO special characters or ellipses (...).
-        
-        OUTPUT FORMAT:
-        Return ONLY a JSON LIST of objects. Do not wrap in a dictionary.
-        [
-            {{ "material": "string", "quantity": number, "unit": "string", "note": "string" }}
-        ]
-        """
+    def calculate_bom_batch(self, batch_items: list, model=None) -> dict:
+        prompt = self.batch_prompt(batch_items)
         try:
-            response = self.model.generate_content(prompt, generation_config=self.config)
-            return self.clean_and_parse_json(response.text)
+            raw_text = generate_text(model or self.model, prompt, self.config, self.rate_limiter, accepts(BOMLine))
+            return decode_list(BOMLine, raw_text)
         except Exception as e:
             logger.error(f"BOM Generation Error: {e}")
             return []
 
-    def process(self, wbs_data: list):
+    def batches(self, wbs_data: list) -> list:
         unique_tasks = {}
         for item in wbs_data:
             name = item.get("Work", "General")
             if name not in unique_tasks:
                 unique_tasks[name] = {
                     "dimensions": f"{item.get('Quantity')} {item.get('Unit')}",
+                    "quantity": item.get("Quantity"),
                     "materials": item.get("WBS_Procurement", []) 
                 }
         
-        task_list = [{"work_name": k, "dims": v["dimensions"], "materials": v["materials"]} for k, v in unique_tasks.items()]
-        
-        logger.info(f"📍 Generating BOM for {len(task_list)} unique work items...")
+        task_list = [{"work_name": k, "dims": v["dimensions"], "quantity": v["quantity"], "materials": v["materials"]} for k, v in unique_tasks.items()]
+        return [task_list[i : i + self.BATCH_SIZE] for i in range(0, len(task_list), self.BATCH_SIZE)]
+
+    def plan(self, wbs_data: list) -> list:
+        """The batches build_library() would send to the model, without sending them."""
+        return self.batches(wbs_data)
+
+    def build_library(self, wbs_data: list) -> dict:
+        """work name -> {"quantity": quantity the BOM was generated for, "materials": [...]}"""
+        batches = self.batches(wbs_data)
+        logger.info(f"📍 Generating BOM for {sum(len(b) for b in batches)} unique work items...")
 
         bom_library = {}
-        for i in range(0, len(task_list), self.BATCH_SIZE):
-            batch = task_list[i : i + self.BATCH_SIZE]
+        progress.begin(len(batches))
+        for batch in batches:
+            progress.checkpoint()
             
-            materials_list = self.calculate_bom_batch(batch)
+            materials_list = self.cascade.run(batch[:1], self.calculate_bom_batch, lambda raw, item: raw, self.is_valid_bom)[0]
             work_name = batch[0]['work_name']
             
-            if materials_list and isinstance(materials_list, list):
-                bom_library[work_name] = materials_list
-            else:
+            if not (materials_list and isinstance(materials_list, list)):
                 logger.warning(f"⚠️ Failed to generate BOM for {work_name}")
-                bom_library[work_name] = []
-            
-            time.sleep(1.0)
+                materials_list = []
+            bom_library[work_name] = {"quantity": batch[0]["quantity"], "materials": materials_list}
+            progress.advance()
+
+        return bom_library
 
-        final_bom = []
+    def explode_row(self, row: dict, bom_library: dict) -> list:
+        work_name = row.get("Work", "General")
+        entry = bom_library.get(work_name) or {}
+        # One BOM per work name (e.g. across a portfolio's projects), scaled to each row's size
+        materials = scale_materials(entry.get("materials", []), quantity_scale(row, entry.get("quantity")))
+        
+        if not materials:
+            materials = [{ "material": f"Standard Material for {work_name}", "quantity": 1, "unit": "LS", "note": "Estimated Lumpsum" }]
+
+        lines = []
+        for m in materials:
+            lines.append({
+                "Item No.": row.get("Item No."),
+                "Location": intern_text(row.get("State", "General")),
+                "Room": intern_text(row.get("Work", "N/A")),
+                "Material": intern_text(m.get("material")),
+                "Est_Quantity": m.get("quantity"),
+                "Unit": intern_text(m.get("unit")),
+                "Calculation_Basis": m.get("note")
+            })
+            if "Project" in row:
+                lines[-1]["Project"] = row["Project"]
+        return lines
+
+    def iter_lines(self, wbs_data, bom_library: dict):
+        """BOM lines row by row, exploded as they are consumed."""
         for row in wbs_data:
-            work_name = row.get("Work", "General")
-            materials = bom_library.get(work_name, [])
-            
-            if not materials:
-                materials = [{ "material": f"Standard Material for {work_name}", "quantity": 1, "unit": "LS", "note": "Estimated Lumpsum" }]
-
-            for m in materials:
-                final_bom.append({
-                    "Item No.": row.get("Item No."),
-                    "Location": row.get("State", "General"),
-                    "Room": row.get("Work", "N/A"),
-                    "Material": m.get("material"),
-                    "Est_Quantity": m.get("quantity"),
-                    "Unit": m.get("unit"),
-                    "Calculation_Basis": m.get("note")
-                })
+            yield from self.explode_row(row, bom_library)
+
+    def process(self, wbs_data: list):
+        bom_library = self.build_library(wbs_data)
+        final_bom = list(self.iter_lines(wbs_data, bom_library))
         
         logger.info(f"✅ BOM Complete. Total Material Lines: {len(final_bom)}")
         return final_bom
\ No newline at end of file
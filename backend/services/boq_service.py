@@ -1,37 +1,63 @@
-import google.generativeai as genai
-import json
 import logging
-import pdfplumber
-from docx import Document
 import io
+from services.llm_client import RateLimiter, generate_text
+from services.boq_tables import read_tables, rows_from_tables, table_text
+from services.model_router import ModelCascade, is_number
+from services.room_geometry import expand_rooms
+from services.schemas import BOQRow, RoomRow, accepts, decode_list
 
 logger = logging.getLogger(__name__)
 
 class BOQService:
     def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite"):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
-        self.generation_config = genai.types.GenerationConfig(
-            temperature=0.1,
-            max_output_tokens=8192,
-        )
+        self.cascade = ModelCascade("boq", api_key, model_name)
+        self.model = self.cascade.model(0)
+        self.rate_limiter = RateLimiter(api_key)
+        self.generation_config = {
+            "temperature": 0.1,
+            "max_output_tokens": 8192,
+            "response_mime_type": "application/json",
+            # Rooms only; the work package and quantities per room are derived locally (room_geometry)
+            "response_schema": list[RoomRow],
+        }
 
-    def extract_text(self, file_bytes: bytes, filename: str) -> str:
+    def extract_text(self, source, filename: str) -> str:
+        """source: raw bytes or a binary file object (e.g. the spooled upload), read in place"""
         try:
+            stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
             ext = filename.split('.')[-1].lower()
+            # Parsers are imported on first use; they dominate the import cost of the app
             if ext == "pdf":
-                with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+                import pdfplumber
+                with pdfplumber.open(stream) as pdf:
                     return "\n".join([p.extract_text() or "" for p in pdf.pages])
             elif ext == "docx":
-                doc = Document(io.BytesIO(file_bytes))
-                return "\n".join([p.text for p in doc.paragraphs])
+                from docx import Document
+                doc = Document(stream)
+                text = "\n".join([p.text for p in doc.paragraphs])
+                stream.seek(0)
+                return "\n\n".join(t for t in (text, table_text(read_tables(stream, filename))) if t)
+            elif ext in ("csv", "xlsx"):
+                return table_text(read_tables(stream, filename))
             elif ext == "txt":
-                return file_bytes.decode("utf-8")
+                return stream.read().decode("utf-8")
         except Exception as e:
             logger.error(f"File extraction failed: {e}")
             return ""
         return ""
 
+    def from_tables(self, source, filename: str, context: dict):
+        """
+        Rows read straight from an already tabulated BOQ (DOCX/PDF tables, CSV, XLSX),
+        or None when the columns can't be mapped confidently and the model should read it.
+        """
+        try:
+            tables = read_tables(source, filename)
+        except Exception as e:
+            logger.error(f"Table extraction failed: {e}")
+            return None
+        return rows_from_tables(tables, BOQRow, {"State": context.get("location", "")})
+
     def get_identification_prompt(self, context: dict) -> str:
         p_type = context.get('project_type', 'Interior')
         location = context.get('location', 'General')
@@ -47,18 +73,15 @@ class BOQService:
         PRE-TASK (IF NEEDED): If the input image/floor plan is too big or complex try thinking more and break it down into smaller sections for better analysis upscale and think to give the best possible output but follow the strict output format. 
 
         TASK:
-        1. COMPREHENSIVE IDENTIFICATION: For every room identified, generate a FULL PACKAGE of work.
-        2. STANDARD ITEMS TO INCLUDE (IF INTERIOR):
-           - Flooring (PU/Tiles/Marble)
-           - Skirting (matched to flooring)
-           - False Ceiling (Gypsum/Grid)
-           - Internal Wall Painting (Plastic Emulsion/Luster)
-           - Electrical Points (Switchboards/Wiring placeholders)
-           - Woodwork/Carpentry (Wardrobes, TV Units, or Paneling)
-           - Doors & Windows (Frames and Shutters)
-        
-        3. DIMENSIONS: Extract or infer Length and Width. If only area is given, derive L & W (e.g., 100 sqft -> 10x10).
-        4. TIER: Assign Tier (T1/T2/T3) based on city profile.
+        1. ROOM IDENTIFICATION: List every room with its dimensions. Do NOT list work items for them;
+           flooring, skirting, ceiling, painting, electrical points, woodwork and doors are derived from the rooms.
+        2. DIMENSIONS: Length, Width and (if shown) Height in FEET (metres x 3.281). If only area is given,
+           derive L & W (e.g., 100 sqft -> 10x10).
+        3. TYPE: living / dining / bedroom / study / kitchen / bathroom / utility / passage.
+        4. FINISHES: Flooring and Ceiling only when the input names them (e.g., "Marble", "Grid", "None").
+        5. OPENINGS: Doors and Windows counted on the plan (0 if not shown).
+        6. EXTRAS: Work the input lists for a room beyond the standard package, with its stated Quantity and Unit.
+        7. TIER: Assign Tier (T1/T2/T3) based on city profile.
         
         STRICT DOMAIN GUARDRAIL:
         - Ignore all road, highway, or external infrastructure data. 
@@ -67,39 +90,45 @@ class BOQService:
         STRICT OUTPUT SCHEMA (JSON LIST ONLY):
         [
           {{
-            "Item No.": integer,
-            "Work": "string (Room Name + Specific Work, e.g., Master Bedroom Plastic Emulsion Painting)",
+            "Room": "string (e.g., Master Bedroom)",
+            "Type": "string",
             "State": "string",
             "Tier": "string",
             "Length": number,
             "Width": number,
-            "Quantity": number,
-            "Unit": "string"
+            "Height": number,
+            "Doors": integer,
+            "Windows": integer,
+            "Flooring": "string",
+            "Ceiling": "string",
+            "Extras": [{{"Work": "string", "Quantity": number, "Unit": "string"}}]
           }}
         ]
         """
 
+    def is_valid_boq(self, rows) -> bool:
+        return bool(rows) and isinstance(rows, list) and all(
+            isinstance(r, dict) and r.get("Work") and is_number(r.get("Quantity")) for r in rows
+        )
+
+    def identify(self, sys_prompt: str, content: str, image_parts, model=None, location: str = "") -> list:
+        model = model or self.model
+        if image_parts:
+            raw_text = generate_text(model, [image_parts[0], sys_prompt], self.generation_config, self.rate_limiter, accepts(RoomRow))
+        else:
+            raw_text = generate_text(model, f"{sys_prompt}\n\nINPUT DATA:\n{content}", self.generation_config, self.rate_limiter, accepts(RoomRow))
+        return expand_rooms(decode_list(RoomRow, raw_text), location)
+
     def process(self, content: str, context: dict, image_parts=None):
         sys_prompt = self.get_identification_prompt(context)
         
-        try:
-            logger.info("Sending request to Gemini...")
-            if image_parts:
-                response = self.model.generate_content([image_parts[0], sys_prompt], generation_config=self.generation_config)
-            else:
-                response = self.model.generate_content(f"{sys_prompt}\n\nINPUT DATA:\n{content}", generation_config=self.generation_config)
-
-            raw_text = response.text.replace("```json", "").replace("```", "").strip()
-            
-            start = raw_text.find("[")
-            end = raw_text.rfind("]") + 1
-            
-            if start == -1 or end == 0:
-                logger.error(f"Invalid JSON received from AI: {raw_text[:100]}...")
+        def attempt(_, model):
+            try:
+                return self.identify(sys_prompt, content, image_parts, model, context.get("location", ""))
+            except Exception as e:
+                logger.error(f"❌ Identification Error: {e}")
                 return []
-            
-            json_str = raw_text[start:end]
-            return json.loads(json_str)
-        except Exception as e:
-            logger.error(f"❌ Identification Error: {e}")
-            return []
\ No newline at end of file
+
+        logger.info("Sending request to Gemini...")
+        # Escalate the whole identification to a stronger model only when the cheap one returns unusable rows
+        return self.cascade.run([content], attempt, lambda raw, _: raw, self.is_valid_boq)[0] or []
@@ -0,0 +1,154 @@
+import csv
+import io
+import logging
+import re
+from pydantic import ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Header cells recognised for each BOQ field, fields taken in this order ("Item No" before "Item").
+# A header matches an alias exactly or starts with it ("Quantity (sqm)", "Length in m"); each field
+# takes the column matching its earliest alias, so "Description" beats "Item Code" for Work.
+HEADER_ALIASES = [
+    ("Item No.", ("item no", "s no", "sl no", "sr no", "serial no", "no")),
+    ("Tank_Type", ("tank type", "type")),
+    ("Capacity", ("capacity", "volume")),
+    ("Work", ("description", "item description", "description of work", "particulars", "work", "scope of work", "item", "name", "tank")),
+    ("Length", ("length", "len", "l")),
+    ("Width", ("width", "breadth", "w", "b")),
+    ("Height", ("height", "depth", "h", "d")),
+    ("Quantity", ("quantity", "qty", "total qty", "total quantity", "area", "nos")),
+    ("Unit", ("unit", "uom", "units")),
+]
+# Header words that mark a numbering/code column, which is never the Work column
+CODE_HEADER_WORDS = {"code", "no", "sr", "sl", "number", "ref"}
+HEADER_SCAN_ROWS = 5
+# Share of data rows that must map cleanly before the model is skipped
+MIN_PARSED_SHARE = 0.9
+
+# "4.1.2", "A-12", "BOQ/07": item codes rather than work descriptions
+_CODE = re.compile(r"^[a-zA-Z]{0,4}[-./]?\d[\w./-]*$")
+_QUANTITY = re.compile(r"^\s*([-+]?\d[\d,]*(?:\.\d+)?)\s*([a-zA-Z][a-zA-Z. ]*)?\s*$")
+
+
+def _norm(cell) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", str(cell or "").lower()).strip()
+
+
+def read_tables(source, filename: str) -> list:
+    """Every table in a DOCX / PDF / CSV / XLSX upload as lists of string rows ([] for other types)."""
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    ext = filename.split('.')[-1].lower()
+    if ext == "csv":
+        return [list(csv.reader(stream.read().decode("utf-8-sig").splitlines()))]
+    if ext == "xlsx":
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            logger.warning("openpyxl is not installed; XLSX uploads go to the model as empty text")
+            return []
+        book = load_workbook(stream, read_only=True, data_only=True)
+        return [
+            [["" if v is None else str(v) for v in row] for row in sheet.iter_rows(values_only=True)]
+            for sheet in book.worksheets
+        ]
+    if ext == "docx":
+        from docx import Document
+        return [[[cell.text for cell in row.cells] for row in table.rows] for table in Document(stream).tables]
+    if ext == "pdf":
+        import pdfplumber
+        with pdfplumber.open(stream) as pdf:
+            return [
+                [["" if cell is None else str(cell) for cell in row] for row in table]
+                for page in pdf.pages
+                for table in page.extract_tables()
+            ]
+    return []
+
+
+def table_text(tables: list) -> str:
+    """Tables as tab-separated lines, so the model still sees them when the fast path declines."""
+    return "\n\n".join("\n".join("\t".join(c.strip() for c in row) for row in table) for table in tables)
+
+
+def map_header(row: list, fields) -> dict:
+    """Header row -> {field: (column, unit given in the header)} for the fields wanted."""
+    headers = [_norm(cell) for cell in row]
+    mapping, taken = {}, set()
+    for field, aliases in HEADER_ALIASES:
+        if field not in fields:
+            continue
+        best = None
+        for col, text in enumerate(headers):
+            if col in taken or (field == "Work" and CODE_HEADER_WORDS & set(text.split())):
+                continue
+            rank = next((i for i, a in enumerate(aliases) if text == a or text.startswith(a + " ")), None)
+            if rank is not None and (best is None or rank < best[0]):
+                best = (rank, col, text[len(aliases[rank]):].replace(" in ", " ").strip())
+        if best is not None:
+            mapping[field] = best[1:]
+            taken.add(best[1])
+    return mapping
+
+
+def _codes(table: list, col: int) -> bool:
+    """Whether the values under a Work header are mostly item codes or bare numbers."""
+    values = [str(row[col]).strip() for row in table if col < len(row) and str(row[col] or "").strip()]
+    return bool(values) and sum(bool(_CODE.match(v)) for v in values) * 2 > len(values)
+
+
+def _number(cell):
+    match = _QUANTITY.match(str(cell or "").replace(",", ""))
+    if not match:
+        return None, ""
+    return float(match.group(1)), (match.group(2) or "").strip()
+
+
+def rows_from_tables(tables: list, model, defaults: dict = None):
+    """
+    BOQ rows (validated against model, e.g. BOQRow) from the tables whose header maps at least
+    Work and Quantity. Returns None unless at least MIN_PARSED_SHARE of the data rows parse,
+    in which case the caller falls back to the model.
+    """
+    fields = set(model.model_fields) | {f.alias for f in model.model_fields.values() if f.alias}
+    rows, rejected = [], 0
+    for table in tables:
+        header_at, mapping = None, {}
+        for i, row in enumerate(table[:HEADER_SCAN_ROWS]):
+            mapping = map_header(row, fields)
+            if "Work" in mapping and "Quantity" in mapping:
+                header_at = i
+                break
+        if header_at is None:
+            continue
+        if _codes(table[header_at + 1:], mapping["Work"][0]):
+            logger.info("📋 Table skipped: its Work column holds item codes, not descriptions")
+            continue
+        for row in table[header_at + 1:]:
+            cells = {field: row[col] if col < len(row) else "" for field, (col, _) in mapping.items()}
+            work = str(cells["Work"] or "").strip()
+            filled = [c for c in row if str(c or "").strip()]
+            if not work or len(filled) <= 1 or _norm(work).split(" ")[-1] == "total":
+                # Blank lines, section headings ("A. LIVING ROOM") and totals are not work items
+                continue
+            qty, qty_unit = _number(cells["Quantity"])
+            unit = str(cells.get("Unit") or "").strip() or qty_unit or mapping["Quantity"][1]
+            if qty is None or not unit:
+                rejected += 1
+                continue
+            item = {**(defaults or {}), "Item No.": len(rows) + 1, "Work": work, "Quantity": qty, "Unit": unit}
+            for field in ("Length", "Width", "Height", "Capacity"):
+                if field in cells:
+                    item[field] = _number(cells[field])[0] or 0.0
+            if "Tank_Type" in cells:
+                item["Tank_Type"] = str(cells["Tank_Type"] or "").strip()
+            try:
+                rows.append(model.model_validate(item).model_dump(by_alias=True))
+            except ValidationError:
+                rejected += 1
+    if not rows or len(rows) / (len(rows) + rejected) < MIN_PARSED_SHARE:
+        if rows or rejected:
+            logger.info(f"📋 Table fast path declined: {len(rows)} rows mapped, {rejected} unreadable")
+        return None
+    logger.info(f"📋 Table fast path: {len(rows)} BOQ rows mapped from {len(tables)} tables without a model call")
+    return rows
@@ -0,0 +1,96 @@
+import copy
+import json
+import logging
+import time
+from services.prefetch import run_bom, run_cost, run_wbs
+from services.registry import pipeline_classes
+from services.scheduler import BULK, flow, tenant_id
+from services.tank_tiers import expand_service_tiers
+from services.tier_pricing import TIERS
+
+logger = logging.getLogger(__name__)
+
+# Items the BOQ services emit for most projects, in their output shape. Warming these fills
+# the WBS templates (reused at any quantity), the per-tier price library and the result caches.
+CATALOGUE = {
+    "Interior": [
+        {"Work": "Living Room Vitrified Tile Flooring", "Length": 15, "Width": 12, "Quantity": 180, "Unit": "sqft"},
+        {"Work": "Living Room Skirting", "Length": 54, "Width": 0, "Quantity": 54, "Unit": "rft"},
+        {"Work": "Living Room Gypsum False Ceiling", "Length": 15, "Width": 12, "Quantity": 180, "Unit": "sqft"},
+        {"Work": "Living Room Plastic Emulsion Painting", "Length": 15, "Width": 12, "Quantity": 540, "Unit": "sqft"},
+        {"Work": "Living Room Electrical Points", "Length": 0, "Width": 0, "Quantity": 12, "Unit": "points"},
+        {"Work": "Living Room TV Unit", "Length": 8, "Width": 7, "Quantity": 56, "Unit": "sqft"},
+        {"Work": "Master Bedroom Wooden Laminate Flooring", "Length": 14, "Width": 12, "Quantity": 168, "Unit": "sqft"},
+        {"Work": "Master Bedroom Wardrobe", "Length": 8, "Width": 7, "Quantity": 56, "Unit": "sqft"},
+        {"Work": "Master Bedroom Flush Door with Frame", "Length": 3, "Width": 7, "Quantity": 1, "Unit": "nos"},
+        {"Work": "Kitchen Anti-skid Tile Flooring", "Length": 10, "Width": 8, "Quantity": 80, "Unit": "sqft"},
+        {"Work": "Kitchen Modular Cabinets", "Length": 10, "Width": 2, "Quantity": 20, "Unit": "rft"},
+        {"Work": "Kitchen Wall Dado Tiling", "Length": 10, "Width": 2, "Quantity": 40, "Unit": "sqft"},
+        {"Work": "Bathroom Waterproofing", "Length": 8, "Width": 5, "Quantity": 40, "Unit": "sqft"},
+        {"Work": "Bathroom Grid False Ceiling", "Length": 8, "Width": 5, "Quantity": 40, "Unit": "sqft"},
+    ],
+    "Tank Cleaning": [
+        {"Work": "Overhead Water Tank 1000L", "Tank_Type": "Overhead", "Capacity": 1000, "Length": 1.2, "Width": 1.0, "Height": 1.0, "Quantity": 6.6, "Unit": "sqm"},
+        {"Work": "Underground Water Tank 10000L", "Tank_Type": "Underground", "Capacity": 10000, "Length": 2.5, "Width": 2.0, "Height": 2.0, "Quantity": 23.0, "Unit": "sqm"},
+        {"Work": "Sump 5000L", "Tank_Type": "Sump", "Capacity": 5000, "Length": 2.0, "Width": 1.5, "Height": 1.7, "Quantity": 14.9, "Unit": "sqm"},
+        {"Work": "Septic Tank 3000L", "Tank_Type": "Septic", "Capacity": 3000, "Length": 2.0, "Width": 1.0, "Height": 1.5, "Quantity": 11.0, "Unit": "sqm"},
+    ],
+}
+
+
+def boq_rows(project_type: str, items: list, state: str = "General") -> list:
+    """Catalogue items -> rows exactly as the project type's BOQ service returns them."""
+    rows = []
+    for i, item in enumerate(items, start=1):
+        row = {"Item No.": i, "State": state, "Tier": "", "Length": 0.0, "Width": 0.0, **copy.deepcopy(item)}
+        rows.append(row)
+    return expand_service_tiers(rows) if project_type == "Tank Cleaning" else rows
+
+
+def load_catalogue(path: str) -> dict:
+    """
+    A JSON catalogue: {"Interior": [...], "Tank Cleaning": [...]}, or a plain list of BOQ rows
+    (e.g. a saved /generate-boq response), split by whether rows carry a Tank_Type.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return {k: v for k, v in data.items() if k in CATALOGUE}
+    catalogue = {"Interior": [], "Tank Cleaning": []}
+    for row in data:
+        catalogue["Tank Cleaning" if row.get("Tank_Type") else "Interior"].append(row)
+    return catalogue
+
+
+def warm(catalogue: dict, api_key: str, model_name: str, tiers=TIERS) -> dict:
+    """
+    Runs each project type's catalogue through the same WBS / BOM / Cost services and
+    result cache as the API (run_wbs/run_bom/run_cost, keyed by model), pricing once per tier.
+    Model calls are paced by the services' own rate limiter. Returns seconds spent per step.
+    """
+    report = {}
+    with flow(tenant_id(api_key), "warm", BULK):
+        for project_type, items in catalogue.items():
+            if not items:
+                continue
+            wbs_cls, bom_cls, cost_cls = pipeline_classes(project_type)
+            rows = boq_rows(project_type, items)
+            timings = {"rows": len(rows)}
+
+            start = time.perf_counter()
+            wbs_data = run_wbs(wbs_cls(api_key=api_key, model_name=model_name), rows, model_name)
+            timings["wbs_s"] = round(time.perf_counter() - start, 2)
+
+            start = time.perf_counter()
+            bom_data = run_bom(bom_cls(api_key=api_key, model_name=model_name), wbs_data, model_name)
+            timings["bom_s"] = round(time.perf_counter() - start, 2)
+
+            cost_service = cost_cls(api_key=api_key, model_name=model_name)
+            for tier in tiers:
+                start = time.perf_counter()
+                run_cost(cost_service, bom_data, tier, model_name)
+                timings[f"cost_{tier}_s"] = round(time.perf_counter() - start, 2)
+
+            logger.info(f"🔥 Warmed {project_type}: {timings}")
+            report[project_type] = timings
+    return report
@@ -1,68 +1,76 @@
-import google.generativeai as genai
-import json
-import time
 import logging
-import re
+from services.prompt_utils import compact_json
+from services.model_router import ModelCascade, is_number
+from services.llm_client import RateLimiter, generate_text
+from services import progress
+from services.schemas import CompactRate, NumbersRate, Rate, accepts, decode_keyed
+from services.verbosity import DEFAULT_LEVEL, normalize_verbosity
+from services.streaming import CostRollup, intern_text
+from services.price_library import PriceLibrary
+from services.rate_index import get_rate_index
+from services.tier_pricing import INTERIOR_TIER_FACTORS, TIERS, multi_tier_estimate
 
 logger = logging.getLogger(__name__)
 
+PROMPT_BODY = """Role: Senior Cost Consultant (QS).
+Location Context: India, city tier given as TIER (T1/T2/T3).
+Task: Provide a detailed material and labor cost estimate.
+
+MARKET BENCHMARKS (2026 BASELINE):
+- Use CPWD DSR 2024 as base + 15% inflation for 2026.
+- Material Rates must include transport to site.
+- Labor Rates should reflect the TIER market (Daily wage / Productivity sqft).
+
+INPUT: BOM is a JSON list of {"m": material name, "u": unit, "q": quantity}.
+
+"""
+OUTPUT_INTRO = 'OUTPUT: Return a JSON list with one object per input material; set "m" to the exact input "m" value:\n'
+# Output contract per verbosity level (the model is not asked for fields a level drops)
+OUTPUT_CONTRACTS = {
+    "full": """[{"m": "Material Name", "rate_material": number (market rate per unit), "rate_labor": number (labor/installation rate per unit), "subtotal": number ((rate_material + rate_labor) * quantity), "remarks": "string (brief justification, e.g. 'Premium Acrylic Paint rate')"}]""",
+    "compact": """[{"m": "Material Name", "rate_material": number (market rate per unit), "rate_labor": number (labor/installation rate per unit), "remarks": "string (max 4 words)"}]""",
+    "numbers": """[{"m": "Material Name", "rate_material": number (market rate per unit), "rate_labor": number (labor/installation rate per unit)}]""",
+}
+SYSTEM_PROMPTS = {level: PROMPT_BODY + OUTPUT_INTRO + contract for level, contract in OUTPUT_CONTRACTS.items()}
+RESPONSE_MODELS = {"full": Rate, "compact": CompactRate, "numbers": NumbersRate}
+
 class CostService:
-    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite"):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
-        self.config = genai.types.GenerationConfig(
-            temperature=0.0,
-            response_mime_type="application/json"
-        )
+    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite", verbosity: str = DEFAULT_LEVEL):
+        self.verbosity = normalize_verbosity(verbosity)
+        self.response_model = RESPONSE_MODELS[self.verbosity]
+        self.cascade = ModelCascade("cost", api_key, model_name, SYSTEM_PROMPTS[self.verbosity])
+        self.model = self.cascade.model(0)
+        self.rate_limiter = RateLimiter(api_key)
+        self.price_cache = PriceLibrary("interior", self.verbosity)
+        self.rate_index = get_rate_index()
+        self.config = {
+            "temperature": 0.0,
+            "response_mime_type": "application/json",
+            "response_schema": list[self.response_model],
+        }
         self.BATCH_SIZE = 25
 
-    def clean_json(self, raw_text: str):
-        try:
-            text = raw_text.replace("```json", "").replace("```", "").strip()
-            return json.loads(text)
-        except:
-            return {}
+    def is_valid_pricing(self, pricing) -> bool:
+        if not isinstance(pricing, dict):
+            return False
+        mat_rate, lab_rate = pricing.get("rate_material"), pricing.get("rate_labor")
+        return is_number(mat_rate) and is_number(lab_rate) and mat_rate >= 0 and lab_rate >= 0 and (mat_rate + lab_rate) > 0
 
-    def estimate_costs_batch(self, batch_items: list, city_tier: str) -> dict:
-        prompt = f"""
-        Role: Senior Cost Consultant (QS).
-        Location Context: India, {city_tier} City.
-        Task: Provide a detailed material and labor cost estimate.
-
-        MARKET BENCHMARKS (2026 BASELINE):
-        - Use CPWD DSR 2024 as base + 15% inflation for 2026.
-        - Material Rates must include transport to site.
-        - Labor Rates should reflect {city_tier} market (Daily wage / Productivity sqft).
-
-        INPUT BOM:
-        {json.dumps(batch_items)}
-
-        OUTPUT REQUIREMENTS:
-        Return a JSON object where each key is the 'Material' name from the input.
-        Provide: 
-        1. mat_rate: Market rate per unit.
-        2. lab_rate: Labor/Installation rate per unit.
-        3. total_item_cost: (mat_rate + lab_rate) * quantity.
-        4. logic: Brief justification (e.g., 'Premium Acrylic Paint rate').
-
-        OUTPUT FORMAT:
-        {{
-          "Material Name": {{
-            "rate_material": number,
-            "rate_labor": number,
-            "subtotal": number,
-            "remarks": "string"
-          }}
-        }}
-        """
+    def batch_prompt(self, batch_items: list, city_tier: str) -> str:
+        payload = [{"m": item["material"], "u": item["unit"], "q": item["qty"]} for item in batch_items]
+        return f"TIER:{city_tier}\nBOM:{compact_json(payload)}"
+
+    def estimate_costs_batch(self, batch_items: list, city_tier: str, model=None) -> dict:
+        prompt = self.batch_prompt(batch_items, city_tier)
         try:
-            response = self.model.generate_content(prompt, generation_config=self.config)
-            return self.clean_json(response.text)
+            raw_text = generate_text(model or self.model, prompt, self.config, self.rate_limiter, accepts(self.response_model))
+            return decode_keyed(self.response_model, "m", raw_text)
         except Exception as e:
             logger.error(f"Cost Batch Error: {e}")
             return {}
 
-    def process(self, bom_data: list, city_tier: str):
+    def known_prices(self, bom_data: list, city_tier: str):
+        """(known prices, unique materials still needing the model, how many prices came from the DSR index)"""
         material_catalog = {}
         for item in bom_data:
             mat_name = item.get("Material")
@@ -75,40 +83,95 @@ class CostService:
         
         unique_mats = list(material_catalog.values())
         price_library = {}
+        unpriced = []
+        indexed = 0
+        for mat in unique_mats:
+            # DSR items are priced locally; only materials the index cannot match reach the model
+            pricing = self.rate_index.price(mat["material"], mat["unit"], city_tier, self.tier_factors(mat["material"], city_tier))
+            if pricing is not None:
+                indexed += 1
+            else:
+                pricing = self.price_cache.get(city_tier, mat["material"], mat["unit"])
+            if pricing is not None:
+                price_library[mat["material"]] = pricing
+            else:
+                unpriced.append(mat)
+
+        return price_library, unpriced, indexed
+
+    def batches(self, unpriced: list) -> list:
+        return [unpriced[i : i + self.BATCH_SIZE] for i in range(0, len(unpriced), self.BATCH_SIZE)]
+
+    def plan(self, bom_data: list, city_tier: str) -> list:
+        """The batches build_price_library() would send to the model, without sending them."""
+        return self.batches(self.known_prices(bom_data, city_tier)[1])
+
+    def build_price_library(self, bom_data: list, city_tier: str) -> dict:
+        price_library, unpriced, indexed = self.known_prices(bom_data, city_tier)
+        logger.info(f"💰 Pricing {len(unpriced)} new materials ({indexed} from the DSR index, {len(price_library) - indexed} from shared price library)...")
+        batches = self.batches(unpriced)
+        progress.begin(len(batches))
+        for batch in batches:
+            progress.checkpoint()
+            results = self.cascade.run(
+                batch,
+                lambda items, model: self.estimate_costs_batch(items, city_tier, model),
+                lambda raw, mat: raw.get(mat["material"]) if isinstance(raw, dict) else None,
+                self.is_valid_pricing,
+            )
+            for mat, pricing in zip(batch, results):
+                if isinstance(pricing, dict):
+                    price_library[mat["material"]] = pricing
+                    # Only usable rates are shared; one that failed every tier is asked again next time
+                    if self.is_valid_pricing(pricing):
+                        self.price_cache.put(city_tier, mat["material"], mat["unit"], pricing)
+            progress.advance()
+
+        return price_library
+
+    def price_row(self, row: dict, price_library: dict) -> dict:
+        mat_name = row.get("Material")
+        pricing = price_library.get(mat_name, {"rate_material": 0, "rate_labor": 0, "remarks": "Pricing Unavailable"})
         
-        logger.info(f"💰 Pricing {len(unique_mats)} unique materials...")
-
-        for i in range(0, len(unique_mats), self.BATCH_SIZE):
-            batch = unique_mats[i : i + self.BATCH_SIZE]
-            results = self.estimate_costs_batch(batch, city_tier)
-            if results: price_library.update(results)
-            time.sleep(1)
-
-        final_estimate = []
-        grand_total = 0
-
-        for row in bom_data:
-            mat_name = row.get("Material")
-            pricing = price_library.get(mat_name, {"rate_material": 0, "rate_labor": 0, "remarks": "Pricing Unavailable"})
-            
-            qty = float(row.get("Est_Quantity", 0))
-            mat_rate = pricing.get("rate_material", 0)
-            lab_rate = pricing.get("rate_labor", 0)
-            item_total = (mat_rate + lab_rate) * qty
-            grand_total += item_total
-
-            final_estimate.append({
-                "Room": row.get("Room"),
-                "Material": mat_name,
-                "Qty": qty,
-                "Unit": row.get("Unit"),
-                "Rate_Mat": mat_rate,
-                "Rate_Lab": lab_rate,
-                "Subtotal": round(item_total, 2),
-                "Source": pricing.get("remarks")
-            })
-
-        return {
-            "project_summary": { "city_tier": city_tier, "total_cost": round(grand_total, 2), "currency": "INR" },
-            "line_items": final_estimate
-        }
\ No newline at end of file
+        qty = float(row.get("Est_Quantity", 0))
+        mat_rate = pricing.get("rate_material", 0)
+        lab_rate = pricing.get("rate_labor", 0)
+        item_total = (mat_rate + lab_rate) * qty
+
+        line = {
+            "Room": intern_text(row.get("Room")),
+            "Material": intern_text(mat_name),
+            "Qty": qty,
+            "Unit": intern_text(row.get("Unit")),
+            "Rate_Mat": mat_rate,
+            "Rate_Lab": lab_rate,
+            "Subtotal": round(item_total, 2),
+            "Source": pricing.get("remarks")
+        }
+        if "Project" in row:
+            line["Project"] = row["Project"]
+        return line
+
+    def iter_priced(self, bom_data, price_library: dict):
+        """Priced lines, computed as they are consumed."""
+        return (self.price_row(row, price_library) for row in bom_data)
+
+    def rollup(self, city_tier: str) -> CostRollup:
+        return CostRollup(city_tier)
+
+    def summarize(self, line_items: list, city_tier: str) -> dict:
+        rollup = self.rollup(city_tier)
+        for line in line_items:
+            rollup.add(line)
+        return {"project_summary": rollup.summary(), "line_items": line_items}
+
+    def tier_factors(self, material: str, tier: str) -> tuple:
+        return INTERIOR_TIER_FACTORS.get(tier, (1.0, 1.0))
+
+    def process(self, bom_data: list, city_tier: str):
+        price_library = self.build_price_library(bom_data, city_tier)
+        return self.summarize(list(self.iter_priced(bom_data, price_library)), city_tier)
+
+    def process_tiers(self, bom_data: list, tiers=TIERS) -> dict:
+        """All tier estimates from one pricing pass (see tier_pricing.multi_tier_estimate)."""
+        return multi_tier_estimate(self, bom_data, tiers)
@@ -0,0 +1,156 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# Off by default. LOGICLEAP_HEDGE=1 sends a duplicate of any model call still running after the
+# stage's observed p90 latency; the first answer wins. LOGICLEAP_HEDGE_MODEL_<STAGE> sends the
+# duplicate to another model instead (e.g. a faster one).
+HEDGE_ENABLED = os.getenv("LOGICLEAP_HEDGE", "0") == "1"
+HEDGE_QUANTILE = float(os.getenv("LOGICLEAP_HEDGE_QUANTILE", "0.9"))
+# At most this share of calls may be duplicated, which bounds the extra spend
+HEDGE_MAX_RATE = float(os.getenv("LOGICLEAP_HEDGE_MAX_RATE", "0.05"))
+# Latency history needed before the quantile is trusted
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 500
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+
+def quantile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class StageLatency:
+    """
+    Rolling latency history of one stage. served: what callers waited; primary: how long the
+    first request took (recorded when it finishes, even after a hedge won), which is the
+    latency callers would have seen without hedging.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.served = deque(maxlen=LATENCY_WINDOW)
+        self.primary = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def threshold(self):
+        with self.lock:
+            if len(self.served) < HEDGE_MIN_SAMPLES:
+                return None
+            return quantile(self.served, HEDGE_QUANTILE)
+
+    def may_hedge(self) -> bool:
+        with self.lock:
+            if self.hedged + 1 > HEDGE_MAX_RATE * self.calls:
+                return False
+            self.hedged += 1
+            return True
+
+    def record(self, served: float, hedge_won: bool = False):
+        with self.lock:
+            self.calls += 1
+            self.served.append(served)
+            if hedge_won:
+                self.hedge_wins += 1
+
+    def record_primary(self, elapsed: float):
+        with self.lock:
+            self.primary.append(elapsed)
+
+    def typical(self):
+        """Median served latency, or None before any call was seen."""
+        with self.lock:
+            return quantile(self.served, 0.5) if self.served else None
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "hedge_rate": round(self.hedged / self.calls, 3) if self.calls else 0.0,
+                "p90_s": round(quantile(self.served, 0.9), 2),
+                "p99_s": round(quantile(self.served, 0.99), 2),
+                "p99_unhedged_s": round(quantile(self.primary, 0.99), 2),
+            }
+
+
+_stages = {}
+_stages_lock = threading.Lock()
+
+
+def stage_latency(stage: str) -> StageLatency:
+    with _stages_lock:
+        if stage not in _stages:
+            _stages[stage] = StageLatency()
+        return _stages[stage]
+
+
+def hedge_model(model):
+    alternate = os.getenv(f"LOGICLEAP_HEDGE_MODEL_{(model.stage or '').upper()}")
+    if not alternate or alternate == model.model_name:
+        return model
+    return model.provider.bind(alternate, model.system_instruction, model.stage)
+
+
+def hedged_generate(model, contents, generation_config: dict, rate_limiter=None) -> str:
+    """
+    model.generate with optional hedging. A duplicate that loses the race is abandoned: its
+    answer is dropped (a blocking provider call can't be interrupted, but it is no longer waited on).
+    """
+    latency = stage_latency(model.stage or "default")
+    threshold = latency.threshold() if HEDGE_ENABLED else None
+    start = time.time()
+    if threshold is None:
+        text = model.generate(contents, generation_config)
+        elapsed = time.time() - start
+        latency.record(elapsed)
+        latency.record_primary(elapsed)
+        return text
+
+    primary = _executor.submit(model.generate, contents, generation_config)
+    primary.add_done_callback(lambda _: latency.record_primary(time.time() - start))
+    done, _ = wait([primary], timeout=threshold)
+    if done or not latency.may_hedge():
+        text = primary.result()
+        latency.record(time.time() - start)
+        return text
+
+    alternate = hedge_model(model)
+    logger.info(f"🏁 {model.stage}: no answer after {threshold:.1f}s (p{int(HEDGE_QUANTILE * 100)}), hedging with {alternate.model_name}")
+
+    def duplicate():
+        if rate_limiter:
+            rate_limiter.wait()
+        return alternate.generate(contents, generation_config)
+
+    hedge = _executor.submit(duplicate)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+                continue
+            for loser in pending:
+                loser.cancel()
+            latency.record(time.time() - start, hedge_won=future is hedge)
+            return future.result()
+    raise error
+
+
+def hedge_stats() -> dict:
+    with _stages_lock:
+        stages = dict(_stages)
+    return {stage: latency.stats() for stage, latency in stages.items()}
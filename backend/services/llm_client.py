@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from services.hedging import hedged_generate
+from services.scheduler import tenant_id
+from services.state_store import get_store
+
+logger = logging.getLogger(__name__)
+
+# Upstream pacing per API key, shared by every worker through the state store
+LLM_RPS = float(os.getenv("LOGICLEAP_LLM_RPS", "1"))
+RESPONSE_CACHE_TTL = float(os.getenv("LOGICLEAP_RESPONSE_CACHE_TTL", str(24 * 3600)))
+LEASE_TTL = 120
+
+
+class RateLimiter:
+    """Books evenly spaced call slots per API key; replaces the per-process time.sleep(1) pacing."""
+
+    def __init__(self, api_key: str, rps: float = LLM_RPS):
+        self.key = "rate:" + tenant_id(api_key)
+        self.interval = 1.0 / rps if rps > 0 else 0
+
+    def wait(self):
+        if not self.interval:
+            return
+        delay = get_store().reserve_slot(self.key, self.interval) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Merges concurrent calls that share a key into one execution.
+    The first caller runs the function; every caller that arrives while it is
+    in flight blocks and receives the same result (or the same exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {"executed": 0, "coalesced": 0}
+
+    def do(self, key: str, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.stats["executed"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.waiters:
+                logger.info(f"🔗 Coalesced {call.waiters} duplicate LLM call(s) into one request")
+        return call.result
+
+
+_single_flight = SingleFlight()
+
+
+def prompt_fingerprint(model, contents, generation_config) -> str:
+    """Stable hash over everything that determines the model's answer."""
+    h = hashlib.sha256()
+    for part in model.fingerprint_parts():
+        h.update(str(part).encode("utf-8"))
+    h.update(repr(generation_config).encode("utf-8"))
+    parts = contents if isinstance(contents, list) else [contents]
+    for part in parts:
+        if isinstance(part, dict):
+            h.update(str(part.get("mime_type", "")).encode("utf-8"))
+            data = part.get("data", b"")
+            h.update(data if isinstance(data, bytes) else str(data).encode("utf-8"))
+        else:
+            h.update(str(part).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _call_upstream(key: str, model, contents, generation_config, rate_limiter, accept) -> str:
+    store = get_store()
+    lease_key = f"lease:{key}"
+    leased = store.add(lease_key, os.getpid(), ttl=LEASE_TTL)
+    if not leased:
+        # Another worker is running this exact call; wait for its result instead of paying twice
+        deadline = time.time() + LEASE_TTL
+        while time.time() < deadline:
+            time.sleep(0.25)
+            cached = store.get(f"llm:{key}")
+            if cached is not None:
+                return cached
+            if store.get(lease_key) is None:
+                break
+    try:
+        if rate_limiter:
+            rate_limiter.wait()
+        text = hedged_generate(model, contents, generation_config, rate_limiter)
+        # A malformed or truncated reply is never cached: an identical retry must reach the model again
+        if text and RESPONSE_CACHE_TTL > 0 and (accept is None or accept(text)):
+            store.set(f"llm:{key}", text, ttl=RESPONSE_CACHE_TTL)
+        return text
+    finally:
+        # A worker that stopped waiting runs without the lease; the lease is still the other worker's
+        if leased:
+            store.delete(lease_key)
+
+
+def generate_text(model, contents, generation_config, rate_limiter: RateLimiter = None, accept=None) -> str:
+    """
+    Single entry point for model calls from the services; model is a ModelHandle
+    from services.llm_provider, so the backend behind it is interchangeable.
+    Answers come from the shared response cache when possible; identical calls
+    already in flight (same model, instructions, config and prompt) share one
+    upstream request, within this process and across workers. accept(text) -> bool
+    is the stage decoder's verdict; only accepted replies are cached.
+    """
+    key = prompt_fingerprint(model, contents, generation_config)
+    cached = get_store().get(f"llm:{key}")
+    if cached is not None:
+        return cached
+    return _single_flight.do(
+        key,
+        lambda: _call_upstream(key, model, contents, generation_config, rate_limiter, accept),
+    )
+
+
+def single_flight_stats() -> dict:
+    return dict(_single_flight.stats)
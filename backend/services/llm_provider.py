@@ -0,0 +1,287 @@
+import abc
+import asyncio
+import base64
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# gemini (default) | local (CPU model behind an Ollama-compatible HTTP API) | rules (deterministic, offline)
+# LOGICLEAP_PROVIDER sets the default; LOGICLEAP_PROVIDER_<STAGE> (BOQ/WBS/BOM/COST) overrides one stage.
+DEFAULT_PROVIDER = os.getenv("LOGICLEAP_PROVIDER", "gemini")
+
+# Context caching is on by default; set LOGICLEAP_CONTEXT_CACHE=0 to rely on system instructions only.
+CONTEXT_CACHE_ENABLED = os.getenv("LOGICLEAP_CONTEXT_CACHE", "1") != "0"
+CONTEXT_CACHE_TTL_MINUTES = int(os.getenv("LOGICLEAP_CONTEXT_CACHE_TTL", "60"))
+
+LOCAL_LLM_URL = os.getenv("LOGICLEAP_LOCAL_LLM_URL", "http://localhost:11434")
+LOCAL_LLM_MODEL = os.getenv("LOGICLEAP_LOCAL_LLM_MODEL", "llama3.2:3b")
+LOCAL_LLM_TIMEOUT = float(os.getenv("LOGICLEAP_LOCAL_LLM_TIMEOUT", "300"))
+
+
+_json_schemas = {}
+
+
+def json_schema(response_schema) -> dict:
+    """JSON schema for a response_schema type such as list[WBSEntry] (pydantic)."""
+    if response_schema not in _json_schemas:
+        from pydantic import TypeAdapter
+        _json_schemas[response_schema] = TypeAdapter(response_schema).json_schema()
+    return _json_schemas[response_schema]
+
+
+def gemini_schema(schema: dict, defs: dict = None) -> dict:
+    """JSON schema -> the OpenAPI subset Gemini accepts (refs inlined; no titles or defaults)."""
+    defs = schema.get("$defs", {}) if defs is None else defs
+    if "$ref" in schema:
+        return gemini_schema(defs[schema["$ref"].split("/")[-1]], defs)
+    if "anyOf" in schema:
+        options = [s for s in schema["anyOf"] if s.get("type") != "null"]
+        return {**gemini_schema(options[0], defs), "nullable": True}
+    out = {"type": schema["type"]}
+    for key in ("description", "enum", "format"):
+        if key in schema:
+            out[key] = schema[key]
+    if "items" in schema:
+        out["items"] = gemini_schema(schema["items"], defs)
+    if "properties" in schema:
+        out["properties"] = {name: gemini_schema(prop, defs) for name, prop in schema["properties"].items()}
+        out["required"] = list(schema.get("required", []))
+    return out
+
+
+class ModelHandle:
+    """A model bound to a provider, a stage and (optionally) static system instructions."""
+
+    def __init__(self, provider, model_name: str, system_instruction: str = None, stage: str = None):
+        self.provider = provider
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.stage = stage
+
+    def fingerprint_parts(self):
+        return (self.provider.name, self.model_name, self.system_instruction or "")
+
+    def generate(self, contents, generation_config: dict) -> str:
+        return self.provider.generate(self, contents, generation_config)
+
+    async def agenerate(self, contents, generation_config: dict) -> str:
+        return await self.provider.agenerate(self, contents, generation_config)
+
+
+class LLMProvider(abc.ABC):
+    """
+    Interface the services depend on. generation_config is a plain dict
+    (temperature, max_output_tokens, response_mime_type, response_schema); a
+    response_schema is a type such as list[BOMLine] that each provider translates.
+    """
+
+    name = "base"
+
+    def bind(self, model_name: str, system_instruction: str = None, stage: str = None) -> ModelHandle:
+        return ModelHandle(self, model_name, system_instruction, stage)
+
+    @abc.abstractmethod
+    def generate(self, handle: ModelHandle, contents, generation_config: dict) -> str:
+        ...
+
+    async def agenerate(self, handle: ModelHandle, contents, generation_config: dict) -> str:
+        return await asyncio.to_thread(self.generate, handle, contents, generation_config)
+
+    def generate_batch(self, handle: ModelHandle, prompts: list, generation_config: dict, max_workers: int = 4) -> list:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(lambda p: self.generate(handle, p, generation_config), prompts))
+
+
+class GeminiClients:
+    """
+    SDK clients bound to one API key, plus that key's context caches. The SDK's module-level
+    genai.configure() is never used: it is process-wide, so concurrent requests from different
+    tenants would run (and create context caches) under whichever key was configured last.
+    """
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.lock = threading.Lock()
+        self.clients = {}
+        # grpc.aio channels belong to the event loop that created them: one async client per loop
+        self.async_clients = weakref.WeakKeyDictionary()
+        # fingerprint -> (CachedContent, expires_at); fingerprints the provider refused to cache
+        self.context_caches = {}
+        self.uncacheable = set()
+
+    def client(self, kind: str):
+        """kind: "GenerativeService" or "CacheService"."""
+        with self.lock:
+            if kind not in self.clients:
+                from google.ai import generativelanguage as glm
+                self.clients[kind] = getattr(glm, f"{kind}Client")(client_options={"api_key": self.api_key})
+            return self.clients[kind]
+
+    def async_client(self):
+        """GenerativeServiceAsyncClient for the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if loop not in self.async_clients:
+                from google.ai import generativelanguage as glm
+                self.async_clients[loop] = glm.GenerativeServiceAsyncClient(client_options={"api_key": self.api_key})
+            return self.async_clients[loop]
+
+
+_gemini_clients = {}
+_gemini_clients_lock = threading.Lock()
+
+
+def gemini_clients(api_key: str) -> GeminiClients:
+    key = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+    with _gemini_clients_lock:
+        if key not in _gemini_clients:
+            _gemini_clients[key] = GeminiClients(api_key)
+        return _gemini_clients[key]
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, api_key: str):
+        import google.generativeai as genai
+        self.genai = genai
+        self.clients = gemini_clients(api_key)
+
+    def _bind(self, model):
+        # GenerativeModel falls back to the process-wide default client only while these are unset
+        model._client = self.clients.client("GenerativeService")
+        return model
+
+    def _context_cache(self, handle: ModelHandle):
+        protos = self.genai.protos
+        ttl = datetime.timedelta(minutes=CONTEXT_CACHE_TTL_MINUTES)
+        request = protos.CreateCachedContentRequest(cached_content=protos.CachedContent(
+            model=f"models/{handle.model_name}",
+            system_instruction=protos.Content(parts=[protos.Part(text=handle.system_instruction)]),
+            ttl=ttl,
+        ))
+        cache = self.clients.client("CacheService").create_cached_content(request)
+        return cache, ttl
+
+    def _model(self, handle: ModelHandle):
+        """
+        Static instructions live outside the per-batch prompt: an explicit context cache
+        when the model accepts one, otherwise a plain system instruction (which still
+        gives a stable prefix for implicit caching).
+        """
+        genai = self.genai
+        if not handle.system_instruction:
+            return self._bind(genai.GenerativeModel(handle.model_name))
+        if CONTEXT_CACHE_ENABLED:
+            fp = hashlib.sha256(f"{handle.model_name}|{handle.system_instruction}".encode("utf-8")).hexdigest()
+            caches = self.clients.context_caches
+            if fp not in self.clients.uncacheable:
+                cached = caches.get(fp)
+                if cached and cached[1] > time.time():
+                    return self._bind(genai.GenerativeModel.from_cached_content(cached_content=cached[0]))
+                try:
+                    cache, ttl = self._context_cache(handle)
+                    # Refresh a minute early so we never hand out an expired cache
+                    caches[fp] = (cache, time.time() + ttl.total_seconds() - 60)
+                    logger.info(f"🧊 Context cache created for {handle.model_name}")
+                    return self._bind(genai.GenerativeModel.from_cached_content(cached_content=cache))
+                except Exception as e:
+                    # Usually: prompt below the model's minimum cacheable size, or model without caching
+                    logger.info(f"Context cache unavailable for {handle.model_name}, using system instruction ({e})")
+                    self.clients.uncacheable.add(fp)
+        return self._bind(genai.GenerativeModel(handle.model_name, system_instruction=handle.system_instruction))
+
+    def _config(self, generation_config: dict) -> dict:
+        if generation_config.get("response_schema") is None:
+            return generation_config
+        return {**generation_config, "response_schema": gemini_schema(json_schema(generation_config["response_schema"]))}
+
+    def generate(self, handle, contents, generation_config):
+        return self._model(handle).generate_content(contents, generation_config=self._config(generation_config)).text
+
+    async def agenerate(self, handle, contents, generation_config):
+        model = self._model(handle)
+        model._async_client = self.clients.async_client()
+        response = await model.generate_content_async(contents, generation_config=self._config(generation_config))
+        return response.text
+
+
+class LocalHTTPProvider(LLMProvider):
+    """CPU-run model served by Ollama (or any server exposing its /api/chat endpoint)."""
+
+    name = "local"
+
+    def __init__(self, base_url: str = LOCAL_LLM_URL, model_name: str = LOCAL_LLM_MODEL):
+        self.base_url = base_url.rstrip("/")
+        self.local_model = model_name
+
+    def generate(self, handle, contents, generation_config):
+        parts = contents if isinstance(contents, list) else [contents]
+        text = "\n\n".join(p for p in parts if isinstance(p, str))
+        images = [base64.b64encode(p["data"]).decode("ascii") for p in parts if isinstance(p, dict) and "data" in p]
+
+        messages = []
+        if handle.system_instruction:
+            messages.append({"role": "system", "content": handle.system_instruction})
+        user = {"role": "user", "content": text}
+        if images:
+            user["images"] = images
+        messages.append(user)
+
+        body = {
+            "model": self.local_model,
+            "messages": messages,
+            "stream": False,
+            "options": {"temperature": generation_config.get("temperature", 0.1)},
+        }
+        if generation_config.get("max_output_tokens"):
+            body["options"]["num_predict"] = generation_config["max_output_tokens"]
+        if generation_config.get("response_schema") is not None:
+            body["format"] = json_schema(generation_config["response_schema"])
+        elif generation_config.get("response_mime_type") == "application/json":
+            body["format"] = "json"
+
+        request = urllib.request.Request(
+            f"{self.base_url}/api/chat",
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=LOCAL_LLM_TIMEOUT) as response:
+            return json.loads(response.read())["message"]["content"]
+
+
+class RuleProvider(LLMProvider):
+    """Deterministic offline rule engine answering the stage prompts without any model."""
+
+    name = "rules"
+
+    def generate(self, handle, contents, generation_config):
+        from services.rule_engine import answer
+        prompt = contents if isinstance(contents, str) else "\n".join(p for p in contents if isinstance(p, str))
+        return answer(handle.stage, prompt)
+
+
+def provider_name_for(stage: str) -> str:
+    return os.getenv(f"LOGICLEAP_PROVIDER_{(stage or '').upper()}", DEFAULT_PROVIDER)
+
+
+def get_provider(stage: str, api_key: str) -> LLMProvider:
+    name = provider_name_for(stage)
+    if name == "local":
+        return LocalHTTPProvider()
+    if name == "rules":
+        return RuleProvider()
+    return GeminiProvider(api_key)
+
+
+def bind_model(stage: str, api_key: str, model_name: str, system_instruction: str = None) -> ModelHandle:
+    return get_provider(stage, api_key).bind(model_name, system_instruction, stage)
@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+from services import progress
+from services.llm_provider import get_provider
+
+logger = logging.getLogger(__name__)
+
+# Default escalation target for each cheap model; override a stage's whole cascade with
+# LOGICLEAP_CASCADE_<STAGE>="gemini-2.5-flash-lite,gemini-2.5-flash" (cheapest first).
+STRONGER_MODEL = {
+    "gemini-2.5-flash-lite": "gemini-2.5-flash",
+    "gemini-2.5-flash": "gemini-2.5-pro",
+}
+# Escalation targets billed at a premium; the default cascades only reach them with
+# LOGICLEAP_CASCADE_PREMIUM=1 (an explicit LOGICLEAP_CASCADE_<STAGE> may still list them)
+PREMIUM_MODELS = {"gemini-2.5-pro"}
+ALLOW_PREMIUM = os.getenv("LOGICLEAP_CASCADE_PREMIUM", "0").lower() in ("1", "true", "yes")
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def cascade_for(stage: str, model_name: str) -> list:
+    configured = os.getenv(f"LOGICLEAP_CASCADE_{stage.upper()}")
+    if configured:
+        return [m.strip() for m in configured.split(",") if m.strip()]
+    models = [model_name]
+    stronger = STRONGER_MODEL.get(model_name)
+    if stronger and (ALLOW_PREMIUM or stronger not in PREMIUM_MODELS):
+        models.append(stronger)
+    return models
+
+
+def _record(stage: str, model_name: str, failed: int, escalated: bool):
+    with _stats_lock:
+        s = _stats.setdefault(stage, {"items": 0, "escalated": 0, "calls": {}})
+        s["calls"][model_name] = s["calls"].get(model_name, 0) + 1
+        if escalated:
+            s["escalated"] += failed
+
+
+def _count_items(stage: str, items: int):
+    with _stats_lock:
+        s = _stats.setdefault(stage, {"items": 0, "escalated": 0, "calls": {}})
+        s["items"] += items
+
+
+def cascade_stats() -> dict:
+    with _stats_lock:
+        return {
+            stage: {**s, "calls": dict(s["calls"]), "escalation_rate": round(s["escalated"] / s["items"], 3) if s["items"] else 0.0}
+            for stage, s in _stats.items()
+        }
+
+
+class ModelCascade:
+    """
+    Tries the cheapest model of a stage first and re-sends only the items whose
+    output fails the stage's validation to the next, stronger model.
+    """
+
+    def __init__(self, stage: str, api_key: str, model_name: str, system_instruction: str = None):
+        self.stage = stage
+        self.api_key = api_key
+        self.system_instruction = system_instruction
+        self.model_names = cascade_for(stage, model_name)
+        self.provider = get_provider(stage, api_key)
+        self._models = {}
+
+    def model(self, tier: int = 0):
+        if tier not in self._models:
+            self._models[tier] = self.provider.bind(self.model_names[tier], self.system_instruction, self.stage)
+        return self._models[tier]
+
+    def run(self, items: list, call, extract, validate) -> list:
+        """
+        call(items, model) -> raw output for a list of items
+        extract(raw, item) -> that item's part of the raw output
+        validate(value) -> True when the value is good enough to keep
+        Returns one value per item (the best attempt when every tier fails).
+        """
+        results = [None] * len(items)
+        pending = list(range(len(items)))
+        _count_items(self.stage, len(items))
+
+        for tier, name in enumerate(self.model_names):
+            if tier:
+                progress.checkpoint()
+            raw = call([items[i] for i in pending], self.model(tier))
+            failed = []
+            for i in pending:
+                value = extract(raw, items[i])
+                if validate(value):
+                    results[i] = value
+                else:
+                    failed.append(i)
+                    if value:
+                        results[i] = value
+
+            has_next = tier + 1 < len(self.model_names)
+            _record(self.stage, name, len(failed), escalated=has_next)
+            if failed and has_next:
+                target = self.model_names[tier + 1]
+                log = logger.warning if target in PREMIUM_MODELS else logger.info
+                log(f"⤴️ {self.stage}: escalating {len(failed)}/{len(pending)} item(s) from {name} to {target}")
+            pending = failed
+            if not pending:
+                break
+        return results
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
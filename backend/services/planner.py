@@ -0,0 +1,80 @@
+import os
+from services.hedging import stage_latency
+from services.llm_client import LLM_RPS, prompt_fingerprint
+from services.model_router import cascade_stats
+from services.prefetch import uncached_rows
+from services.state_store import get_store
+from services.verbosity import DEFAULT_LEVEL, result_key_extra
+
+# Rough sizing: ~4 characters per token for English/JSON prompts
+CHARS_PER_TOKEN = 4
+# Typical response size per item in a batch (BOM sends one item per call)
+OUTPUT_TOKENS_PER_ITEM = {"wbs": 700, "bom": 350, "cost": 60}
+# Share of the full output a leaner verbosity level produces
+OUTPUT_SHARE = {"full": 1.0, "compact": 0.55, "numbers": 0.3}
+# Per-call latency assumed until the stage has observed some calls
+DEFAULT_LATENCY_S = {"wbs": 15.0, "bom": 8.0, "cost": 10.0}
+# Predicted wall time above which a job is better sent to the background
+BACKGROUND_AFTER_S = float(os.getenv("LOGICLEAP_PLAN_BACKGROUND_AFTER_S", "60"))
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def plan_stage(service, stage: str, rows: list, model_name: str, city_tier: str = None) -> dict:
+    """
+    Predicted model usage for running rows through a stage, without calling any model.
+    Uses the service's own grouping and batching (service.plan / service.batch_prompt), skipping
+    rows in the result cache, work already in the template/price caches, and batches whose exact
+    prompt is in the response cache. Escalations are predicted from the stage's observed rate.
+    """
+    tier_args = (city_tier,) if stage == "cost" else ()
+    verbosity = getattr(service, "verbosity", DEFAULT_LEVEL)
+    misses = uncached_rows(type(service).__name__, rows, *tier_args, *result_key_extra(model_name, verbosity))
+    batches = service.plan(misses, *tier_args)
+
+    store = get_store()
+    system_tokens = estimate_tokens(service.model.system_instruction)
+    calls, cached_batches, input_tokens, output_tokens = 0, 0, 0, 0
+    for batch in batches:
+        prompt = service.batch_prompt(batch, *tier_args)
+        if store.get(f"llm:{prompt_fingerprint(service.model, prompt, service.config)}") is not None:
+            cached_batches += 1
+            continue
+        calls += 1
+        input_tokens += system_tokens + estimate_tokens(prompt)
+        output_tokens += OUTPUT_TOKENS_PER_ITEM[stage] * OUTPUT_SHARE[verbosity] * (1 if stage == "bom" else len(batch))
+
+    escalation_rate = cascade_stats().get(stage, {}).get("escalation_rate", 0.0) if hasattr(service, "cascade") else 0.0
+    expected_calls = calls * (1 + escalation_rate)
+    latency = stage_latency(stage).typical() or DEFAULT_LATENCY_S[stage]
+    interval = 1.0 / LLM_RPS if LLM_RPS > 0 else 0.0
+    # Batches run one after another, each paced by the per-key rate limit
+    wall_time = expected_calls * max(latency, interval)
+
+    return {
+        "stage": stage,
+        "verbosity": verbosity,
+        "service": type(service).__name__,
+        "rows": len(rows),
+        "rows_cached": len(rows) - len(misses),
+        "batches": len(batches),
+        "batches_cached": cached_batches,
+        "llm_calls": calls,
+        "expected_llm_calls": round(expected_calls, 1),
+        "input_tokens": round(input_tokens * (1 + escalation_rate)),
+        "output_tokens": round(output_tokens * (1 + escalation_rate)),
+        "latency_per_call_s": round(latency, 2),
+        "rate_limit_rps": LLM_RPS,
+        "wall_time_s": round(wall_time, 1),
+        "background_recommended": wall_time > BACKGROUND_AFTER_S,
+    }
+
+
+def within_budget(plan: dict, max_calls: int = None, max_tokens: int = None, max_seconds: float = None) -> bool:
+    return not (
+        (max_calls is not None and plan["expected_llm_calls"] > max_calls)
+        or (max_tokens is not None and plan["input_tokens"] + plan["output_tokens"] > max_tokens)
+        or (max_seconds is not None and plan["wall_time_s"] > max_seconds)
+    )
@@ -0,0 +1,74 @@
+import copy
+import logging
+from services.registry import pipeline_classes
+from services.scheduler import BULK, flow, tenant_id
+
+logger = logging.getLogger(__name__)
+
+
+class PortfolioService:
+    """
+    Prices many projects in one pass. Rows from every project are tagged with their
+    project id and merged, so each distinct work item and material goes through the
+    WBS, BOM and Cost services once for the whole portfolio; results are split back
+    per project afterwards.
+    """
+
+    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite"):
+        self.api_key = api_key
+        self.model_name = model_name
+
+    def process(self, projects: list, city_tier: str = "T1"):
+        # Portfolios are bulk work: their batches queue behind interactive requests for model slots
+        with flow(tenant_id(self.api_key), "portfolio", BULK):
+            return self.estimate(projects, city_tier)
+
+    def estimate(self, projects: list, city_tier: str = "T1"):
+        by_pipeline = {}
+        for idx, project in enumerate(projects):
+            project_id = str(project.get("project_id") or f"P{idx + 1}")
+            pipeline = "Tank Cleaning" if str(project.get("project_type", "")).lower() == "tank cleaning" else "Interior"
+            rows = by_pipeline.setdefault(pipeline, [])
+            for row in project.get("boq", []):
+                tagged = copy.deepcopy(row)
+                tagged["Project"] = project_id
+                rows.append(tagged)
+
+        results = {}
+        portfolio_total = 0
+        for pipeline, boq_rows in by_pipeline.items():
+            wbs_cls, bom_cls, cost_cls = pipeline_classes(pipeline)
+            logger.info(f"🏘️ Portfolio ({pipeline}): {len(boq_rows)} BOQ rows across projects")
+
+            wbs_rows = wbs_cls(api_key=self.api_key, model_name=self.model_name).process(boq_rows)
+            bom_rows = bom_cls(api_key=self.api_key, model_name=self.model_name).process(wbs_rows)
+
+            cost_service = cost_cls(api_key=self.api_key, model_name=self.model_name)
+            price_library = cost_service.build_price_library(bom_rows, city_tier)
+            line_items = [cost_service.price_row(row, price_library) for row in bom_rows]
+
+            split = {project_id: {"wbs": [], "bom": [], "lines": []} for project_id in dict.fromkeys(r["Project"] for r in boq_rows)}
+            for row in wbs_rows:
+                split[row["Project"]]["wbs"].append(row)
+            for row in bom_rows:
+                split[row["Project"]]["bom"].append(row)
+            for line in line_items:
+                split[line["Project"]]["lines"].append(line)
+
+            for project_id, parts in split.items():
+                estimate = cost_service.summarize(parts["lines"], city_tier)
+                estimate["project_summary"]["project_type"] = pipeline
+                estimate["wbs"] = parts["wbs"]
+                estimate["bom"] = parts["bom"]
+                results[project_id] = estimate
+                portfolio_total += estimate["project_summary"]["total_cost"]
+
+        return {
+            "portfolio_summary": {
+                "city_tier": city_tier,
+                "project_count": len(results),
+                "total_cost": round(portfolio_total, 2),
+                "currency": "INR",
+            },
+            "projects": results,
+        }
@@ -0,0 +1,155 @@
+import copy
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from services.prompt_utils import compact_json
+from services.registry import pipeline_classes
+from services.scheduler import BULK, flow, tenant_id
+from services.state_store import get_store
+
+logger = logging.getLogger(__name__)
+
+RESULT_TTL = float(os.getenv("LOGICLEAP_RESULT_TTL", "3600"))
+
+# One background worker: prefetch runs serially and never competes with itself for quota
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+
+
+def canonical(value):
+    # The browser re-serialises 10.0 as 10, so integral floats must hash like ints
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {k: canonical(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [canonical(v) for v in value]
+    return value
+
+
+def row_key(stage: str, row: dict, *extra) -> str:
+    payload = compact_json([stage, canonical(row), list(extra)])
+    return f"result:{stage}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def _lookup(stage: str, rows: list, extra: tuple, results: dict = None):
+    store = get_store()
+    keys = [row_key(stage, row, *extra) for row in rows]
+    cached = [(results or {}).get(key) for key in keys]
+    cached = [hit if hit is not None else store.get(key) for key, hit in zip(keys, cached)]
+    misses = [i for i, hit in enumerate(cached) if hit is None]
+    if rows:
+        logger.info(f"♻️ {stage}: {len(rows) - len(misses)}/{len(rows)} rows served from result cache")
+    return keys, cached, misses
+
+
+def uncached_rows(stage: str, rows: list, *extra) -> list:
+    """Rows run_wbs/run_bom/run_cost would pass to the service (stage is the service class name)."""
+    store = get_store()
+    return [row for row in rows if store.get(row_key(stage, row, *extra)) is None]
+
+
+def _collect(results: dict, keys: list, cached: list):
+    if results is not None:
+        results.clear()
+        results.update(zip(keys, cached))
+
+
+def run_wbs(service, boq_data: list, *extra, results: dict = None) -> list:
+    """
+    WBS rows for boq_data; unchanged rows come from the result cache, the rest go through the service.
+    results: optional row_key -> result map (e.g. from a stored project snapshot) consulted before
+    the cache; it is replaced with the results of this run. Same for run_bom and run_cost.
+    """
+    stage = type(service).__name__
+    keys, cached, misses = _lookup(stage, boq_data, extra, results)
+    if misses:
+        fresh = service.process([copy.deepcopy(boq_data[i]) for i in misses])
+        store = get_store()
+        for i, row in zip(misses, fresh):
+            cached[i] = row
+            store.set(keys[i], row, ttl=RESULT_TTL)
+    _collect(results, keys, cached)
+    return cached
+
+
+def _stream_rows(stage: str, rows: list, extra: tuple, results: dict, prepare):
+    """
+    Per-row results for rows as a generator, for stages whose output is much larger than their
+    input (BOM explosion, cost lines). The first pass keeps the cached results and notes which
+    rows miss; prepare(miss_rows) then runs the model calls for those before this returns and
+    gives back a row -> result function (a lookup in the library it built). The generator only
+    hands out kept results and explodes/prices the misses from that library as they are consumed,
+    so no model call happens while streaming and the generated results are never held at once.
+    """
+    store = get_store()
+    previous = dict(results) if results is not None else {}
+    keys = [row_key(stage, row, *extra) for row in rows]
+    kept = [previous.get(key) for key in keys]
+    kept = [hit if hit is not None else store.get(key) for key, hit in zip(keys, kept)]
+    missed = kept.count(None)
+    if rows:
+        logger.info(f"♻️ {stage}: {len(rows) - missed}/{len(rows)} rows served from result cache")
+    # The library builders read the missed rows in a single pass
+    produce = prepare(row for row, hit in zip(rows, kept) if hit is None) if missed else None
+    if results is not None:
+        results.clear()
+
+    def generate():
+        for i, row in enumerate(rows):
+            value, kept[i] = kept[i], None
+            if value is None:
+                value = produce(row)
+                store.set(keys[i], value, ttl=RESULT_TTL)
+            if results is not None:
+                results[keys[i]] = value
+            yield value
+
+    return generate()
+
+
+def iter_bom(service, wbs_data: list, *extra, results: dict = None):
+    """BOM lines for wbs_data, exploded lazily once the BOM library for uncached rows is built."""
+    def prepare(miss_rows):
+        # miss_rows is a one-pass iterable
+        bom_library = service.build_library(miss_rows)
+        return lambda row: service.explode_row(row, bom_library)
+
+    rows = _stream_rows(type(service).__name__, wbs_data, extra, results, prepare)
+    return (line for lines in rows for line in lines)
+
+
+def run_bom(service, wbs_data: list, *extra, results: dict = None) -> list:
+    return list(iter_bom(service, wbs_data, *extra, results=results))
+
+
+def iter_cost(service, bom_data: list, city_tier: str, *extra, results: dict = None):
+    """Priced lines for bom_data, produced lazily once uncached materials are priced."""
+    def prepare(miss_rows):
+        price_library = service.build_price_library(miss_rows, city_tier)
+        return lambda row: service.price_row(row, price_library)
+
+    return _stream_rows(type(service).__name__, bom_data, (city_tier,) + extra, results, prepare)
+
+
+def run_cost(service, bom_data: list, city_tier: str, *extra, results: dict = None) -> dict:
+    return service.summarize(list(iter_cost(service, bom_data, city_tier, *extra, results=results)), city_tier)
+
+
+def _prefetch(project_type: str, boq_data: list, api_key: str, model_name: str, city_tier: str):
+    wbs_cls, bom_cls, cost_cls = pipeline_classes(project_type)
+    # Speculative work: queued behind every interactive request for model slots
+    with flow(tenant_id(api_key), "prefetch", BULK):
+        try:
+            logger.info(f"⚡ Prefetching WBS/BOM/Cost for {len(boq_data)} BOQ rows ({project_type})")
+            wbs_data = run_wbs(wbs_cls(api_key=api_key, model_name=model_name), boq_data, model_name)
+            bom_data = run_bom(bom_cls(api_key=api_key, model_name=model_name), wbs_data, model_name)
+            run_cost(cost_cls(api_key=api_key, model_name=model_name), bom_data, city_tier, model_name)
+            logger.info("⚡ Prefetch complete")
+        except Exception as e:
+            logger.warning(f"⚠️ Prefetch failed: {e}")
+
+
+def schedule_prefetch(project_type: str, boq_data: list, api_key: str, model_name: str, city_tier: str = "T1"):
+    """Queues speculative downstream generation for a freshly generated BOQ."""
+    _executor.submit(_prefetch, project_type, copy.deepcopy(boq_data), api_key, model_name, city_tier)
@@ -0,0 +1,39 @@
+import os
+import re
+from services.state_store import get_store
+from services.verbosity import DEFAULT_LEVEL, covering
+
+# Market rates move slowly; a week keeps estimates consistent without going stale
+PRICE_TTL = float(os.getenv("LOGICLEAP_PRICE_TTL", str(7 * 24 * 3600)))
+
+
+def normalize(text) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", str(text or "").lower()).strip()
+
+
+class PriceLibrary:
+    """
+    Per-tier material rates shared by every worker, keyed by normalized material name and unit.
+    Rates are stored at the verbosity level they were priced at; a lookup takes that level or a
+    richer one, so a lean answer (no remarks) never stands in for a full one.
+    """
+
+    def __init__(self, namespace: str, verbosity: str = DEFAULT_LEVEL):
+        self.namespace = namespace
+        self.verbosity = verbosity
+
+    def _key(self, level: str, city_tier: str, material, unit) -> str:
+        # Full rates keep the original key so existing entries stay valid
+        prefix = "" if level == DEFAULT_LEVEL else f"{level}:"
+        return f"price:{self.namespace}:{prefix}{city_tier}:{normalize(material)}|{normalize(unit)}"
+
+    def get(self, city_tier: str, material, unit):
+        store = get_store()
+        for level in covering(self.verbosity):
+            pricing = store.get(self._key(level, city_tier, material, unit))
+            if pricing is not None:
+                return pricing
+        return None
+
+    def put(self, city_tier: str, material, unit, pricing: dict):
+        get_store().set(self._key(self.verbosity, city_tier, material, unit), pricing, ttl=PRICE_TTL)
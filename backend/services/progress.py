@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from services import scheduler
+from services.state_store import get_store
+
+logger = logging.getLogger(__name__)
+
+# Job state lives in the shared state store so any worker can stream it or cancel it
+JOB_TTL = 3600
+TERMINAL = ("done", "cancelled", "failed")
+
+_local = threading.local()
+
+
+class Cancelled(Exception):
+    """Raised at a batch boundary once the job has been cancelled."""
+
+
+class Job:
+    """
+    Progress and cancellation for one request, keyed by its request ID.
+    Services report through the module-level begin/advance/checkpoint helpers,
+    which act on the job running in the current thread (no-ops otherwise).
+    """
+
+    def __init__(self, request_id: str, stage: str, tenant: str = "", priority: int = scheduler.INTERACTIVE):
+        self.request_id = request_id
+        self.stage = stage
+        self.tenant = tenant
+        self.priority = priority
+        self.done = 0
+        self.total = 0
+        self.status = "running"
+        self._cancelled = threading.Event()
+        # A retry reuses the request ID; a cancel meant for the earlier attempt must not stop it
+        get_store().delete(f"cancel:{request_id}")
+        self._publish()
+
+    def state(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "stage": self.stage,
+            "done": self.done,
+            "total": self.total,
+            "status": self.status,
+            "updated_at": time.time(),
+        }
+
+    def _publish(self):
+        get_store().set(f"job:{self.request_id}", self.state(), ttl=JOB_TTL)
+
+    def cancel(self):
+        self._cancelled.set()
+        cancel_job(self.request_id)
+
+    def is_cancelled(self) -> bool:
+        if not self._cancelled.is_set() and get_store().get(f"cancel:{self.request_id}") is not None:
+            self._cancelled.set()
+        return self._cancelled.is_set()
+
+    def run(self, fn, *args):
+        """Runs fn(*args) in the calling thread with this job as the current job (and scheduler flow)."""
+        _local.job = self
+        try:
+            with scheduler.flow(self.tenant, self.request_id, self.priority):
+                result = fn(*args)
+            self.status = "done"
+            return result
+        except Cancelled:
+            self.status = "cancelled"
+            logger.info(f"🛑 {self.stage} {self.request_id} cancelled after {self.done}/{self.total} batches")
+            raise
+        except Exception:
+            self.status = "failed"
+            raise
+        finally:
+            _local.job = None
+            self._publish()
+
+
+def current_job():
+    return getattr(_local, "job", None)
+
+
+def begin(batches: int):
+    """Announces batches about to run (totals add up across nested loops)."""
+    scheduler.announce(batches)
+    job = current_job()
+    if job is not None and batches:
+        job.total += batches
+        job._publish()
+
+
+def advance(batches: int = 1):
+    scheduler.batch_done()
+    job = current_job()
+    if job is not None:
+        job.done += batches
+        job._publish()
+
+
+def checkpoint():
+    """
+    Called between batches; stops the loop before the next model call if the job was cancelled,
+    otherwise waits for the scheduler to give this request a slot.
+    """
+    job = current_job()
+    if job is not None and job.is_cancelled():
+        raise Cancelled(job.request_id)
+    scheduler.next_batch()
+
+
+def job_state(request_id: str):
+    return get_store().get(f"job:{request_id}")
+
+
+def cancel_job(request_id: str):
+    get_store().set(f"cancel:{request_id}", True, ttl=JOB_TTL)
@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from services.prefetch import canonical, run_bom, run_cost, run_wbs
+from services.registry import create_service
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DB_PATH = os.getenv("LOGICLEAP_PROJECT_DB", os.path.join(tempfile.gettempdir(), "logicleap_projects.db"))
+
+STAGES = ("boq", "wbs", "bom", "cost")
+# The stage each snapshot is computed from
+SOURCE_STAGE = {"wbs": "boq", "bom": "wbs", "cost": "bom"}
+# Fields identifying "the same row" across versions of a stage, for diffs
+ROW_IDENTITY = {
+    "boq": ("Project", "Work"),
+    "wbs": ("Project", "Work"),
+    "bom": ("Project", "Room", "Tank/Area", "Material"),
+    "cost": ("Project", "Room", "Tank/Area", "Material"),
+}
+
+
+class ProjectNotFound(Exception):
+    pass
+
+
+class SnapshotNotFound(Exception):
+    pass
+
+
+def snapshot_rows(stage: str, data) -> list:
+    """Cost snapshots are estimate dicts; every other stage is a list of rows."""
+    if stage == "cost" and isinstance(data, dict):
+        return data.get("line_items", [])
+    return data or []
+
+
+def diff_rows(stage: str, before: list, after: list) -> dict:
+    def keyed(rows):
+        out, seen = {}, {}
+        for row in rows:
+            ident = tuple(str(row.get(f, "")) for f in ROW_IDENTITY[stage])
+            # Repeated identities (e.g. two identical work items) are told apart by occurrence
+            seen[ident] = seen.get(ident, 0) + 1
+            out[ident + (seen[ident],)] = row
+        return out
+
+    old, new = keyed(before), keyed(after)
+    changed = [
+        {"before": old[k], "after": new[k]}
+        for k in new
+        if k in old and canonical(old[k]) != canonical(new[k])
+    ]
+    return {
+        "added": [new[k] for k in new if k not in old],
+        "removed": [old[k] for k in old if k not in new],
+        "changed": changed,
+        "unchanged": sum(1 for k in new if k in old) - len(changed),
+    }
+
+
+class ProjectStore:
+    """
+    Server-side projects with versioned BOQ/WBS/BOM/Cost snapshots (SQLite).
+    Every save creates a new version; a downstream snapshot records the source
+    version it was computed from and the per-row results, so the next version can
+    be recomputed incrementally.
+    """
+
+    def __init__(self, path: str = PROJECT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS projects ("
+                "id TEXT PRIMARY KEY, name TEXT, project_type TEXT, location TEXT, city_tier TEXT, "
+                "created_at REAL, updated_at REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "project_id TEXT, stage TEXT, version INTEGER, source_version INTEGER, "
+                "data TEXT, row_results TEXT, created_at REAL, "
+                "PRIMARY KEY (project_id, stage, version))"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def create_project(self, name: str, project_type: str = "Interior", location: str = "", city_tier: str = "T1") -> dict:
+        project_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO projects (id, name, project_type, location, city_tier, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (project_id, name, project_type, location, city_tier, now, now),
+        )
+        return self.get_project(project_id)
+
+    def get_project(self, project_id: str) -> dict:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT id, name, project_type, location, city_tier, created_at, updated_at FROM projects WHERE id = ?",
+            (project_id,),
+        ).fetchone()
+        if row is None:
+            raise ProjectNotFound(project_id)
+        versions = dict(conn.execute(
+            "SELECT stage, MAX(version) FROM snapshots WHERE project_id = ? GROUP BY stage", (project_id,)
+        ).fetchall())
+        keys = ("project_id", "name", "project_type", "location", "city_tier", "created_at", "updated_at")
+        return {**dict(zip(keys, row)), "latest_versions": {stage: versions.get(stage) for stage in STAGES}}
+
+    def save_snapshot(self, project_id: str, stage: str, data, source_version: int = None, row_results: dict = None) -> int:
+        self.get_project(project_id)
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute(
+                "SELECT COALESCE(MAX(version), 0) + 1 FROM snapshots WHERE project_id = ? AND stage = ?", (project_id, stage)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO snapshots (project_id, stage, version, source_version, data, row_results, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (project_id, stage, version, source_version, json.dumps(data), json.dumps(row_results or {}), now),
+            )
+            conn.execute("UPDATE projects SET updated_at = ? WHERE id = ?", (now, project_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(f"🗂️ Project {project_id}: saved {stage} v{version}")
+        return version
+
+    def get_snapshot(self, project_id: str, stage: str, version: int = None, with_row_results: bool = False) -> dict:
+        """Latest version when version is None."""
+        query = "SELECT version, source_version, data, row_results, created_at FROM snapshots WHERE project_id = ? AND stage = ?"
+        params = [project_id, stage]
+        if version is None:
+            query += " ORDER BY version DESC LIMIT 1"
+        else:
+            query += " AND version = ?"
+            params.append(version)
+        row = self._conn().execute(query, params).fetchone()
+        if row is None:
+            self.get_project(project_id)
+            raise SnapshotNotFound(f"{stage} v{version}" if version else f"{stage} (no versions yet)")
+        snapshot = {"project_id": project_id, "stage": stage, "version": row[0], "source_version": row[1], "data": json.loads(row[2]), "created_at": row[4]}
+        if with_row_results:
+            snapshot["row_results"] = json.loads(row[3] or "{}")
+        return snapshot
+
+    def list_versions(self, project_id: str, stage: str) -> list:
+        self.get_project(project_id)
+        rows = self._conn().execute(
+            "SELECT version, source_version, created_at FROM snapshots WHERE project_id = ? AND stage = ? ORDER BY version",
+            (project_id, stage),
+        ).fetchall()
+        return [{"version": v, "source_version": s, "created_at": c} for v, s, c in rows]
+
+    def diff(self, project_id: str, stage: str, from_version: int, to_version: int = None) -> dict:
+        before = self.get_snapshot(project_id, stage, from_version)
+        after = self.get_snapshot(project_id, stage, to_version)
+        result = diff_rows(stage, snapshot_rows(stage, before["data"]), snapshot_rows(stage, after["data"]))
+        return {"stage": stage, "from_version": before["version"], "to_version": after["version"], **result}
+
+
+_project_store = None
+_project_store_lock = threading.Lock()
+
+
+def get_project_store() -> ProjectStore:
+    global _project_store
+    if _project_store is None:
+        with _project_store_lock:
+            if _project_store is None:
+                _project_store = ProjectStore()
+    return _project_store
+
+
+def compute_stage(project_id: str, stage: str, api_key: str, model_name: str, source_version: int = None, city_tier: str = None) -> dict:
+    """
+    Computes a WBS/BOM/Cost snapshot from a stored source snapshot (latest when source_version
+    is None) and saves it as a new version. Rows whose inputs are unchanged since the last
+    snapshot of this stage reuse its stored results instead of going back to the model.
+    """
+    store = get_project_store()
+    project = store.get_project(project_id)
+    source = store.get_snapshot(project_id, SOURCE_STAGE[stage], source_version)
+    try:
+        results = store.get_snapshot(project_id, stage, with_row_results=True)["row_results"]
+    except SnapshotNotFound:
+        results = {}
+
+    pipeline = "Tank Cleaning" if str(project["project_type"]).lower() == "tank cleaning" else "Interior"
+    service = create_service(pipeline, stage, api_key, model_name)
+    if stage == "wbs":
+        data = run_wbs(service, source["data"], model_name, results=results)
+    elif stage == "bom":
+        data = run_bom(service, source["data"], model_name, results=results)
+    else:
+        data = run_cost(service, source["data"], city_tier or project["city_tier"], model_name, results=results)
+
+    version = store.save_snapshot(project_id, stage, data, source_version=source["version"], row_results=results)
+    return {"project_id": project_id, "stage": stage, "version": version, "source_version": source["version"], "data": data}
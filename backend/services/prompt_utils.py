@@ -0,0 +1,6 @@
+import json
+
+
+def compact_json(data) -> str:
+    """Minified JSON for per-batch payloads (no indentation, no spaces after separators)."""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
@@ -0,0 +1,176 @@
+import csv
+import json
+import logging
+import os
+import re
+import threading
+from services.price_library import normalize
+
+logger = logging.getLogger(__name__)
+
+# Local schedule of rates (CPWD DSR items) priced in code before any model call.
+# LOGICLEAP_DSR_PATH points at a CSV or JSON import; without it every material goes to the model.
+DSR_PATH = os.getenv("LOGICLEAP_DSR_PATH", "")
+DSR_YEAR = os.getenv("LOGICLEAP_DSR_YEAR", "2024")
+# Escalation from the DSR base year to today's rates (the prompts' "+15% inflation")
+DSR_INFLATION = float(os.getenv("LOGICLEAP_DSR_INFLATION", "1.15"))
+# Share of description tokens two names must have in common to count as the same item
+MATCH_THRESHOLD = 0.6
+# A number and the unit after it are one spec token ("16 mm" -> "16mm"), so sizes compare whole
+SPEC_UNIT = re.compile(r"\b(\d+) (mm|cm|m|mtr|ft|inch|in|kg|g|l|ltr|ml|kw|hp|sqmm)\b")
+
+UNIT_ALIASES = {
+    "sq ft": "sqft", "sft": "sqft", "sq feet": "sqft", "square feet": "sqft", "ft2": "sqft",
+    "sq m": "sqm", "sq mt": "sqm", "sqmt": "sqm", "m2": "sqm", "square metre": "sqm", "square meter": "sqm",
+    "cu m": "cum", "m3": "cum", "cubic metre": "cum", "cubic meter": "cum",
+    "rm": "rmt", "running metre": "rmt", "running meter": "rmt", "metre": "rmt", "meter": "rmt", "m": "rmt",
+    "no": "nos", "number": "nos", "each": "nos", "pcs": "nos", "pc": "nos", "piece": "nos",
+    "ltr": "l", "liter": "l", "litre": "l", "liters": "l", "litres": "l", "lit": "l",
+    "kgs": "kg", "kilogram": "kg", "bags": "bag", "pairs": "pair", "sets": "set", "days": "day",
+}
+
+# Column names accepted for each field in CSV/JSON imports
+FIELD_ALIASES = {
+    "code": ("code", "item code", "dsr code", "item no", "s no"),
+    "description": ("description", "item", "material", "name"),
+    "unit": ("unit", "uom"),
+    "rate_material": ("rate material", "material rate", "rate"),
+    "rate_labor": ("rate labor", "rate labour", "labor rate", "labour rate"),
+}
+
+
+def normalize_unit(unit) -> str:
+    text = normalize(unit)
+    return UNIT_ALIASES.get(text, text)
+
+
+def describe(text) -> str:
+    return SPEC_UNIT.sub(r"\1\2", normalize(text))
+
+
+def spec_tokens(tokens) -> frozenset:
+    """Tokens carrying a number: grade, diameter, thickness, size."""
+    return frozenset(t for t in tokens if any(c.isdigit() for c in t))
+
+
+def _number(value) -> float:
+    try:
+        return float(str(value).replace(",", "").strip() or 0)
+    except ValueError:
+        return 0.0
+
+
+def _fields(record: dict) -> dict:
+    columns = {normalize(k): v for k, v in record.items() if k}
+    return {field: next((columns[a] for a in aliases if a in columns), None) for field, aliases in FIELD_ALIASES.items()}
+
+
+class RateIndex:
+    """
+    DSR items keyed by normalized description and unit, with a token index for
+    near matches ("Cement OPC 43 grade" ~ "OPC cement 43 grade"). Base rates are
+    stored as imported; tier and inflation multipliers are applied per lookup.
+    """
+
+    def __init__(self, items: list = None):
+        self.items = []
+        self._exact = {}
+        self._tokens = {}
+        self._matches = {}
+        for item in items or []:
+            self.add(item)
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, record: dict):
+        item = _fields(record)
+        description, unit = describe(item["description"]), normalize_unit(item["unit"])
+        rate_material, rate_labor = _number(item["rate_material"]), _number(item["rate_labor"])
+        if not description or rate_material + rate_labor <= 0:
+            return
+        tokens = frozenset(description.split())
+        entry = {
+            "code": str(item["code"] or "").strip(),
+            "tokens": tokens,
+            "spec": spec_tokens(tokens),
+            "unit": unit,
+            "rate_material": rate_material,
+            "rate_labor": rate_labor,
+        }
+        self.items.append(entry)
+        self._exact[(description, unit)] = entry
+        self._exact.setdefault((" ".join(sorted(entry["tokens"])), unit), entry)
+        for token in entry["tokens"]:
+            self._tokens.setdefault(token, []).append(entry)
+        self._matches.clear()
+
+    @classmethod
+    def load(cls, path: str) -> "RateIndex":
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            if path.lower().endswith(".json"):
+                data = json.load(f)
+                records = data.get("items", []) if isinstance(data, dict) else data
+            else:
+                records = list(csv.DictReader(f))
+        index = cls(records)
+        logger.info(f"📒 Loaded {len(index)} DSR rate items from {path}")
+        return index
+
+    def match(self, material, unit):
+        key = (describe(material), normalize_unit(unit))
+        if key not in self._matches:
+            self._matches[key] = self._find(*key)
+        return self._matches[key]
+
+    def _find(self, description: str, unit: str):
+        tokens = frozenset(description.split())
+        entry = self._exact.get((description, unit)) or self._exact.get((" ".join(sorted(tokens)), unit))
+        if entry is not None:
+            return entry
+        # A near match may differ in wording, never in spec: 43 grade is not 53 grade
+        spec = spec_tokens(tokens)
+        best, best_score = None, MATCH_THRESHOLD
+        seen = set()
+        for token in tokens:
+            for candidate in self._tokens.get(token, ()):
+                if id(candidate) in seen or candidate["unit"] != unit or candidate["spec"] != spec:
+                    continue
+                seen.add(id(candidate))
+                score = len(tokens & candidate["tokens"]) / len(tokens | candidate["tokens"])
+                if score >= best_score:
+                    best, best_score = candidate, score
+        return best
+
+    def price(self, material, unit, city_tier: str, factors: tuple = (1.0, 1.0)):
+        """
+        Rate dict shaped like a model answer, or None when no DSR item matches. factors are the
+        caller's (material, labour) multipliers for city_tier (service.tier_factors), so a direct
+        estimate agrees with the same service's tier comparison.
+        """
+        entry = self.match(material, unit)
+        if entry is None:
+            return None
+        # DSR rates are Delhi (metro) rates: escalate to a T1 rate, then scale to the tier
+        mat_factor, lab_factor = factors
+        return {
+            "rate_material": round(round(entry["rate_material"] * DSR_INFLATION, 2) * mat_factor, 2),
+            "rate_labor": round(round(entry["rate_labor"] * DSR_INFLATION, 2) * lab_factor, 2),
+            "remarks": f"CPWD DSR {DSR_YEAR} {entry['code']}".strip() + f" ({city_tier})",
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_rate_index() -> RateIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            try:
+                _index = RateIndex.load(DSR_PATH) if DSR_PATH else RateIndex()
+            except (OSError, ValueError) as e:
+                logger.error(f"DSR rate index unavailable ({e}); pricing every material with the model")
+                _index = RateIndex()
+        return _index
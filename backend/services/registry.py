@@ -0,0 +1,67 @@
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# (project type, stage) -> "module:Class"; modules are imported on first use so a cold
+# start (or a health check) does not pay for parsers and SDKs it never touches
+SERVICES = {
+    ("Interior", "boq"): "services.boq_service:BOQService",
+    ("Interior", "wbs"): "services.wbs_service:WBSService",
+    ("Interior", "bom"): "services.bom_service:BOMService",
+    ("Interior", "cost"): "services.cost_service:CostService",
+    ("Tank Cleaning", "boq"): "services.tank_boq_service:TankBOQService",
+    ("Tank Cleaning", "wbs"): "services.tank_wbs_service:TankWBSService",
+    ("Tank Cleaning", "bom"): "services.tank_bom_service:TankBOMService",
+    ("Tank Cleaning", "cost"): "services.tank_cost_service:TankCostService",
+}
+
+# Third-party modules loaded lazily by the services and providers
+HEAVY_MODULES = ["google.generativeai", "pdfplumber", "docx"]
+
+_lock = threading.Lock()
+_classes = {}
+
+
+def service_class(project_type: str, stage: str):
+    key = (project_type if (project_type, stage) in SERVICES else "Interior", stage)
+    cls = _classes.get(key)
+    if cls is None:
+        with _lock:
+            cls = _classes.get(key)
+            if cls is None:
+                module_name, class_name = SERVICES[key].split(":")
+                cls = getattr(importlib.import_module(module_name), class_name)
+                _classes[key] = cls
+    return cls
+
+
+def create_service(project_type: str, stage: str, api_key: str, model_name: str, **options):
+    """options: extra constructor arguments, e.g. verbosity for the WBS and cost services"""
+    return service_class(project_type, stage)(api_key=api_key, model_name=model_name, **options)
+
+
+def pipeline_classes(project_type: str) -> tuple:
+    """Downstream services per project type: (WBS, BOM, Cost)"""
+    return tuple(service_class(project_type, stage) for stage in ("wbs", "bom", "cost"))
+
+
+def warm_up() -> dict:
+    """Imports every registered service and heavy dependency; returns seconds spent per module."""
+    timings = {}
+    for project_type, stage in SERVICES:
+        start = time.perf_counter()
+        service_class(project_type, stage)
+        timings[SERVICES[(project_type, stage)].split(":")[0]] = round(time.perf_counter() - start, 4)
+    for module_name in HEAVY_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            logger.warning(f"⚠️ Warm-up could not import {module_name}: {e}")
+            continue
+        timings[module_name] = round(time.perf_counter() - start, 4)
+    logger.info(f"🔥 Warm-up complete in {sum(timings.values()):.2f}s")
+    return timings
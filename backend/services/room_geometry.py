@@ -0,0 +1,226 @@
+import math
+
+# Interior BOQs are worked in feet. Rooms come from the model as L x W (x H); every work item
+# and quantity below is derived locally, so the same rooms always give the same BOQ.
+DEFAULT_HEIGHT_FT = 10.0
+DOOR_SIZE_FT = (3.0, 7.0)
+WINDOW_AREA_SQFT = 16.0
+# One electrical point (switch, socket or light) per this much floor area, at least MIN_POINTS
+SQFT_PER_POINT = 15.0
+MIN_POINTS = 4
+# Bathroom wall tiles and kitchen dado run up to these heights
+BATH_TILE_HEIGHT_FT = 7.0
+DADO_HEIGHT_FT = 2.0
+# Waterproofing turns up the bathroom walls by this much
+WATERPROOF_UPTURN_FT = 1.0
+
+# Room type: keywords in the room name, checked in this order ("Master Bedroom Toilet" is a bathroom)
+ROOM_TYPES = [
+    ("bathroom", ("bath", "toilet", "wash", "powder", "wc")),
+    ("kitchen", ("kitchen", "pantry")),
+    ("utility", ("utility", "balcony", "verandah", "terrace", "deck")),
+    ("bedroom", ("bed", "guest", "kids", "nursery")),
+    ("living", ("living", "hall", "drawing", "lounge", "family")),
+    ("dining", ("dining",)),
+    ("study", ("study", "office", "den", "library")),
+    ("passage", ("foyer", "passage", "corridor", "lobby", "entrance", "entry")),
+]
+DEFAULT_ROOM_TYPE = "bedroom"
+
+# Work package per room type: (work, quantity rule, unit). Rules are the functions in QUANTITIES;
+# "{flooring}" / "{ceiling}" take the finish named for the room or the type's default below.
+PACKAGES = {
+    "living": [
+        ("{flooring} Flooring", "floor", "sqft"),
+        ("Skirting", "skirting", "rft"),
+        ("{ceiling} False Ceiling", "floor", "sqft"),
+        ("Plastic Emulsion Painting", "walls", "sqft"),
+        ("Electrical Points", "points", "points"),
+        ("TV Unit", "tv_unit", "sqft"),
+        ("Flush Door with Frame", "doors", "nos"),
+    ],
+    "dining": [
+        ("{flooring} Flooring", "floor", "sqft"),
+        ("Skirting", "skirting", "rft"),
+        ("{ceiling} False Ceiling", "floor", "sqft"),
+        ("Plastic Emulsion Painting", "walls", "sqft"),
+        ("Electrical Points", "points", "points"),
+        ("Crockery Unit", "crockery_unit", "sqft"),
+    ],
+    "bedroom": [
+        ("{flooring} Flooring", "floor", "sqft"),
+        ("Skirting", "skirting", "rft"),
+        ("{ceiling} False Ceiling", "floor", "sqft"),
+        ("Plastic Emulsion Painting", "walls", "sqft"),
+        ("Electrical Points", "points", "points"),
+        ("Wardrobe", "wardrobe", "sqft"),
+        ("Flush Door with Frame", "doors", "nos"),
+    ],
+    "study": [
+        ("{flooring} Flooring", "floor", "sqft"),
+        ("Skirting", "skirting", "rft"),
+        ("{ceiling} False Ceiling", "floor", "sqft"),
+        ("Plastic Emulsion Painting", "walls", "sqft"),
+        ("Electrical Points", "points", "points"),
+        ("Study Table and Shelving", "study_unit", "sqft"),
+        ("Flush Door with Frame", "doors", "nos"),
+    ],
+    "kitchen": [
+        ("{flooring} Flooring", "floor", "sqft"),
+        ("{ceiling} False Ceiling", "floor", "sqft"),
+        ("Plastic Emulsion Painting", "walls_above_dado", "sqft"),
+        ("Wall Dado Tiling", "dado", "sqft"),
+        ("Modular Cabinets", "counter", "rft"),
+        ("Electrical Points", "points", "points"),
+        ("Flush Door with Frame", "doors", "nos"),
+    ],
+    "bathroom": [
+        ("Waterproofing", "waterproofing", "sqft"),
+        ("{flooring} Flooring", "floor", "sqft"),
+        ("Wall Tiling", "bath_walls", "sqft"),
+        ("{ceiling} False Ceiling", "floor", "sqft"),
+        ("Electrical Points", "points", "points"),
+        ("PVC Door with Frame", "doors", "nos"),
+    ],
+    "utility": [
+        ("{flooring} Flooring", "floor", "sqft"),
+        ("Skirting", "skirting", "rft"),
+        ("Exterior Emulsion Painting", "walls", "sqft"),
+        ("Electrical Points", "points", "points"),
+    ],
+    "passage": [
+        ("{flooring} Flooring", "floor", "sqft"),
+        ("Skirting", "skirting", "rft"),
+        ("{ceiling} False Ceiling", "floor", "sqft"),
+        ("Plastic Emulsion Painting", "walls", "sqft"),
+        ("Electrical Points", "points", "points"),
+    ],
+}
+
+# Finishes used when the input does not name one
+DEFAULT_FLOORING = {
+    "living": "Vitrified Tile", "dining": "Vitrified Tile", "passage": "Vitrified Tile",
+    "bedroom": "Wooden Laminate", "study": "Wooden Laminate",
+    "kitchen": "Anti-skid Tile", "bathroom": "Anti-skid Tile", "utility": "Anti-skid Tile",
+}
+DEFAULT_CEILING = {"bathroom": "Grid", "kitchen": "Grid"}
+DEFAULT_CEILING_ALL = "Gypsum"
+# Doors assumed per room type when the plan does not show them
+DEFAULT_DOORS = {"living": 1, "bedroom": 1, "study": 1, "kitchen": 1, "bathroom": 1}
+
+# Fixed-size joinery as (length, height) in feet, capped to the room's longer wall
+JOINERY_FT = {
+    "tv_unit": (8.0, 7.0),
+    "crockery_unit": (6.0, 7.0),
+    "wardrobe": (8.0, 7.0),
+    "study_unit": (5.0, 6.0),
+}
+
+NO_CEILING = ("none", "no", "exposed", "rcc", "slab")
+
+
+def room_type(room: dict) -> str:
+    given = str(room.get("Type") or "").strip().lower()
+    if given in PACKAGES:
+        return given
+    name = f"{given} {room.get('Room') or ''}".lower()
+    for kind, keywords in ROOM_TYPES:
+        if any(k in name for k in keywords):
+            return kind
+    return DEFAULT_ROOM_TYPE
+
+
+class Geometry:
+    """Plan dimensions of one room (feet) and the areas/lengths the package rules use."""
+
+    def __init__(self, length: float, width: float, height: float, doors: int, windows: int):
+        self.length = length
+        self.width = width
+        self.height = height
+        self.doors = doors
+        self.windows = windows
+
+    @property
+    def floor(self) -> float:
+        return self.length * self.width
+
+    @property
+    def perimeter(self) -> float:
+        return 2 * (self.length + self.width)
+
+    @property
+    def openings(self) -> float:
+        return self.doors * DOOR_SIZE_FT[0] * DOOR_SIZE_FT[1] + self.windows * WINDOW_AREA_SQFT
+
+    def wall_area(self, height: float) -> float:
+        """Wall area up to height, net of doors and windows (openings capped by that height)."""
+        openings = self.openings * min(1.0, height / DOOR_SIZE_FT[1])
+        return max(0.0, self.perimeter * height - openings)
+
+
+def _joinery(kind):
+    def rule(g: Geometry):
+        length, height = JOINERY_FT[kind]
+        length = min(length, max(g.length, g.width))
+        return length * height, length, height
+    return rule
+
+
+# Rule -> (quantity, row Length, row Width) for a room's geometry
+QUANTITIES = {
+    "floor": lambda g: (g.floor, g.length, g.width),
+    "skirting": lambda g: (max(0.0, g.perimeter - g.doors * DOOR_SIZE_FT[0]), g.length, g.width),
+    "walls": lambda g: (g.wall_area(g.height), g.length, g.width),
+    "walls_above_dado": lambda g: (max(0.0, g.wall_area(g.height) - (g.length + g.width) * DADO_HEIGHT_FT), g.length, g.width),
+    "points": lambda g: (max(MIN_POINTS, math.ceil(g.floor / SQFT_PER_POINT)), 0.0, 0.0),
+    "doors": lambda g: (g.doors, *DOOR_SIZE_FT),
+    "counter": lambda g: (g.length + g.width, g.length, g.width),
+    "dado": lambda g: ((g.length + g.width) * DADO_HEIGHT_FT, g.length + g.width, DADO_HEIGHT_FT),
+    "bath_walls": lambda g: (g.wall_area(BATH_TILE_HEIGHT_FT), g.length, g.width),
+    "waterproofing": lambda g: (g.floor + g.perimeter * WATERPROOF_UPTURN_FT, g.length, g.width),
+    **{kind: _joinery(kind) for kind in JOINERY_FT},
+}
+
+
+def room_items(room: dict) -> list:
+    """One room -> its work items as (work, length, width, quantity, unit), zero quantities dropped."""
+    kind = room_type(room)
+    doors = int(room.get("Doors") or 0) or DEFAULT_DOORS.get(kind, 0)
+    g = Geometry(
+        float(room.get("Length") or 0), float(room.get("Width") or 0),
+        float(room.get("Height") or 0) or DEFAULT_HEIGHT_FT, doors, int(room.get("Windows") or 0),
+    )
+    flooring = str(room.get("Flooring") or "").strip() or DEFAULT_FLOORING.get(kind, "Vitrified Tile")
+    ceiling = str(room.get("Ceiling") or "").strip() or DEFAULT_CEILING.get(kind, DEFAULT_CEILING_ALL)
+    name = str(room.get("Room") or kind.title()).strip()
+
+    items = []
+    for work, rule, unit in PACKAGES[kind]:
+        if "{ceiling}" in work and ceiling.lower() in NO_CEILING:
+            continue
+        qty, length, width = QUANTITIES[rule](g)
+        if qty <= 0:
+            continue
+        work = work.format(flooring=flooring.removesuffix(" Flooring"), ceiling=ceiling.removesuffix(" False Ceiling"))
+        items.append((f"{name} {work}", length, width, qty, unit))
+    for extra in room.get("Extras") or []:
+        items.append((f"{name} {extra['Work']}", 0.0, 0.0, extra["Quantity"], extra["Unit"]))
+    return items
+
+
+def expand_rooms(rooms: list, state: str = "") -> list:
+    """Rooms (RoomRow dicts) -> BOQ rows in the shape BOQService returns, numbered in order."""
+    rows = []
+    for room in rooms:
+        for work, length, width, qty, unit in room_items(room):
+            rows.append({
+                "Item No.": len(rows) + 1,
+                "Work": work,
+                "State": room.get("State") or state,
+                "Tier": room.get("Tier") or "",
+                "Length": round(length, 2),
+                "Width": round(width, 2),
+                "Quantity": round(float(qty), 2),
+                "Unit": unit,
+            })
+    return rows
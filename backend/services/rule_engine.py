@@ -0,0 +1,165 @@
+import json
+import re
+from services.tier_pricing import BASE_TIER, INTERIOR_TIER_FACTORS
+from services.tank_tiers import size_band
+
+# Deterministic answers to the WBS / BOM / Cost stage prompts, used by the "rules" provider
+# when a stage must run offline or at high throughput. Output shapes match the stage
+# response schemas (services/schemas.py), so the services decode them unchanged.
+
+# (keywords, material rate, labour rate) in INR per BOM unit, CPWD DSR 2024 + 15%
+RATE_RULES = [
+    (("sodium hypochlorite", "bleach", "chlorine"), 110, 30),
+    (("detergent", "degreaser"), 180, 20),
+    (("glove",), 60, 0),
+    (("harness", "lifeline"), 350, 0),
+    (("gas detector",), 900, 0),
+    (("pump",), 800, 0),
+    (("pressure washer", "washer rental"), 1500, 0),
+    (("vacuum", "extractor"), 2500, 0),
+    (("robotic",), 9000, 0),
+    (("uv ",), 3000, 0),
+    (("testing", "test kit", "water quality"), 1500, 500),
+    (("disposal", "sludge"), 60, 40),
+    (("brush", "bucket", "shovel"), 250, 0),
+    (("primer",), 240, 12),
+    (("putty",), 45, 10),
+    (("emulsion", "paint", "enamel"), 380, 18),
+    (("tile adhesive", "adhesive"), 28, 0),
+    (("grout",), 95, 0),
+    (("tile", "vitrified", "ceramic"), 75, 35),
+    (("cement",), 430, 0),
+    (("sand",), 65, 0),
+    (("gypsum", "false ceiling", "board"), 60, 40),
+    (("plywood", "ply"), 115, 65),
+    (("laminate",), 1600, 250),
+    (("wire", "cable"), 28, 12),
+    (("switch", "socket"), 160, 60),
+    (("light", "fixture", "fan"), 900, 150),
+    (("pipe", "cpvc", "pvc"), 140, 60),
+    (("granite", "marble", "stone"), 180, 60),
+    (("glass",), 220, 80),
+    (("door", "shutter"), 9500, 1800),
+    (("hardware", "hinge", "handle", "lock"), 350, 50),
+    (("labour", "labor", "mason", "carpenter", "painter", "cleaner"), 0, 950),
+]
+
+# Hours per unit of quantity for the execution phase
+PRODUCTIVITY = {
+    "sqft": 0.03, "sft": 0.03, "sqm": 0.32, "rmt": 0.18, "rft": 0.06, "m": 0.18,
+    "nos": 1.5, "no": 1.5, "points": 0.8, "set": 4.0, "ls": 8.0, "cum": 6.0,
+}
+
+# Typical materials per work type: (material, quantity per unit of work, unit)
+WORK_MATERIALS = [
+    (("floor", "tiling", "tile"), [("Vitrified tiles", 1.05, "sqft"), ("Tile adhesive", 0.45, "kg"), ("Grout", 0.05, "kg")]),
+    (("skirting",), [("Vitrified tile skirting", 1.05, "rft"), ("Tile adhesive", 0.15, "kg")]),
+    (("paint",), [("Wall putty", 0.15, "kg"), ("Primer", 0.011, "L"), ("Emulsion paint", 0.022, "L")]),
+    (("ceiling",), [("Gypsum board", 1.05, "sqft"), ("Ceiling channels and hardware", 1.0, "sqft")]),
+    (("electric", "wiring", "point"), [("Copper wire", 12.0, "m"), ("Switch and socket", 1.0, "Nos")]),
+    (("wardrobe", "woodwork", "cabinet", "kitchen"), [("Plywood", 2.2, "sqft"), ("Laminate", 0.07, "sheet"), ("Cabinet hardware", 0.25, "set")]),
+    (("door",), [("Door shutter", 1.0, "Nos"), ("Door hardware", 1.0, "set")]),
+    (("plumb",), [("CPVC pipe", 1.05, "rmt")]),
+    (("tank",), [("Sodium hypochlorite", 2.0, "L"), ("Industrial detergent", 1.0, "L"), ("Protective gloves", 4.0, "pair"), ("Sludge disposal", 25.0, "kg")]),
+]
+
+_QTY = re.compile(r"([-+]?\d*\.?\d+)\s*([A-Za-z. ]*)")
+
+
+def parse_quantity(text) -> tuple:
+    match = _QTY.search(str(text or ""))
+    if not match:
+        return 0.0, ""
+    return float(match.group(1)), match.group(2).strip().lower().replace(".", "")
+
+
+def _field(prompt: str, label: str):
+    for line in prompt.splitlines():
+        if line.startswith(f"{label}:"):
+            return line[len(label) + 1:]
+    return None
+
+
+def _payload(prompt: str, label: str):
+    text = _field(prompt, label)
+    return json.loads(text) if text else None
+
+
+def work_materials(work: str) -> list:
+    name = str(work or "").lower()
+    for keywords, materials in WORK_MATERIALS:
+        if any(k in name for k in keywords):
+            return materials
+    return []
+
+
+def wbs_entry(item: dict) -> dict:
+    qty, unit = parse_quantity(item.get("q"))
+    hours = max(1.0, qty * PRODUCTIVITY.get(unit, 0.05))
+    tank = "t" in item
+    if tank:
+        low, high = size_band(float(item.get("c") or 0), item.get("t"))
+        hours = (low + high) / 2
+    phases = [("Site setup & marking", 0.15), (f"{item['w']} execution", 0.7), ("Finishing, cleaning & handover", 0.15)]
+    execution = []
+    for idx, (activity, share) in enumerate(phases, start=1):
+        step = {"step": idx, "activity": activity, "estimated_hours": round(hours * share, 1), "optimization_note": "Rule-based estimate"}
+        if idx == 1:
+            step["setup_hours"] = step["estimated_hours"]
+        if tank:
+            step["safety_requirements"] = "Gas test, ventilation and two-person team before entry"
+        execution.append(step)
+    return {
+        "planning": ["Site survey and measurement", "Access and safety planning"],
+        "procurement": [m for m, _, _ in work_materials(item["w"])] or [f"Materials for {item['w']}"],
+        "execution": execution,
+        "qc": ["Workmanship inspection against specification"],
+        "billing": ["Advance: 30%", "On completion: 60%", "After handover: 10%"],
+    }
+
+
+def bom_lines(item: dict) -> list:
+    qty, unit = parse_quantity(item.get("d"))
+    known = {m: (factor, u) for m, factor, u in work_materials(item.get("w"))}
+    materials = [m for m in item.get("m") or [] if isinstance(m, str)] or list(known) or [f"Materials for {item.get('w', 'work')}"]
+    lines = []
+    for material in materials:
+        factor, material_unit = known.get(material, (1.05, unit or "LS"))
+        lines.append({
+            "material": material,
+            "quantity": round(max(qty, 1) * factor, 2),
+            "unit": material_unit,
+            "note": "Rule based quantity incl wastage",
+        })
+    return lines
+
+
+def price(material: str, city_tier: str, qty: float) -> dict:
+    name = f" {material.lower()} "
+    mat_factor, lab_factor = INTERIOR_TIER_FACTORS.get(city_tier, INTERIOR_TIER_FACTORS[BASE_TIER])
+    for keywords, mat, lab in RATE_RULES:
+        if any(k in name for k in keywords):
+            rate_mat, rate_lab = round(mat * mat_factor, 2), round(lab * lab_factor, 2)
+            return {
+                "rate_material": rate_mat,
+                "rate_labor": rate_lab,
+                "subtotal": round((rate_mat + rate_lab) * qty, 2),
+                "remarks": f"Rule rate ({keywords[0]}, {city_tier})",
+            }
+    return {"rate_material": 0, "rate_labor": 0, "subtotal": 0, "remarks": "No rule matched"}
+
+
+def answer(stage: str, prompt: str) -> str:
+    """Returns the JSON text a model would have produced for this stage prompt."""
+    if stage == "wbs":
+        items = _payload(prompt, "ITEMS") or []
+        return json.dumps([{"w": item["w"], **wbs_entry(item)} for item in items])
+    if stage == "bom":
+        return json.dumps(bom_lines(_payload(prompt, "ITEM") or {}))
+    if stage == "cost":
+        tier = (_field(prompt, "TIER") or "T1").strip()
+        items = _payload(prompt, "BOM") or []
+        return json.dumps([{"m": i["m"], **price(i["m"], tier, float(i.get("q") or 0))} for i in items])
+    # BOQ extraction reads free text and drawings; there is no rule-based equivalent
+    return "[]"
+
@@ -0,0 +1,170 @@
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Service batches (one model call each, plus escalations) allowed to run at once in this
+# process. A batch takes a slot at progress.checkpoint() and gives it back at progress.advance()
+# (or the next checkpoint). 0 turns scheduling off.
+LLM_SLOTS = int(os.getenv("LOGICLEAP_LLM_SLOTS", "8"))
+# Slots bulk work may never take, so an interactive batch waits at most for one that is running
+INTERACTIVE_RESERVED = 1
+# Interactive requests that announce more batches than this are scheduled as bulk
+BULK_AFTER_BATCHES = int(os.getenv("LOGICLEAP_BULK_AFTER_BATCHES", "50"))
+
+INTERACTIVE, BULK = 0, 1
+CLASSES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+
+def _weights(spec: str) -> dict:
+    """LOGICLEAP_TENANT_WEIGHTS="<tenant id>:<weight>,..."; unlisted tenants weigh 1."""
+    weights = {}
+    for part in spec.split(","):
+        tenant, _, weight = part.strip().partition(":")
+        if tenant and weight:
+            weights[tenant] = float(weight)
+    return weights
+
+
+TENANT_WEIGHTS = _weights(os.getenv("LOGICLEAP_TENANT_WEIGHTS", ""))
+
+
+def tenant_id(api_key: str) -> str:
+    """Tenants are API keys, identified by a hash so the key itself is never stored or logged."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+class Flow:
+    """One request's (or background job's) stream of batches through the scheduler."""
+
+    def __init__(self, tenant: str, request_id: str, priority: int):
+        self.tenant = tenant
+        self.request_id = request_id
+        self.priority = priority
+        self.batches = 0
+        self.holding = None
+
+
+class FairScheduler:
+    """
+    Weighted fair queuing of service batches across tenants. Each waiting batch is tagged on
+    its tenant's virtual clock (start = max(system clock, tenant's last finish), finish =
+    start + 1/weight), and a free slot goes to the lowest (class, finish tag): interactive
+    before bulk, then whichever tenant has had the least service for its weight. A request
+    has one batch outstanding at a time, so a tenant's concurrent requests take turns.
+    """
+
+    def __init__(self, slots: int = LLM_SLOTS):
+        self.slots = slots
+        self.cond = threading.Condition()
+        self.running = {INTERACTIVE: 0, BULK: 0}
+        self.waiting = []
+        self.virtual = 0.0
+        self.finish = {}
+        self.seq = itertools.count()
+        self.dispatched = {INTERACTIVE: 0, BULK: 0}
+        self.waited = {INTERACTIVE: 0.0, BULK: 0.0}
+        self.max_wait = {INTERACTIVE: 0.0, BULK: 0.0}
+
+    def _free(self, priority: int) -> bool:
+        if sum(self.running.values()) >= self.slots:
+            return False
+        return priority == INTERACTIVE or self.running[BULK] < max(1, self.slots - INTERACTIVE_RESERVED)
+
+    def acquire(self, flow: Flow):
+        queued = time.time()
+        with self.cond:
+            start = max(self.virtual, self.finish.get(flow.tenant, 0.0))
+            finish = start + 1.0 / TENANT_WEIGHTS.get(flow.tenant, 1.0)
+            self.finish[flow.tenant] = finish
+            entry = (flow.priority, finish, next(self.seq), start)
+            heapq.heappush(self.waiting, entry)
+            while self.waiting[0] is not entry or not self._free(flow.priority):
+                self.cond.wait()
+            heapq.heappop(self.waiting)
+            self.virtual = max(self.virtual, start)
+            self.running[flow.priority] += 1
+            flow.holding = flow.priority
+
+            waited = time.time() - queued
+            self.dispatched[flow.priority] += 1
+            self.waited[flow.priority] += waited
+            self.max_wait[flow.priority] = max(self.max_wait[flow.priority], waited)
+            # The next batch in line may fit in another free slot
+            self.cond.notify_all()
+
+    def release(self, flow: Flow):
+        if flow.holding is None:
+            return
+        with self.cond:
+            self.running[flow.holding] -= 1
+            flow.holding = None
+            self.cond.notify_all()
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {
+                "slots": self.slots,
+                "waiting": len(self.waiting),
+                **{
+                    name: {
+                        "running": self.running[c],
+                        "dispatched": self.dispatched[c],
+                        "avg_wait_s": round(self.waited[c] / self.dispatched[c], 3) if self.dispatched[c] else 0.0,
+                        "max_wait_s": round(self.max_wait[c], 3),
+                    }
+                    for c, name in CLASSES.items()
+                },
+            }
+
+
+_scheduler = FairScheduler()
+_local = threading.local()
+
+
+@contextmanager
+def flow(tenant: str, request_id: str, priority: int = INTERACTIVE):
+    """Schedules the batches run in this thread as one flow of tenant; see services/progress.py."""
+    previous = getattr(_local, "flow", None)
+    current = Flow(tenant, request_id, priority)
+    _local.flow = current
+    try:
+        yield current
+    finally:
+        _scheduler.release(current)
+        _local.flow = previous
+
+
+def announce(batches: int):
+    current = getattr(_local, "flow", None)
+    if current is None:
+        return
+    current.batches += batches
+    if current.priority == INTERACTIVE and current.batches > BULK_AFTER_BATCHES:
+        current.priority = BULK
+        logger.info(f"🐢 {current.request_id}: {current.batches} batches, scheduling as bulk")
+
+
+def next_batch():
+    """Blocks until the current flow may start its next batch (gives back the slot it held)."""
+    current = getattr(_local, "flow", None)
+    if current is None or _scheduler.slots <= 0:
+        return
+    _scheduler.release(current)
+    _scheduler.acquire(current)
+
+
+def batch_done():
+    current = getattr(_local, "flow", None)
+    if current is not None:
+        _scheduler.release(current)
+
+
+def scheduler_stats() -> dict:
+    return _scheduler.stats()
@@ -0,0 +1,178 @@
+import json
+import logging
+from typing import List
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Response schemas sent with each stage's generation config (providers translate them to
+# their own schema format). Keyed outputs are lists of objects carrying their key ("w" / "m")
+# because response schemas have no free-form maps. Fields with defaults are optional.
+
+
+class BOQRow(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    item_no: int = Field(alias="Item No.")
+    Work: str
+    State: str = ""
+    Tier: str = ""
+    Length: float = 0.0
+    Width: float = 0.0
+    Quantity: float
+    Unit: str
+
+
+class RoomExtra(BaseModel):
+    Work: str
+    Quantity: float
+    Unit: str
+
+
+class RoomRow(BaseModel):
+    """A room read off the plan; services/room_geometry.py expands it into BOQ rows."""
+    Room: str
+    Type: str = ""
+    State: str = ""
+    Tier: str = ""
+    Length: float
+    Width: float
+    Height: float = 0.0
+    Doors: int = 0
+    Windows: int = 0
+    Flooring: str = ""
+    Ceiling: str = ""
+    Extras: List[RoomExtra] = []
+
+
+class TankBOQRow(BOQRow):
+    Tank_Type: str = ""
+    Capacity: float = 0.0
+    Height: float = 0.0
+
+
+class ExecutionStep(BaseModel):
+    step: int
+    activity: str
+    estimated_hours: float
+    setup_hours: float = 0.0
+    optimization_note: str = ""
+
+
+class TankExecutionStep(ExecutionStep):
+    safety_requirements: str = ""
+
+
+class WBSEntry(BaseModel):
+    w: str
+    planning: List[str] = []
+    procurement: List[str] = []
+    execution: List[ExecutionStep]
+    qc: List[str] = []
+    billing: List[str] = []
+
+
+class TankWBSEntry(WBSEntry):
+    execution: List[TankExecutionStep]
+
+
+# Lean variants for the compact / numbers verbosity levels: narrative fields are left out of
+# the schema, so the model does not spend output tokens on them.
+class LeanExecutionStep(BaseModel):
+    step: int
+    activity: str
+    estimated_hours: float
+    setup_hours: float = 0.0
+
+
+class CompactWBSEntry(BaseModel):
+    w: str
+    planning: List[str] = []
+    procurement: List[str] = []
+    execution: List[LeanExecutionStep]
+    qc: List[str] = []
+    billing: List[str] = []
+
+
+class NumbersWBSEntry(BaseModel):
+    w: str
+    procurement: List[str] = []
+    execution: List[LeanExecutionStep]
+
+
+class BOMLine(BaseModel):
+    material: str
+    quantity: float
+    unit: str
+    note: str = ""
+
+
+class Rate(BaseModel):
+    m: str
+    rate_material: float
+    rate_labor: float
+    subtotal: float = 0.0
+    remarks: str = ""
+
+
+class NumbersRate(BaseModel):
+    m: str
+    rate_material: float
+    rate_labor: float
+
+
+class CompactRate(NumbersRate):
+    remarks: str = ""
+
+
+_adapters = {}
+
+
+def _adapter(model):
+    if model not in _adapters:
+        _adapters[model] = TypeAdapter(List[model])
+    return _adapters[model]
+
+
+def decode_list(model, raw_text: str) -> list:
+    """
+    Decodes a schema-constrained response straight into dicts (aliases restored).
+    If the list as a whole fails validation, the valid items are kept and the rest dropped.
+    """
+    try:
+        items = _adapter(model).validate_json(raw_text or "[]")
+    except ValidationError as e:
+        try:
+            data = json.loads(raw_text)
+        except json.JSONDecodeError:
+            logger.error(f"Response is not valid JSON: {(raw_text or '')[:200]}")
+            return []
+        if not isinstance(data, list):
+            logger.error(f"Expected a JSON list, got {type(data).__name__}")
+            return []
+        items = []
+        for item in data:
+            try:
+                items.append(model.model_validate(item))
+            except ValidationError:
+                pass
+        logger.warning(f"⚠️ {model.__name__}: kept {len(items)}/{len(data)} items ({e.error_count()} validation errors)")
+    return [item.model_dump(by_alias=True) for item in items]
+
+
+def accepts(model):
+    """Reply check for generate_text: a non-empty JSON list whose every item validates against model."""
+    def accept(raw_text: str) -> bool:
+        try:
+            return bool(_adapter(model).validate_json(raw_text))
+        except ValidationError:
+            return False
+    return accept
+
+
+def decode_keyed(model, key: str, raw_text: str) -> dict:
+    """[{key: k, ...}, ...] -> {k: {...}} for responses keyed by an input name."""
+    out = {}
+    for item in decode_list(model, raw_text):
+        out[item.pop(key)] = item
+    return out
@@ -0,0 +1,223 @@
+import abc
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# memory: single process only | sqlite: shared by every worker on the host | redis: shared across hosts
+STATE_BACKEND = os.getenv("LOGICLEAP_STATE_BACKEND", "sqlite")
+STATE_PATH = os.getenv("LOGICLEAP_STATE_PATH", os.path.join(tempfile.gettempdir(), "logicleap_state.db"))
+REDIS_URL = os.getenv("LOGICLEAP_REDIS_URL", "redis://localhost:6379/0")
+# Expired keys are only skipped on read; every PURGE_EVERY writes a store deletes them
+PURGE_EVERY = int(os.getenv("LOGICLEAP_STATE_PURGE_EVERY", "500"))
+
+
+class StateStore(abc.ABC):
+    """
+    Minimal key/value interface for state that must be shared between workers.
+    Values are JSON-serialisable; ttl is in seconds (None = no expiry).
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str):
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value, ttl: float = None):
+        ...
+
+    @abc.abstractmethod
+    def add(self, key: str, value, ttl: float = None) -> bool:
+        """Set only if the key is absent (or expired). Returns True when this call wrote it."""
+
+    @abc.abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abc.abstractmethod
+    def reserve_slot(self, key: str, interval: float) -> float:
+        """Atomically books the next call slot for a rate limit; returns the timestamp to start at."""
+
+
+class MemoryStore(StateStore):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self._writes = 0
+
+    def _purge(self):
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            now = time.time()
+            for key in [k for k, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]:
+                del self._data[key]
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._purge()
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        with self._lock:
+            if self._live(key):
+                return False
+            self._purge()
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def reserve_slot(self, key, interval):
+        with self._lock:
+            now = time.time()
+            entry = self._live(key)
+            slot = max(now, entry[0] if entry else now)
+            self._data[key] = (slot + interval, None)
+            return slot
+
+
+class SQLiteStore(StateStore):
+    """File-backed store; SQLite's write lock makes add/reserve_slot atomic across processes."""
+
+    def __init__(self, path: str = STATE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = itertools.count(1)
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS kv_expires_at ON kv (expires_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _purge(self):
+        # Each worker process counts its own writes, so the table is swept about every PURGE_EVERY sets
+        if next(self._writes) % PURGE_EVERY == 0:
+            self._conn().execute("DELETE FROM kv WHERE expires_at < ?", (time.time(),))
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, json.dumps(value), expires_at)
+        )
+        self._purge()
+
+    def add(self, key, value, ttl=None):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT 1 FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), now + ttl if ttl else None),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            self._purge()
+        return row is None
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def reserve_slot(self, key, interval):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+            slot = max(now, json.loads(row[0]) if row else now)
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, NULL)", (key, json.dumps(slot + interval))
+            )
+            conn.execute("COMMIT")
+            return slot
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class RedisStore(StateStore):
+    def __init__(self, url: str = REDIS_URL):
+        import redis  # optional dependency, only needed for multi-host deployments
+        self.client = redis.Redis.from_url(url)
+        self._reserve = self.client.register_script(
+            """
+            local now = tonumber(ARGV[1])
+            local nxt = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+            local slot = math.max(now, nxt)
+            redis.call('SET', KEYS[1], tostring(slot + tonumber(ARGV[2])))
+            return tostring(slot)
+            """
+        )
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(key, json.dumps(value), nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def reserve_slot(self, key, interval):
+        return float(self._reserve(keys=[key], args=[time.time(), interval]))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> StateStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            if STATE_BACKEND == "memory":
+                _store = MemoryStore()
+            elif STATE_BACKEND == "redis":
+                _store = RedisStore()
+            else:
+                _store = SQLiteStore()
+            logger.info(f"🗄️ Shared state backend: {type(_store).__name__}")
+        return _store
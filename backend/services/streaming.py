@@ -0,0 +1,65 @@
+import json
+import sys
+
+# BOM and cost lines are encoded and sent in chunks as they are produced, so a response on a
+# very large project never holds every line (or the whole JSON body) in memory at once.
+LINES_PER_CHUNK = 500
+
+
+def encode(value) -> str:
+    """Same encoding as FastAPI's JSONResponse, so a streamed body matches the buffered one."""
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+
+def intern_text(value):
+    """Names repeated on every line (materials, units, rooms) share one string object."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class CostRollup:
+    """Running totals of priced lines, so an estimate can be summarised while it streams."""
+
+    __slots__ = ("city_tier", "total", "categories", "header")
+
+    def __init__(self, city_tier: str, categories=None, header: dict = None):
+        self.city_tier = city_tier
+        self.total = 0
+        self.categories = dict.fromkeys(categories, 0) if categories is not None else None
+        self.header = header or {}
+
+    def add(self, line: dict) -> dict:
+        item_total = (line["Rate_Mat"] + line["Rate_Lab"]) * line["Qty"]
+        self.total += item_total
+        if self.categories is not None:
+            self.categories[line["Category"]] += item_total
+        return line
+
+    def summary(self) -> dict:
+        summary = {**self.header, "city_tier": self.city_tier, "total_cost": round(self.total, 2), "currency": "INR"}
+        if self.categories is not None:
+            summary["category_breakdown"] = {k: round(v, 2) for k, v in self.categories.items()}
+        return summary
+
+
+def stream_list(items):
+    """Any iterable of JSON-able items -> a JSON array, yielded LINES_PER_CHUNK items at a time."""
+    chunk, opened = [], False
+    for item in items:
+        chunk.append(encode(item))
+        if len(chunk) == LINES_PER_CHUNK:
+            yield ("," if opened else "[") + ",".join(chunk)
+            chunk, opened = [], True
+    if chunk:
+        yield ("," if opened else "[") + ",".join(chunk)
+        opened = True
+    yield "]" if opened else "[]"
+
+
+def stream_estimate(lines, rollup: CostRollup):
+    """
+    Priced lines -> the {"line_items", "project_summary"} estimate as a JSON stream. The totals
+    are accumulated as the lines go out, so the summary comes after them.
+    """
+    yield '{"line_items":'
+    yield from stream_list(rollup.add(line) for line in lines)
+    yield f',"project_summary":{encode(rollup.summary())}}}'
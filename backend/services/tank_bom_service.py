@@ -1,87 +1,78 @@
-import google.generativeai as genai
-import json
-import time
 import logging
-import re
+from services.llm_provider import bind_model
+from services.prompt_utils import compact_json
+from services.llm_client import RateLimiter, generate_text
+from services import progress
+from services.streaming import intern_text
+from services.bom_service import quantity_scale, scale_materials
+from services.schemas import BOMLine, accepts, decode_list
+from services.tank_tiers import base_procurement, row_tier, split_service_tier, tier_materials
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = """Role: Tank Cleaning & Maintenance Specialist.
+Task: Calculate exact material and chemical quantities for the work item in ITEM.
+
+INPUT: ITEM is JSON {"w": work name, "d": quantity with unit, "m": procurement list from the WBS, "t": tank type, "c": capacity in liters}.
+
+INSTRUCTIONS:
+1. Ignore empty "m" lists. INFER standard tank cleaning materials, chemicals, PPE, and equipment for the work item "w".
+2. For tank cleaning, include:
+   - Cleaning chemicals (detergents, disinfectants, degreasers)
+   - Safety equipment (PPE, harnesses, gas detectors)
+   - Cleaning tools (brushes, pumps, vacuum equipment)
+   - Water requirements
+   - Waste disposal materials
+3. Apply 10% wastage for chemicals and consumables, 5% for equipment.
+4. Consider tank type (water tank, septic tank, industrial tank) and size for quantity calculations.
+5. Keep "note" brief (max 10 words). NO special characters or ellipses (...).
+
+OUTPUT: a JSON list of {"material", "quantity", "unit", "note"} objects.
+
+Example materials for tank cleaning: Sodium Hypochlorite (bleach), Industrial Detergent, Protective Gloves, Safety Harness, Submersible Pump, Scrubbing Brushes, Potable Water, Waste Disposal Bags."""
+
 class TankBOMService:
     def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite"):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
-        self.config = genai.types.GenerationConfig(
-            temperature=0.1,
-            max_output_tokens=8192,
-            response_mime_type="application/json"
-        )
+        self.model = bind_model("bom", api_key, model_name, SYSTEM_PROMPT)
+        self.rate_limiter = RateLimiter(api_key)
+        self.config = {
+            "temperature": 0.1,
+            "max_output_tokens": 8192,
+            "response_mime_type": "application/json",
+            "response_schema": list[BOMLine],
+        }
         self.BATCH_SIZE = 10
 
-    def clean_and_parse_json(self, raw_text: str):
-        try:
-            text = raw_text.replace("```json", "").replace("```", "").strip()
-            text = re.sub(r',\s*\}', '}', text)
-            text = re.sub(r',\s*\]', ']', text)
-            return json.loads(text)
-        except json.JSONDecodeError:
-            try:
-                match = re.search(r'\[[\s\S]*\]', text)
-                if match: return json.loads(match.group(0))
-            except: pass
-        return []
+    def batch_prompt(self, batch_items: list) -> str:
+        item = batch_items[0]
+        payload = {
+            "w": item["work_name"],
+            "d": item["dims"],
+            "m": item["materials"],
+            "t": item["tank_type"],
+            "c": item["capacity"],
+        }
+        return f"ITEM:{compact_json(payload)}"
 
     def calculate_bom_batch(self, batch_items: list) -> dict:
-        item = batch_items[0]
-        prompt = f"""
-        Role: Tank Cleaning & Maintenance Specialist.
-        Task: Calculate exact material and chemical quantities for: "{item['work_name']}".
-        
-        INPUT DATA:
-        {json.dumps(item, indent=2)}
-
-        INSTRUCTIONS:
-        1. Ignore empty 'materials' lists. INFER standard tank cleaning materials, chemicals, PPE, and equipment for "{item['work_name']}".
-        2. For tank cleaning, include:
-           - Cleaning chemicals (detergents, disinfectants, degreasers)
-           - Safety equipment (PPE, harnesses, gas detectors)
-           - Cleaning tools (brushes, pumps, vacuum equipment)
-           - Water requirements
-           - Waste disposal materials
-        3. Apply 10% wastage for chemicals and consumables, 5% for equipment.
-        4. Consider tank type (water tank, septic tank, industrial tank) and size for quantity calculations.
-        5. Keep "note" brief (max 10 words). NO special characters or ellipses (...).
-        
-        OUTPUT FORMAT:
-        Return ONLY a JSON LIST of objects. Do not wrap in a dictionary.
-        [
-            {{ "material": "string", "quantity": number, "unit": "string", "note": "string" }}
-        ]
-        
-        Example materials for tank cleaning:
-        - Sodium Hypochlorite (bleach)
-        - Industrial Detergent
-        - Protective Gloves
-        - Safety Harness
-        - Submersible Pump
-        - Scrubbing Brushes
-        - Potable Water
-        - Waste Disposal Bags
-        """
+        prompt = self.batch_prompt(batch_items)
         try:
-            response = self.model.generate_content(prompt, generation_config=self.config)
-            return self.clean_and_parse_json(response.text)
+            raw_text = generate_text(self.model, prompt, self.config, self.rate_limiter, accepts(BOMLine))
+            return decode_list(BOMLine, raw_text)
         except Exception as e:
             logger.error(f"Tank BOM Generation Error: {e}")
             return []
 
-    def process(self, wbs_data: list):
+    def batches(self, wbs_data: list) -> list:
+        # One BOM per physical tank; service-tier equipment is added per row in explode_row
         unique_tasks = {}
         for item in wbs_data:
-            name = item.get("Work", "General")
+            name, _ = split_service_tier(item.get("Work", "General"))
             if name not in unique_tasks:
                 unique_tasks[name] = {
                     "dimensions": f"{item.get('Quantity')} {item.get('Unit')}",
-                    "materials": item.get("WBS_Procurement", []),
+                    "quantity": item.get("Quantity"),
+                    "materials": base_procurement(item.get("WBS_Procurement", [])),
                     "tank_type": item.get("Tank_Type", "Water Tank"),  # Tank-specific field
                     "capacity": item.get("Capacity", "N/A")  # Tank capacity
                 }
@@ -90,55 +81,83 @@ class TankBOMService:
             {
                 "work_name": k, 
                 "dims": v["dimensions"], 
+                "quantity": v["quantity"],
                 "materials": v["materials"],
                 "tank_type": v.get("tank_type", "Water Tank"),
                 "capacity": v.get("capacity", "N/A")
             } 
             for k, v in unique_tasks.items()
         ]
-        
-        logger.info(f"📍 Generating Tank Cleaning BOM for {len(task_list)} unique work items...")
+        return [task_list[i : i + self.BATCH_SIZE] for i in range(0, len(task_list), self.BATCH_SIZE)]
+
+    def plan(self, wbs_data: list) -> list:
+        """The batches build_library() would send to the model, without sending them."""
+        return self.batches(wbs_data)
+
+    def build_library(self, wbs_data: list) -> dict:
+        """tank -> {"quantity": quantity the BOM was generated for, "materials": [...]}"""
+        batches = self.batches(wbs_data)
+        logger.info(f"📍 Generating Tank Cleaning BOM for {sum(len(b) for b in batches)} unique work items...")
 
         bom_library = {}
-        for i in range(0, len(task_list), self.BATCH_SIZE):
-            batch = task_list[i : i + self.BATCH_SIZE]
+        progress.begin(len(batches))
+        for batch in batches:
+            progress.checkpoint()
             
             materials_list = self.calculate_bom_batch(batch)
             work_name = batch[0]['work_name']
             
-            if materials_list and isinstance(materials_list, list):
-                bom_library[work_name] = materials_list
-            else:
+            if not (materials_list and isinstance(materials_list, list)):
                 logger.warning(f"⚠️ Failed to generate Tank BOM for {work_name}")
-                bom_library[work_name] = []
-            
-            time.sleep(1.0)
+                materials_list = []
+            bom_library[work_name] = {"quantity": batch[0]["quantity"], "materials": materials_list}
+            progress.advance()
 
-        final_bom = []
+        return bom_library
+
+    def explode_row(self, row: dict, bom_library: dict) -> list:
+        work_name = row.get("Work", "General")
+        base_name, tier = split_service_tier(work_name)
+        entry = bom_library.get(base_name) or {}
+        # Tanks sharing a name (e.g. across a portfolio's projects) get their BOM scaled to each row's size
+        materials = scale_materials(entry.get("materials", []), quantity_scale(row, entry.get("quantity")))
+        
+        if not materials:
+            materials = [
+                { 
+                    "material": f"Standard Cleaning Materials for {work_name}", 
+                    "quantity": 1, 
+                    "unit": "LS", 
+                    "note": "Estimated Lumpsum" 
+                }
+            ]
+
+        if row.get("Service_Type") or tier:
+            materials = materials + tier_materials(row_tier(row))
+
+        lines = []
+        for m in materials:
+            lines.append({
+                "Item No.": row.get("Item No."),
+                "Location": intern_text(row.get("State", "General")),
+                "Tank/Area": intern_text(row.get("Work", "N/A")),  # Changed from "Room" to "Tank/Area"
+                "Material": intern_text(m.get("material")),
+                "Est_Quantity": m.get("quantity"),
+                "Unit": intern_text(m.get("unit")),
+                "Calculation_Basis": m.get("note")
+            })
+            if "Project" in row:
+                lines[-1]["Project"] = row["Project"]
+        return lines
+
+    def iter_lines(self, wbs_data, bom_library: dict):
+        """BOM lines row by row, exploded as they are consumed."""
         for row in wbs_data:
-            work_name = row.get("Work", "General")
-            materials = bom_library.get(work_name, [])
-            
-            if not materials:
-                materials = [
-                    { 
-                        "material": f"Standard Cleaning Materials for {work_name}", 
-                        "quantity": 1, 
-                        "unit": "LS", 
-                        "note": "Estimated Lumpsum" 
-                    }
-                ]
-
-            for m in materials:
-                final_bom.append({
-                    "Item No.": row.get("Item No."),
-                    "Location": row.get("State", "General"),
-                    "Tank/Area": row.get("Work", "N/A"),  # Changed from "Room" to "Tank/Area"
-                    "Material": m.get("material"),
-                    "Est_Quantity": m.get("quantity"),
-                    "Unit": m.get("unit"),
-                    "Calculation_Basis": m.get("note")
-                })
+            yield from self.explode_row(row, bom_library)
+
+    def process(self, wbs_data: list):
+        bom_library = self.build_library(wbs_data)
+        final_bom = list(self.iter_lines(wbs_data, bom_library))
         
         logger.info(f"✅ Tank Cleaning BOM Complete. Total Material Lines: {len(final_bom)}")
         return final_bom
\ No newline at end of file
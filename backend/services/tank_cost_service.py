@@ -1,116 +1,102 @@
-import google.generativeai as genai
-import json
-import time
 import logging
-import re
+from services.llm_provider import bind_model
+from services.model_router import is_number
+from services.prompt_utils import compact_json
+from services.llm_client import RateLimiter, generate_text
+from services import progress
+from services.schemas import CompactRate, NumbersRate, Rate, accepts, decode_keyed
+from services.verbosity import DEFAULT_LEVEL, normalize_verbosity
+from services.streaming import CostRollup, intern_text
+from services.price_library import PriceLibrary
+from services.rate_index import get_rate_index
+from services.tier_pricing import TANK_TIER_FACTORS, TIERS, multi_tier_estimate
 
 logger = logging.getLogger(__name__)
 
+PROMPT_BODY = """Role: Tank Cleaning & Sanitation Cost Specialist.
+Location Context: India, city tier given as TIER (T1/T2/T3).
+Task: Provide detailed cost estimates for tank cleaning materials, chemicals, labor, and equipment.
+
+MARKET BENCHMARKS (2026 BASELINE):
+- Use industry-standard rates for cleaning chemicals and equipment
+- Material costs include transport and handling charges
+- Labor rates for specialized tank cleaning (confined space certified workers)
+- Equipment rental rates (pumps, safety gear, testing kits)
+- Waste disposal charges as per municipal guidelines
+
+TANK CLEANING COST COMPONENTS:
+1. CHEMICALS & CONSUMABLES: Disinfectants (Sodium Hypochlorite, Chlorine tablets), Detergents and degreasers, Water treatment chemicals, pH adjusters and flocculants
+2. SAFETY EQUIPMENT (Rental/Usage): Confined space entry equipment, Gas detectors (H2S, CO, O2), Safety harnesses and lifelines, PPE (Gloves, boots, masks, coveralls), Ventilation fans
+3. CLEANING EQUIPMENT: Submersible pumps, Pressure washers, Scrubbing brushes and tools, Vacuum equipment, Water quality testing kits
+4. LABOR: Skilled tank cleaners (confined space certified), Safety supervisors, Quality testing personnel, Waste disposal handlers
+5. SERVICES: Water quality testing (pre & post), Sludge disposal, Waste water treatment, Certification fees
+
+TIER-BASED PRICING:
+- T1: Metro cities (Higher rates due to stricter regulations)
+- T2: Tier-2 cities (Moderate rates)
+- T3: Smaller towns (Lower rates, limited specialized services)
+
+EXAMPLE RATES FOR REFERENCE:
+- Sodium Hypochlorite (10% solution): ₹80-120/Liter (material) + ₹30/Liter (handling)
+- Tank scrubbing labor: ₹500-800/sqm (T1), ₹300-500/sqm (T2), ₹200-350/sqm (T3)
+- Water quality testing: ₹1500-3000/test
+- Sludge disposal: ₹50-80/kg
+- Confined space safety equipment: ₹500-1000/day (rental)
+
+INPUT: BOM is a JSON list of {"m": material name, "u": unit, "q": quantity, "a": tank/area}.
+
+"""
+OUTPUT_INTRO = 'OUTPUT: Return a JSON list with one object per input material; set "m" to the exact input "m" value:\n'
+# Output contract per verbosity level (the model is not asked for fields a level drops)
+OUTPUT_CONTRACTS = {
+    "full": """[{"m": "Material Name", "rate_material": number (material/chemical/equipment cost per unit), "rate_labor": number (labor/service charge per unit), "subtotal": number ((rate_material + rate_labor) * quantity), "remarks": "string (brief justification, e.g. 'Industrial grade disinfectant with disposal')"}]""",
+    "compact": """[{"m": "Material Name", "rate_material": number (material/chemical/equipment cost per unit), "rate_labor": number (labor/service charge per unit), "remarks": "string (max 4 words)"}]""",
+    "numbers": """[{"m": "Material Name", "rate_material": number (material/chemical/equipment cost per unit), "rate_labor": number (labor/service charge per unit)}]""",
+}
+SYSTEM_PROMPTS = {level: PROMPT_BODY + OUTPUT_INTRO + contract for level, contract in OUTPUT_CONTRACTS.items()}
+RESPONSE_MODELS = {"full": Rate, "compact": CompactRate, "numbers": NumbersRate}
+# Cost breakdown categories (see _categorize_material), in summary order
+CATEGORIES = ["Chemicals & Consumables", "Safety Equipment", "Cleaning Equipment", "Labor & Services", "Testing & Disposal"]
+
 class TankCostService:
-    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite"):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
-        self.config = genai.types.GenerationConfig(
-            temperature=0.0,
-            response_mime_type="application/json"
-        )
+    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite", verbosity: str = DEFAULT_LEVEL):
+        self.verbosity = normalize_verbosity(verbosity)
+        self.response_model = RESPONSE_MODELS[self.verbosity]
+        self.model = bind_model("cost", api_key, model_name, SYSTEM_PROMPTS[self.verbosity])
+        self.rate_limiter = RateLimiter(api_key)
+        self.price_cache = PriceLibrary("tank", self.verbosity)
+        self.rate_index = get_rate_index()
+        self.config = {
+            "temperature": 0.0,
+            "response_mime_type": "application/json",
+            "response_schema": list[self.response_model],
+        }
         self.BATCH_SIZE = 25
 
-    def clean_json(self, raw_text: str):
-        try:
-            text = raw_text.replace("```json", "").replace("```", "").strip()
-            return json.loads(text)
-        except:
-            return {}
+    def is_valid_pricing(self, pricing) -> bool:
+        if not isinstance(pricing, dict):
+            return False
+        mat_rate, lab_rate = pricing.get("rate_material"), pricing.get("rate_labor")
+        return is_number(mat_rate) and is_number(lab_rate) and mat_rate >= 0 and lab_rate >= 0 and (mat_rate + lab_rate) > 0
+
+    def batch_prompt(self, batch_items: list, city_tier: str) -> str:
+        payload = [
+            {"m": item["material"], "u": item["unit"], "q": item["qty"], "a": item["tank_area"]}
+            for item in batch_items
+        ]
+        return f"TIER:{city_tier}\nBOM:{compact_json(payload)}"
 
     def estimate_costs_batch(self, batch_items: list, city_tier: str) -> dict:
-        prompt = f"""
-        Role: Tank Cleaning & Sanitation Cost Specialist.
-        Location Context: India, {city_tier} City.
-        
-        Task: Provide detailed cost estimates for tank cleaning materials, chemicals, labor, and equipment.
-
-        MARKET BENCHMARKS (2026 BASELINE):
-        - Use industry-standard rates for cleaning chemicals and equipment
-        - Material costs include transport and handling charges
-        - Labor rates for specialized tank cleaning (confined space certified workers)
-        - Equipment rental rates (pumps, safety gear, testing kits)
-        - Waste disposal charges as per municipal guidelines
-        
-        TANK CLEANING COST COMPONENTS:
-        1. CHEMICALS & CONSUMABLES:
-           - Disinfectants (Sodium Hypochlorite, Chlorine tablets)
-           - Detergents and degreasers
-           - Water treatment chemicals
-           - pH adjusters and flocculants
-           
-        2. SAFETY EQUIPMENT (Rental/Usage):
-           - Confined space entry equipment
-           - Gas detectors (H2S, CO, O2)
-           - Safety harnesses and lifelines
-           - PPE (Gloves, boots, masks, coveralls)
-           - Ventilation fans
-           
-        3. CLEANING EQUIPMENT:
-           - Submersible pumps
-           - Pressure washers
-           - Scrubbing brushes and tools
-           - Vacuum equipment
-           - Water quality testing kits
-           
-        4. LABOR:
-           - Skilled tank cleaners (confined space certified)
-           - Safety supervisors
-           - Quality testing personnel
-           - Waste disposal handlers
-           
-        5. SERVICES:
-           - Water quality testing (pre & post)
-           - Sludge disposal
-           - Waste water treatment
-           - Certification fees
-
-        TIER-BASED PRICING ({city_tier}):
-        - T1: Metro cities (Higher rates due to stricter regulations)
-        - T2: Tier-2 cities (Moderate rates)
-        - T3: Smaller towns (Lower rates, limited specialized services)
-
-        INPUT BOM:
-        {json.dumps(batch_items)}
-
-        OUTPUT REQUIREMENTS:
-        Return a JSON object where each key is the 'Material' name from the input.
-        Provide: 
-        1. mat_rate: Material/Chemical/Equipment cost per unit
-        2. lab_rate: Labor/Service charge per unit
-        3. total_item_cost: (mat_rate + lab_rate) * quantity
-        4. logic: Brief justification (e.g., 'Industrial grade disinfectant with disposal')
-
-        EXAMPLE RATES FOR REFERENCE:
-        - Sodium Hypochlorite (10% solution): ₹80-120/Liter (material) + ₹30/Liter (handling)
-        - Tank scrubbing labor: ₹500-800/sqm (T1), ₹300-500/sqm (T2), ₹200-350/sqm (T3)
-        - Water quality testing: ₹1500-3000/test
-        - Sludge disposal: ₹50-80/kg
-        - Confined space safety equipment: ₹500-1000/day (rental)
-
-        OUTPUT FORMAT:
-        {{
-          "Material Name": {{
-            "rate_material": number,
-            "rate_labor": number,
-            "subtotal": number,
-            "remarks": "string"
-          }}
-        }}
-        """
+        prompt = self.batch_prompt(batch_items, city_tier)
         try:
-            response = self.model.generate_content(prompt, generation_config=self.config)
-            return self.clean_json(response.text)
+            raw_text = generate_text(self.model, prompt, self.config, self.rate_limiter, accepts(self.response_model))
+            return decode_keyed(self.response_model, "m", raw_text)
         except Exception as e:
             logger.error(f"Tank Cost Batch Error: {e}")
             return {}
 
-    def process(self, bom_data: list, city_tier: str):
+    def known_prices(self, bom_data: list, city_tier: str):
+        """(known prices, unique materials still needing the model, how many prices came from the DSR index)"""
         material_catalog = {}
         for item in bom_data:
             mat_name = item.get("Material")
@@ -124,69 +110,103 @@ class TankCostService:
         
         unique_mats = list(material_catalog.values())
         price_library = {}
-        
-        logger.info(f"💰 Pricing {len(unique_mats)} unique tank cleaning materials & services...")
-        for i in range(0, len(unique_mats), self.BATCH_SIZE):
-            batch = unique_mats[i : i + self.BATCH_SIZE]
+        unpriced = []
+        indexed = 0
+        for mat in unique_mats:
+            # DSR items are priced locally; only materials the index cannot match reach the model
+            pricing = self.rate_index.price(mat["material"], mat["unit"], city_tier, self.tier_factors(mat["material"], city_tier))
+            if pricing is not None:
+                indexed += 1
+            else:
+                pricing = self.price_cache.get(city_tier, mat["material"], mat["unit"])
+            if pricing is not None:
+                price_library[mat["material"]] = pricing
+            else:
+                unpriced.append(mat)
+
+        return price_library, unpriced, indexed
+
+    def batches(self, unpriced: list) -> list:
+        return [unpriced[i : i + self.BATCH_SIZE] for i in range(0, len(unpriced), self.BATCH_SIZE)]
+
+    def plan(self, bom_data: list, city_tier: str) -> list:
+        """The batches build_price_library() would send to the model, without sending them."""
+        return self.batches(self.known_prices(bom_data, city_tier)[1])
+
+    def build_price_library(self, bom_data: list, city_tier: str) -> dict:
+        price_library, unpriced, indexed = self.known_prices(bom_data, city_tier)
+        logger.info(f"💰 Pricing {len(unpriced)} new tank cleaning materials & services ({indexed} from the DSR index, {len(price_library) - indexed} from shared price library)...")
+        batches = self.batches(unpriced)
+        progress.begin(len(batches))
+        for batch in batches:
+            progress.checkpoint()
             results = self.estimate_costs_batch(batch, city_tier)
-            if results: 
-                price_library.update(results)
-            time.sleep(1)
+            for mat in batch:
+                pricing = (results or {}).get(mat["material"])
+                if isinstance(pricing, dict):
+                    price_library[mat["material"]] = pricing
+                    # Only usable rates are shared; a zero or broken one is asked again next time
+                    if self.is_valid_pricing(pricing):
+                        self.price_cache.put(city_tier, mat["material"], mat["unit"], pricing)
+            progress.advance()
+
+        return price_library
 
-        final_estimate = []
-        grand_total = 0
+    def price_row(self, row: dict, price_library: dict) -> dict:
+        mat_name = row.get("Material")
+        pricing = price_library.get(mat_name, {
+            "rate_material": 0, 
+            "rate_labor": 0, 
+            "remarks": "Pricing Unavailable"
+        })
         
-        # Track costs by category
-        category_totals = {
-            "Chemicals & Consumables": 0,
-            "Safety Equipment": 0,
-            "Cleaning Equipment": 0,
-            "Labor & Services": 0,
-            "Testing & Disposal": 0
-        }
+        qty = float(row.get("Est_Quantity", 0))
+        mat_rate = pricing.get("rate_material", 0)
+        lab_rate = pricing.get("rate_labor", 0)
+        item_total = (mat_rate + lab_rate) * qty
         
-        for row in bom_data:
-            mat_name = row.get("Material")
-            pricing = price_library.get(mat_name, {
-                "rate_material": 0, 
-                "rate_labor": 0, 
-                "remarks": "Pricing Unavailable"
-            })
-            
-            qty = float(row.get("Est_Quantity", 0))
-            mat_rate = pricing.get("rate_material", 0)
-            lab_rate = pricing.get("rate_labor", 0)
-            item_total = (mat_rate + lab_rate) * qty
-            grand_total += item_total
-            
-            # Categorize costs (basic categorization logic)
-            category = self._categorize_material(mat_name)
-            category_totals[category] += item_total
-            
-            final_estimate.append({
-                "Tank/Area": row.get("Tank/Area", "N/A"),  # Changed from "Room"
-                "Material": mat_name,
-                "Category": category,
-                "Qty": qty,
-                "Unit": row.get("Unit"),
-                "Rate_Mat": mat_rate,
-                "Rate_Lab": lab_rate,
-                "Subtotal": round(item_total, 2),
-                "Source": pricing.get("remarks")
-            })
+        line = {
+            "Tank/Area": intern_text(row.get("Tank/Area", "N/A")),  # Changed from "Room"
+            "Material": intern_text(mat_name),
+            "Category": self._categorize_material(mat_name),
+            "Qty": qty,
+            "Unit": intern_text(row.get("Unit")),
+            "Rate_Mat": mat_rate,
+            "Rate_Lab": lab_rate,
+            "Subtotal": round(item_total, 2),
+            "Source": pricing.get("remarks")
+        }
+        if "Project" in row:
+            line["Project"] = row["Project"]
+        return line
+
+    def iter_priced(self, bom_data, price_library: dict):
+        """Priced lines, computed as they are consumed."""
+        return (self.price_row(row, price_library) for row in bom_data)
+
+    def rollup(self, city_tier: str) -> CostRollup:
+        # Track costs by category
+        return CostRollup(city_tier, CATEGORIES, {"service_type": "Tank Cleaning"})
+
+    def summarize(self, line_items: list, city_tier: str) -> dict:
+        rollup = self.rollup(city_tier)
+        for line in line_items:
+            rollup.add(line)
         
-        logger.info(f"✅ Tank Cleaning Cost Estimate Complete. Total: ₹{round(grand_total, 2)}")
+        logger.info(f"✅ Tank Cleaning Cost Estimate Complete. Total: ₹{round(rollup.total, 2)}")
         
-        return {
-            "project_summary": {
-                "service_type": "Tank Cleaning",
-                "city_tier": city_tier,
-                "total_cost": round(grand_total, 2),
-                "currency": "INR",
-                "category_breakdown": {k: round(v, 2) for k, v in category_totals.items()}
-            },
-            "line_items": final_estimate
-        }
+        return {"project_summary": rollup.summary(), "line_items": line_items}
+
+    def process(self, bom_data: list, city_tier: str):
+        price_library = self.build_price_library(bom_data, city_tier)
+        return self.summarize(list(self.iter_priced(bom_data, price_library)), city_tier)
+
+    def process_tiers(self, bom_data: list, tiers=TIERS) -> dict:
+        """All tier estimates, each with its category_breakdown, from one pricing pass."""
+        return multi_tier_estimate(self, bom_data, tiers)
+
+    def tier_factors(self, material: str, tier: str) -> tuple:
+        return TANK_TIER_FACTORS[self._categorize_material(material)].get(tier, (1.0, 1.0))
     
     def _categorize_material(self, material_name: str) -> str:
         """Categorize materials based on their name"""
@@ -0,0 +1,149 @@
+import copy
+import re
+
+# Service tiers offered for every physical tank. The model describes each tank once;
+# the tiers are expanded here and applied downstream as deltas on a shared base WBS/BOM.
+# hours_factor is relative to the base (semi-automatic) execution plan.
+SERVICE_TIERS = {
+    "MANUAL": {
+        "label": "MANUAL CLEANING",
+        "hours_factor": 1.4,
+        "method": "Manual draining, bucket/shovel sludge removal, brush scrubbing, manual chlorination",
+        "procurement": ["Buckets & shovels for sludge removal", "Hand scrubbing brushes", "Manual chlorine dosing kit"],
+        "materials": [
+            {"material": "Sludge Buckets and Shovels", "quantity": 1, "unit": "Set", "note": "Manual sludge removal"},
+            {"material": "Hand Scrubbing Brushes", "quantity": 4, "unit": "Nos", "note": "Manual wall and floor scrubbing"},
+        ],
+    },
+    "SEMI-AUTOMATIC": {
+        "label": "SEMI-AUTOMATIC CLEANING",
+        "hours_factor": 1.0,
+        "method": "Electric pump draining, vacuum sludge extraction, high-pressure washing, automated dosing",
+        "procurement": ["High-pressure washer", "Vacuum sludge extractor", "Automated chemical dosing unit"],
+        "materials": [
+            {"material": "High Pressure Washer Rental", "quantity": 1, "unit": "Day", "note": "Pressure washing of surfaces"},
+            {"material": "Vacuum Sludge Extractor Rental", "quantity": 1, "unit": "Day", "note": "Mechanical sludge extraction"},
+        ],
+    },
+    "FULLY-AUTOMATIC": {
+        "label": "FULLY AUTOMATIC CLEANING",
+        "hours_factor": 0.6,
+        "method": "Robotic zero-entry cleaning, ultrasonic cleaning, UV disinfection, IoT water quality monitoring",
+        "procurement": ["Robotic tank cleaning system", "UV disinfection unit", "IoT water quality sensors"],
+        "materials": [
+            {"material": "Robotic Tank Cleaning System Rental", "quantity": 1, "unit": "Day", "note": "Zero entry robotic cleaning"},
+            {"material": "UV Disinfection Unit Rental", "quantity": 1, "unit": "Day", "note": "UV disinfection after cleaning"},
+            {"material": "IoT Water Quality Testing", "quantity": 1, "unit": "Test", "note": "Automated water analysis"},
+        ],
+    },
+}
+BASE_TIER = "SEMI-AUTOMATIC"
+
+_TIER_SUFFIX = re.compile(
+    r"\s*-\s*(MANUAL|SEMI[- ]AUTOMATIC|FULLY[- ]AUTOMATIC)\s+CLEANING(?:\s*-\s*.*)?$", re.IGNORECASE
+)
+
+
+def normalize_tier(value) -> str:
+    text = str(value or "").upper().replace(" ", "-")
+    for tier in SERVICE_TIERS:
+        if text.startswith(tier):
+            return tier
+    return BASE_TIER
+
+
+def split_service_tier(work_name: str):
+    """'Overhead Tank 1000L - MANUAL CLEANING - Complete Service' -> ('Overhead Tank 1000L', 'MANUAL')"""
+    match = _TIER_SUFFIX.search(work_name or "")
+    if not match:
+        return (work_name or "").strip(), None
+    return work_name[: match.start()].strip(), normalize_tier(match.group(1))
+
+
+def row_tier(row: dict) -> str:
+    return normalize_tier(row.get("Service_Type") or split_service_tier(row.get("Work", ""))[1])
+
+
+def expand_service_tiers(tanks: list) -> list:
+    """One identified tank -> three BOQ rows (one per service tier) with identical dimensions."""
+    rows = []
+    for tank in tanks:
+        base_name, _ = split_service_tier(tank.get("Work", "Water Tank"))
+        for tier, spec in SERVICE_TIERS.items():
+            row = copy.deepcopy(tank)
+            row["Item No."] = len(rows) + 1
+            row["Work"] = f"{base_name} - {spec['label']} - Complete Service"
+            row["Service_Type"] = tier
+            rows.append(row)
+    return rows
+
+
+def apply_wbs_tier(wbs: dict, tier: str) -> dict:
+    """Base WBS -> tier WBS: execution hours scaled, tier method and equipment added."""
+    spec = SERVICE_TIERS[normalize_tier(tier)]
+    wbs = copy.deepcopy(wbs)
+    for step in wbs.get("execution", []):
+        if isinstance(step, dict) and isinstance(step.get("estimated_hours"), (int, float)):
+            step["estimated_hours"] = round(step["estimated_hours"] * spec["hours_factor"], 1)
+    wbs["planning"] = list(wbs.get("planning", [])) + [f"Service method: {spec['method']}"]
+    wbs["procurement"] = list(wbs.get("procurement", [])) + spec["procurement"]
+    return wbs
+
+
+def base_procurement(procurement: list) -> list:
+    """Drops the tier-specific equipment added by apply_wbs_tier so all tiers share one BOM prompt."""
+    tier_items = {item for spec in SERVICE_TIERS.values() for item in spec["procurement"]}
+    return [item for item in procurement or [] if item not in tier_items]
+
+
+def tier_materials(tier: str) -> list:
+    return copy.deepcopy(SERVICE_TIERS[normalize_tier(tier)]["materials"])
+
+
+# Base (semi-automatic) execution hours by capacity band in liters, and the extra time
+# some tank types need. The model plans each tank type once at the reference capacity;
+# every other capacity is scaled along the productivity curves and kept inside its band.
+TANK_REFERENCE_CAPACITY = 5000
+TANK_SIZE_BANDS = [(2000, 4, 6), (10000, 6, 10), (None, 10, 16)]
+TANK_TYPE_FACTORS = {"septic": 1.3, "industrial": 1.5}
+
+
+# "5000", "5,000 Liters", "5000L", "5 KL"
+_CAPACITY = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(kl|kilo ?lit(?:er|re)s?|l|lt|ltrs?|lit(?:er|re)s?)?\.?\s*$")
+
+
+def parse_capacity(value):
+    """Tank capacity in liters, or None when it cannot be read."""
+    match = _CAPACITY.match(str(value if value is not None else "").lower().replace(",", ""))
+    if not match:
+        return None
+    capacity = float(match.group(1)) * (1000 if (match.group(2) or "").startswith("k") else 1)
+    return capacity if capacity > 0 else None
+
+
+def tank_work_type(tank_type) -> str:
+    """Template key for a tank type: "Septic" and "Septic Tank" are both "Septic Tank"."""
+    name = re.sub(r"\s+tank$", "", str(tank_type or "").strip(), flags=re.IGNORECASE).strip()
+    return f"{name if name and name.lower() != 'tank' else 'Water'} Tank"
+
+
+def size_band(capacity: float, tank_type: str):
+    """(min_hours, max_hours) for a tank of this capacity and type."""
+    factor = next((f for key, f in TANK_TYPE_FACTORS.items() if key in str(tank_type or "").lower()), 1.0)
+    for limit, low, high in TANK_SIZE_BANDS:
+        if limit is None or capacity < limit:
+            return low * factor, high * factor
+
+
+def fit_size_band(wbs: dict, capacity: float, tank_type: str) -> dict:
+    """Scales execution hours proportionally when their total falls outside the size band."""
+    steps = [s for s in wbs.get("execution", []) if isinstance(s, dict) and isinstance(s.get("estimated_hours"), (int, float))]
+    total = sum(s["estimated_hours"] for s in steps)
+    if not total:
+        return wbs
+    low, high = size_band(capacity, tank_type)
+    target = min(max(total, low), high)
+    if target != total:
+        for step in steps:
+            step["estimated_hours"] = round(step["estimated_hours"] * target / total, 1)
+    return wbs
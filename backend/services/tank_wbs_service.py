@@ -1,142 +1,166 @@
-import google.generativeai as genai
-import json
-import time
 import logging
+from services.llm_provider import bind_model
+from services.prompt_utils import compact_json
+from services.llm_client import RateLimiter, generate_text
+from services import progress
+from services.schemas import CompactWBSEntry, NumbersWBSEntry, TankWBSEntry, accepts, decode_keyed
+from services.tank_tiers import TANK_REFERENCE_CAPACITY, apply_wbs_tier, fit_size_band, parse_capacity, row_tier, split_service_tier, tank_work_type
+from services.verbosity import DEFAULT_LEVEL, normalize_verbosity
+from services.wbs_templates import template_index
 
 logger = logging.getLogger(__name__)
 
+# Prompt sections; each verbosity level sends only the sections its output contract needs
+PROMPT_INTRO = """Role: Senior Tank Cleaning & Sanitation Project Manager.
+Task: Create a 5-Stage Work Breakdown Structure (WBS) for TANK CLEANING operations with OPTIMIZED safety and execution timelines.
+
+INPUT: ITEMS is a JSON list of {"w": work name, "q": total quantity with unit, "t": tank type, "c": capacity in liters}.
+Each item is a reference tank of its type; plans for other capacities are scaled from it.
+Plan each tank for the standard SEMI-AUTOMATIC method (electric pumps, vacuum sludge extraction, pressure washing);
+manual and fully automatic service levels are derived from this plan.
+
+"""
+PLANNING_SECTION = """1. planning: [
+   - Safety risk assessment
+   - Site access evaluation
+   - Confined space entry permit requirements
+   - Water supply & drainage planning
+   - Waste disposal arrangement
+   - Team briefing & PPE checklist
+   - Emergency response protocol setup
+]
+
+"""
+PROCUREMENT_SECTION = """2. procurement: [
+   - Cleaning chemicals (disinfectants, detergents, degreasers)
+   - Safety equipment (harnesses, gas detectors, ventilation fans)
+   - Cleaning tools (pumps, brushes, pressure washers)
+   - PPE (gloves, boots, masks, coveralls)
+   - Water quality testing kits
+   - Waste disposal containers
+   - First aid & emergency equipment
+]
+
+"""
+EXECUTION_SECTIONS = {
+    "full": """3. execution: [{"step": integer, "activity": "string (Specific tank cleaning step)", "estimated_hours": number (Total hours for this specific tank/quantity), "setup_hours": number (Part of estimated_hours that does not grow with tank size: setup, permits, gas testing, inspection, certification), "safety_requirements": "string (Required safety measures)", "optimization_note": "string (How to execute efficiently while maintaining safety)"}]
+
+""",
+    "lean": """3. execution: [{"step": integer, "activity": "string (Specific tank cleaning step)", "estimated_hours": number (Total hours for this specific tank/quantity), "setup_hours": number (Part of estimated_hours that does not grow with tank size: setup, permits, gas testing, inspection, certification)}]
+
+""",
+}
+EXECUTION_STEPS = """STANDARD TANK CLEANING EXECUTION STEPS:
+- Step 1: Site setup & safety barrier installation
+- Step 2: Initial inspection & documentation
+- Step 3: Water evacuation/draining
+- Step 4: Sludge removal & extraction
+- Step 5: Interior surface scrubbing/pressure washing
+- Step 6: Disinfection & sanitization (chlorination)
+- Step 7: Final rinse & flushing
+- Step 8: Water quality testing
+- Step 9: Tank refilling
+- Step 10: Final inspection & certification
+
+"""
+QC_SECTION = """4. qc: [
+   - Pre-cleaning water quality test (pH, TDS, bacteria count)
+   - Sludge depth measurement
+   - Surface cleanliness inspection (visual & touch)
+   - Chlorine residual level check
+   - Post-cleaning water quality test (bacteriological analysis)
+   - Structural integrity check (cracks, leaks)
+   - Overflow & drainage system functionality
+   - Final certification & documentation
+]
+
+"""
+BILLING_SECTION = """5. billing: [
+   - Advance payment: 20% (on work order)
+   - After water evacuation & sludge removal: 30%
+   - After cleaning & disinfection completion: 30%
+   - Final payment after water quality test clearance: 20%
+   - Include itemized breakdown (labor, chemicals, equipment, disposal)
+]
+
+"""
+SAFETY_SECTION = """SAFETY & COMPLIANCE CONSIDERATIONS:
+- Confined space entry protocols (for underground/overhead tanks)
+- Gas detection (H2S, CO, O2 levels) before entry
+- Minimum 2-person team for confined spaces
+- Ventilation requirements (air changes per hour)
+- Emergency rescue equipment standby
+- Local municipal water authority guidelines
+- IS standards for potable water (IS 10500:2012)
+
+"""
+ESTIMATION_GUIDELINES = """ESTIMATION GUIDELINES:
+- Small tanks (<2000L): 4-6 hours
+- Medium tanks (2000-10000L): 6-10 hours
+- Large tanks (>10000L): 10-16 hours
+- Septic tanks: Add 30% time for sludge handling
+- Industrial tanks: Add 50% time for specialized cleaning
+
+"""
+OUTPUT_SECTIONS = {
+    "full": """OUTPUT FORMAT:
+Return a JSON list with one object per item; set "w" to the exact input "w" value:
+[{"w": "Overhead Water Tank 1000L", "planning": [...], "procurement": [...], "execution": [...], "qc": [...], "billing": [...]}]""",
+    "numbers": """OUTPUT FORMAT:
+Return a JSON list with one object per item; set "w" to the exact input "w" value:
+[{"w": "Overhead Water Tank 1000L", "procurement": [...], "execution": [...]}]""",
+}
+SYSTEM_PROMPTS = {
+    "full": (
+        PROMPT_INTRO + "TANK CLEANING WBS FRAMEWORK - FOR EACH ITEM, PROVIDE:\n\n" + PLANNING_SECTION + PROCUREMENT_SECTION
+        + EXECUTION_SECTIONS["full"] + EXECUTION_STEPS + QC_SECTION + BILLING_SECTION + SAFETY_SECTION
+        + ESTIMATION_GUIDELINES + OUTPUT_SECTIONS["full"]
+    ),
+    "compact": (
+        PROMPT_INTRO + "TANK CLEANING WBS FRAMEWORK - FOR EACH ITEM, PROVIDE (at most 3 short entries per list):\n\n"
+        + PLANNING_SECTION + PROCUREMENT_SECTION + EXECUTION_SECTIONS["lean"] + EXECUTION_STEPS + QC_SECTION
+        + BILLING_SECTION + ESTIMATION_GUIDELINES + OUTPUT_SECTIONS["full"]
+    ),
+    "numbers": (
+        PROMPT_INTRO + "TANK CLEANING WBS FRAMEWORK - FOR EACH ITEM, PROVIDE ONLY procurement and execution:\n\n"
+        + PROCUREMENT_SECTION + EXECUTION_SECTIONS["lean"] + EXECUTION_STEPS + ESTIMATION_GUIDELINES
+        + OUTPUT_SECTIONS["numbers"]
+    ),
+}
+RESPONSE_MODELS = {"full": TankWBSEntry, "compact": CompactWBSEntry, "numbers": NumbersWBSEntry}
+
 class TankWBSService:
-    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite"):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
-        self.config = genai.types.GenerationConfig(
-            temperature=0.1,
-            max_output_tokens=8192,
-            response_mime_type="application/json"
-        )
+    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite", verbosity: str = DEFAULT_LEVEL):
+        self.verbosity = normalize_verbosity(verbosity)
+        self.response_model = RESPONSE_MODELS[self.verbosity]
+        self.model = bind_model("wbs", api_key, model_name, SYSTEM_PROMPTS[self.verbosity])
+        self.rate_limiter = RateLimiter(api_key)
+        self.config = {
+            "temperature": 0.1,
+            "max_output_tokens": 8192,
+            "response_mime_type": "application/json",
+            "response_schema": list[self.response_model],
+        }
         self.BATCH_SIZE = 5
 
-    def clean_json(self, raw_text: str):
-        try:
-            clean_text = raw_text.replace("```json", "").replace("```", "").strip()
-            return json.loads(clean_text)
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON Parse Error: {e}")
-            logger.error(f"Faulty Text: {raw_text[:500]}...") 
-            return {}
+    def batch_prompt(self, items_batch: list) -> str:
+        payload = [
+            {"w": item["work_name"], "q": item["total_qty"], "t": item["tank_type"], "c": item["capacity"]}
+            for item in items_batch
+        ]
+        return f"ITEMS:{compact_json(payload)}"
 
     def generate_wbs_batch(self, items_batch: list) -> dict:
-        prompt = f"""
-        Role: Senior Tank Cleaning & Sanitation Project Manager.
-        
-        Task: Create a 5-Stage Work Breakdown Structure (WBS) for TANK CLEANING operations with OPTIMIZED safety and execution timelines.
-        
-        INPUT ITEMS (Tank Cleaning Work & Specifications):
-        {json.dumps(items_batch, indent=2)}
-
-        TANK CLEANING WBS FRAMEWORK:
-        
-        FOR EACH TANK CLEANING ITEM, PROVIDE:
-        
-        1. planning: [
-              - Safety risk assessment
-              - Site access evaluation
-              - Confined space entry permit requirements
-              - Water supply & drainage planning
-              - Waste disposal arrangement
-              - Team briefing & PPE checklist
-              - Emergency response protocol setup
-           ]
-        
-        2. procurement: [
-              - Cleaning chemicals (disinfectants, detergents, degreasers)
-              - Safety equipment (harnesses, gas detectors, ventilation fans)
-              - Cleaning tools (pumps, brushes, pressure washers)
-              - PPE (gloves, boots, masks, coveralls)
-              - Water quality testing kits
-              - Waste disposal containers
-              - First aid & emergency equipment
-           ]
-        
-        3. execution: [
-              {{
-                "step": integer,
-                "activity": "string (Specific tank cleaning step)",
-                "estimated_hours": number (Total hours for this specific tank/quantity),
-                "safety_requirements": "string (Required safety measures)",
-                "optimization_note": "string (How to execute efficiently while maintaining safety)"
-              }}
-           ]
-           
-           STANDARD TANK CLEANING EXECUTION STEPS:
-           - Step 1: Site setup & safety barrier installation
-           - Step 2: Initial inspection & documentation
-           - Step 3: Water evacuation/draining
-           - Step 4: Sludge removal & extraction
-           - Step 5: Interior surface scrubbing/pressure washing
-           - Step 6: Disinfection & sanitization (chlorination)
-           - Step 7: Final rinse & flushing
-           - Step 8: Water quality testing
-           - Step 9: Tank refilling
-           - Step 10: Final inspection & certification
-        
-        4. qc: [
-              - Pre-cleaning water quality test (pH, TDS, bacteria count)
-              - Sludge depth measurement
-              - Surface cleanliness inspection (visual & touch)
-              - Chlorine residual level check
-              - Post-cleaning water quality test (bacteriological analysis)
-              - Structural integrity check (cracks, leaks)
-              - Overflow & drainage system functionality
-              - Final certification & documentation
-           ]
-        
-        5. billing: [
-              - Advance payment: 20% (on work order)
-              - After water evacuation & sludge removal: 30%
-              - After cleaning & disinfection completion: 30%
-              - Final payment after water quality test clearance: 20%
-              - Include itemized breakdown (labor, chemicals, equipment, disposal)
-           ]
-
-        SAFETY & COMPLIANCE CONSIDERATIONS:
-        - Confined space entry protocols (for underground/overhead tanks)
-        - Gas detection (H2S, CO, O2 levels) before entry
-        - Minimum 2-person team for confined spaces
-        - Ventilation requirements (air changes per hour)
-        - Emergency rescue equipment standby
-        - Local municipal water authority guidelines
-        - IS standards for potable water (IS 10500:2012)
-
-        ESTIMATION GUIDELINES:
-        - Small tanks (<2000L): 4-6 hours
-        - Medium tanks (2000-10000L): 6-10 hours
-        - Large tanks (>10000L): 10-16 hours
-        - Septic tanks: Add 30% time for sludge handling
-        - Industrial tanks: Add 50% time for specialized cleaning
-
-        OUTPUT FORMAT:
-        Return a JSON object where keys are the work item names.
-        
-        Example structure:
-        {{
-          "Overhead Water Tank - Complete Cleaning": {{
-            "planning": [...],
-            "procurement": [...],
-            "execution": [...],
-            "qc": [...],
-            "billing": [...]
-          }}
-        }}
-        """
+        prompt = self.batch_prompt(items_batch)
         try:
-            response = self.model.generate_content(prompt, generation_config=self.config)
-            return self.clean_json(response.text)
+            raw_text = generate_text(self.model, prompt, self.config, self.rate_limiter, accepts(self.response_model))
+            return decode_keyed(self.response_model, "w", raw_text)
         except Exception as e:
             logger.error(f"Tank WBS Batch Gen Error: {e}")
             return {}
 
-    def process(self, boq_data: list):
+    def group_tanks(self, boq_data: list):
+        """(one entry per physical tank, tank types with no cached template yet)"""
         work_summary = {}
         for item in boq_data:
             name = item.get("Work", "General")
@@ -154,31 +178,63 @@ class TankWBSService:
                 }
             work_summary[name]["qty"] += qty
         
-        unique_items = [
+        # The service tiers of one tank share a single base WBS; tier deltas are applied per row below
+        base_items = {}
+        for name, v in work_summary.items():
+            base_name, _ = split_service_tier(name)
+            base_items.setdefault(base_name, v)
+
+        # One generation per tank type at the reference capacity; each tank's hours come from
+        # the productivity curves at its own capacity, kept inside the size band for its type
+        pending_types = {}
+        for v in base_items.values():
+            v["work_type"] = tank_work_type(v["tank_type"])
+            if template_index.get(v["work_type"], "liters", self.verbosity) is None and v["work_type"] not in pending_types:
+                pending_types[v["work_type"]] = v
+        return base_items, pending_types
+
+    def batches(self, pending_types: dict) -> list:
+        unique_list = [
             {
-                "work_name": k, 
-                "total_qty": f"{v['qty']} {v['unit']}",
-                "tank_type": v['tank_type'],
-                "capacity": v['capacity']
-            } 
-            for k, v in work_summary.items()
+                "work_name": k,
+                "total_qty": f"{TANK_REFERENCE_CAPACITY} liters",
+                "tank_type": v["tank_type"],
+                "capacity": TANK_REFERENCE_CAPACITY,
+            }
+            for k, v in pending_types.items()
         ]
-        
-        wbs_library = {}
-        unique_list = list(unique_items)
-        
-        logger.info(f"🔧 Processing {len(unique_list)} unique tank cleaning items in batches of {self.BATCH_SIZE}...")
-        
-        for i in range(0, len(unique_list), self.BATCH_SIZE):
-            batch = unique_list[i : i + self.BATCH_SIZE]
+        return [unique_list[i : i + self.BATCH_SIZE] for i in range(0, len(unique_list), self.BATCH_SIZE)]
+
+    def plan(self, boq_data: list) -> list:
+        """The batches process() would send to the model, without sending them."""
+        return self.batches(self.group_tanks(boq_data)[1])
+
+    def process(self, boq_data: list):
+        base_items, pending_types = self.group_tanks(boq_data)
+        batches = self.batches(pending_types)
+
+        logger.info(f"🔧 Processing {len(pending_types)} new tank types ({len(base_items)} unique tanks) in batches of {self.BATCH_SIZE}...")
+
+        progress.begin(len(batches))
+        for batch in batches:
+            progress.checkpoint()
             results = self.generate_wbs_batch(batch)
-            if results: 
-                wbs_library.update(results)
-            time.sleep(1)
+            for item in batch:
+                wbs = results.get(item["work_name"])
+                if isinstance(wbs, dict) and wbs.get("execution"):
+                    template_index.put(item["work_name"], "liters", TANK_REFERENCE_CAPACITY, wbs, self.verbosity)
+            progress.advance()
+
+        wbs_library = {}
+        for base_name, v in base_items.items():
+            capacity = parse_capacity(v["capacity"]) or TANK_REFERENCE_CAPACITY
+            wbs = template_index.instantiate(v["work_type"], "liters", capacity, self.verbosity)
+            if wbs is not None:
+                wbs_library[base_name] = fit_size_band(wbs, capacity, v["tank_type"])
         
         final_output = []
         for row in boq_data:
-            work_key = row.get("Work", "General")
+            work_key, tier = split_service_tier(row.get("Work", "General"))
             
             # Tank-specific defaults
             defaults = {
@@ -223,6 +279,8 @@ class TankWBSService:
             }
             
             wbs_details = wbs_library.get(work_key, defaults)
+            if row.get("Service_Type") or tier:
+                wbs_details = apply_wbs_tier(wbs_details, row_tier(row))
             
             # Tank-specific dimensions format
             dimensions = f"{row.get('Length', 'N/A')}x{row.get('Width', 'N/A')}x{row.get('Height', 'N/A')}m"
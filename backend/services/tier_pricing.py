@@ -0,0 +1,55 @@
+TIERS = ("T1", "T2", "T3")
+# Rates are fetched once at the metro tier; the other tiers are derived from them
+BASE_TIER = "T1"
+
+# (material, labour) multipliers relative to the T1 rate. Materials are traded nationally
+# and move little between cities; labour tracks local wages. The one interior table: the rule
+# engine and derived tiers scale with it, and so does the DSR index via CostService.tier_factors.
+INTERIOR_TIER_FACTORS = {
+    "T1": (1.0, 1.0),
+    "T2": (0.93, 0.80),
+    "T3": (0.87, 0.65),
+}
+
+# Per TankCostService category; certified confined-space labour and disposal stay
+# expensive in smaller towns because the services are scarcer there.
+TANK_TIER_FACTORS = {
+    "Chemicals & Consumables": {"T1": (1.0, 1.0), "T2": (0.95, 0.85), "T3": (0.90, 0.72)},
+    "Safety Equipment": {"T1": (1.0, 1.0), "T2": (0.95, 0.90), "T3": (0.92, 0.85)},
+    "Cleaning Equipment": {"T1": (1.0, 1.0), "T2": (0.90, 0.85), "T3": (0.85, 0.75)},
+    "Labor & Services": {"T1": (1.0, 1.0), "T2": (0.85, 0.75), "T3": (0.75, 0.62)},
+    "Testing & Disposal": {"T1": (1.0, 1.0), "T2": (0.92, 0.90), "T3": (0.88, 0.85)},
+}
+
+
+def derive_tier(pricing: dict, factors: tuple, tier: str) -> dict:
+    """T1 pricing -> pricing for tier, using (material, labour) factors."""
+    if tier == BASE_TIER:
+        return pricing
+    mat_factor, lab_factor = factors
+    return {
+        **pricing,
+        "rate_material": round((pricing.get("rate_material") or 0) * mat_factor, 2),
+        "rate_labor": round((pricing.get("rate_labor") or 0) * lab_factor, 2),
+        "remarks": f"{pricing.get('remarks') or ''} [{tier} from {BASE_TIER} rate]".strip(),
+    }
+
+
+def multi_tier_estimate(service, bom_data: list, tiers=TIERS) -> dict:
+    """
+    Estimates for several city tiers from one pricing pass: the service's price library is
+    built once at BASE_TIER and every tier is rolled up locally with service.tier_factors.
+    """
+    base_library = service.build_price_library(bom_data, BASE_TIER)
+    estimates = {}
+    for tier in tiers:
+        library = {
+            material: derive_tier(pricing, service.tier_factors(material, tier), tier)
+            for material, pricing in base_library.items()
+        }
+        estimates[tier] = service.summarize([service.price_row(row, library) for row in bom_data], tier)
+    return {
+        "base_tier": BASE_TIER,
+        "comparison": {tier: est["project_summary"]["total_cost"] for tier, est in estimates.items()},
+        "tiers": estimates,
+    }
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import tempfile
+from fastapi.responses import JSONResponse
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("LOGICLEAP_MAX_UPLOAD_MB", "25")) * 1024 * 1024)
+# Images are sent inline to the model, which caps inline request data at 20 MB
+MAX_IMAGE_BYTES = int(float(os.getenv("LOGICLEAP_MAX_IMAGE_MB", "20")) * 1024 * 1024)
+SPOOL_BYTES = 1024 * 1024
+CHUNK_BYTES = 256 * 1024
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the {limit // (1024 * 1024)} MB limit")
+        self.limit = limit
+
+
+async def spool_upload(upload, max_bytes: int = MAX_UPLOAD_BYTES):
+    """
+    Copies an UploadFile into a bounded SpooledTemporaryFile chunk by chunk while hashing it.
+    Only SPOOL_BYTES stay in memory; larger uploads roll over to disk.
+    Returns (spooled_file positioned at 0, sha256 hex digest, size in bytes).
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            hasher.update(chunk)
+            spooled.write(chunk)
+    except Exception:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled, hasher.hexdigest(), size
+
+
+class UploadLimitMiddleware:
+    """
+    Rejects oversized uploads from Content-Length before the multipart body is parsed.
+    Plain ASGI rather than @app.middleware("http"): BaseHTTPMiddleware wraps receive()
+    in a way that hides client disconnects from the endpoints behind it.
+    """
+
+    def __init__(self, app, paths=("/generate-boq",), max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.paths = set(paths)
+        # Multipart framing and the other form fields ride on top of the file itself
+        self.max_length = max_bytes + 64 * 1024
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            length = dict(scope["headers"]).get(b"content-length", b"")
+            if length.isdigit() and int(length) > self.max_length:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"Upload exceeds the {self.max_bytes // (1024 * 1024)} MB limit"},
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
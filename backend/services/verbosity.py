@@ -0,0 +1,42 @@
+import copy
+
+# Output detail requested per call, leanest first. "full" is the original output contract;
+# "compact" keeps short narrative lists but no per-step or per-rate notes; "numbers" keeps only
+# what drives quantities and money (procurement list, step hours, rates).
+LEVELS = ("numbers", "compact", "full")
+DEFAULT_LEVEL = "full"
+
+STEP_NOTES = ("optimization_note", "safety_requirements")
+NARRATIVE_LISTS = ("planning", "qc", "billing")
+
+
+def normalize_verbosity(value) -> str:
+    text = str(value or DEFAULT_LEVEL).lower().replace("_", "-")
+    if text.startswith("number"):
+        return "numbers"
+    return text if text in LEVELS else DEFAULT_LEVEL
+
+
+def covering(level: str) -> tuple:
+    """Levels whose output also satisfies level, closest first ("compact" -> compact, full)."""
+    return LEVELS[LEVELS.index(level):]
+
+
+def trim_wbs(wbs: dict, level: str) -> dict:
+    """Drops the fields a richer WBS carries beyond level."""
+    if level == "full":
+        return wbs
+    wbs = copy.deepcopy(wbs)
+    for step in wbs.get("execution", []):
+        if isinstance(step, dict):
+            for field in STEP_NOTES:
+                step.pop(field, None)
+    if level == "numbers":
+        for field in NARRATIVE_LISTS:
+            wbs[field] = []
+    return wbs
+
+
+def result_key_extra(model_name: str, level: str) -> tuple:
+    """Result-cache key extras for a stage run; lean results are cached apart from full ones."""
+    return (model_name,) if level == DEFAULT_LEVEL else (model_name, level)
@@ -1,87 +1,153 @@
-import google.generativeai as genai
-import json
-import time
 import logging
+from collections import Counter
+from services.prompt_utils import compact_json
+from services.model_router import ModelCascade, is_number
+from services.llm_client import RateLimiter, generate_text
+from services import progress
+from services.schemas import CompactWBSEntry, NumbersWBSEntry, WBSEntry, accepts, decode_keyed
+from services.verbosity import DEFAULT_LEVEL, normalize_verbosity
+from services.wbs_templates import normalize_key, reference_qty, split_work_name, template_index
 
 logger = logging.getLogger(__name__)
 
+PROMPT_HEAD = """Role: Senior Construction Project Manager & Scheduler.
+Task: Create a 5-Stage Work Breakdown Structure (WBS) with OPTIMIZED execution timelines.
+
+INPUT: ITEMS is a JSON list of {"w": work type, "q": reference quantity with unit}.
+
+"""
+SETUP_HOURS = '"setup_hours": number (Part of estimated_hours that does not grow with quantity: mobilisation, setup, curing waits, inspection)'
+PROMPT_FIELDS = {
+    "full": """FOR EACH ITEM, PROVIDE:
+1. planning: [Site prep steps]
+2. procurement: [Material list]
+3. execution: [{"step": integer, "activity": "string", "estimated_hours": number (Total hours for this specific quantity), """ + SETUP_HOURS + """, "optimization_note": "string (How to speed this up)"}]
+4. qc: [Quality check parameters]
+5. billing: [Payment milestones]""",
+    "compact": """FOR EACH ITEM, PROVIDE (at most 3 short entries per list):
+1. planning: [Site prep steps]
+2. procurement: [Material list]
+3. execution: [{"step": integer, "activity": "string", "estimated_hours": number (Total hours for this specific quantity), """ + SETUP_HOURS + """}]
+4. qc: [Quality check parameters]
+5. billing: [Payment milestones]""",
+    "numbers": """FOR EACH ITEM, PROVIDE ONLY:
+1. procurement: [Material list]
+2. execution: [{"step": integer, "activity": "string", "estimated_hours": number (Total hours for this specific quantity), """ + SETUP_HOURS + """}]""",
+}
+PROMPT_TAIL = """
+
+OUTPUT: Return a JSON list with one object per item; set "w" to the exact input "w" value."""
+SYSTEM_PROMPTS = {level: PROMPT_HEAD + fields + PROMPT_TAIL for level, fields in PROMPT_FIELDS.items()}
+RESPONSE_MODELS = {"full": WBSEntry, "compact": CompactWBSEntry, "numbers": NumbersWBSEntry}
+
 class WBSService:
-    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite"):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
-        self.config = genai.types.GenerationConfig(
-            temperature=0.1,
-            max_output_tokens=8192,
-            response_mime_type="application/json"
-        )
+    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite", verbosity: str = DEFAULT_LEVEL):
+        self.verbosity = normalize_verbosity(verbosity)
+        self.response_model = RESPONSE_MODELS[self.verbosity]
+        self.cascade = ModelCascade("wbs", api_key, model_name, SYSTEM_PROMPTS[self.verbosity])
+        self.model = self.cascade.model(0)
+        self.rate_limiter = RateLimiter(api_key)
+        self.config = {
+            "temperature": 0.1,
+            "max_output_tokens": 8192,
+            "response_mime_type": "application/json",
+            "response_schema": list[self.response_model],
+        }
         self.BATCH_SIZE = 5
 
-    def clean_json(self, raw_text: str):
-        try:
-            clean_text = raw_text.replace("```json", "").replace("```", "").strip()
-            return json.loads(clean_text)
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON Parse Error: {e}")
-            logger.error(f"Faulty Text: {raw_text[:500]}...") 
-            return {}
+    def is_valid_wbs(self, wbs) -> bool:
+        if not isinstance(wbs, dict):
+            return False
+        steps = wbs.get("execution")
+        return bool(steps) and all(isinstance(s, dict) and is_number(s.get("estimated_hours")) for s in steps)
 
-    def generate_wbs_batch(self, items_batch: list) -> dict:
-        prompt = f"""
-        Role: Senior Construction Project Manager & Scheduler.
-        Task: Create a 5-Stage Work Breakdown Structure (WBS) with OPTIMIZED execution timelines.
-        
-        INPUT ITEMS (Work Name & Total Quantity):
-        {json.dumps(items_batch, indent=2)}
-
-        FOR EACH ITEM, PROVIDE:
-        1. planning: [Site prep steps]
-        2. procurement: [Material list]
-        3. execution: [
-              {{
-                "step": integer,
-                "activity": "string",
-                "estimated_hours": number (Total hours for this specific quantity),
-                "optimization_note": "string (How to speed this up)"
-              }}
-            ]
-        4. qc: [Quality check parameters]
-        5. billing: [Payment milestones]
-
-        OUTPUT: Return a JSON object where keys are the item names.
-        """
+    def batch_prompt(self, items_batch: list) -> str:
+        payload = [{"w": item["work_name"], "q": item["total_qty"]} for item in items_batch]
+        return f"ITEMS:{compact_json(payload)}"
+
+    def generate_wbs_batch(self, items_batch: list, model=None) -> dict:
+        prompt = self.batch_prompt(items_batch)
         try:
-            response = self.model.generate_content(prompt, generation_config=self.config)
-            return self.clean_json(response.text)
+            raw_text = generate_text(model or self.model, prompt, self.config, self.rate_limiter, accepts(self.response_model))
+            return decode_keyed(self.response_model, "w", raw_text)
         except Exception as e:
             logger.error(f"Batch Gen Error: {e}")
             return {}
 
-    def process(self, boq_data: list):
+    def group_work(self, boq_data: list):
+        """(quantity per (project, work name), (work type, unit) pairs with no cached template yet)"""
+        # Quantities are totalled per project so merged portfolio rows keep their own hours
         work_summary = {}
         for item in boq_data:
-            name = item.get("Work", "General")
+            key = (item.get("Project"), item.get("Work", "General"))
             qty = float(item.get("Quantity", 0))
             unit = item.get("Unit", "units")
-            if name not in work_summary:
-                work_summary[name] = {"qty": 0, "unit": unit}
-            work_summary[name]["qty"] += qty
+            if key not in work_summary:
+                work_summary[key] = {"qty": 0, "unit": unit}
+            work_summary[key]["qty"] += qty
 
-        unique_items = [{"work_name": k, "total_qty": f"{v['qty']} {v['unit']}"} for k, v in work_summary.items()]
-        
-        wbs_library = {}
-        unique_list = list(unique_items)
-        
-        logger.info(f"Processing {len(unique_list)} unique items in batches of {self.BATCH_SIZE}...")
+        # Room-specific names share one template per work type and unit ("Kitchen Painting" ~ "Hall
+        # Painting"); templates are stored per unit, so each unit a work type comes in needs its own
+        pending_types = {}
+        for (_, name), v in work_summary.items():
+            _, work_type = split_work_name(name)
+            v["work_type"] = work_type
+            key = normalize_key(work_type, v["unit"])
+            if key not in pending_types and template_index.get(work_type, v["unit"], self.verbosity) is None:
+                pending_types[key] = v
+        return work_summary, pending_types
+
+    def batches(self, pending_types: dict) -> list:
+        # Generated once per work type at a fixed reference quantity; each size is then
+        # derived from the per-activity productivity curves (setup + rate x quantity)
+        # The reply is keyed by name, so a work type asked for in two units is named with its unit
+        units = Counter(v["work_type"] for v in pending_types.values())
+        unique_list = [
+            {
+                "work_name": v["work_type"] if units[v["work_type"]] == 1 else f"{v['work_type']} ({v['unit']})",
+                "work_type": v["work_type"],
+                "unit": v["unit"],
+                "total_qty": f"{reference_qty(v['unit'])} {v['unit']}",
+            }
+            for v in pending_types.values()
+        ]
+        return [unique_list[i : i + self.BATCH_SIZE] for i in range(0, len(unique_list), self.BATCH_SIZE)]
+
+    def plan(self, boq_data: list) -> list:
+        """The batches process() would send to the model, without sending them."""
+        return self.batches(self.group_work(boq_data)[1])
+
+    def process(self, boq_data: list):
+        work_summary, pending_types = self.group_work(boq_data)
+        batches = self.batches(pending_types)
+
+        logger.info(f"Processing {len(pending_types)} new work types ({len(work_summary)} unique items) in batches of {self.BATCH_SIZE}...")
 
-        for i in range(0, len(unique_list), self.BATCH_SIZE):
-            batch = unique_list[i : i + self.BATCH_SIZE]
-            results = self.generate_wbs_batch(batch)
-            if results: wbs_library.update(results)
-            time.sleep(1)
+        progress.begin(len(batches))
+        for batch in batches:
+            progress.checkpoint()
+            # Cheap model first; only work types with unusable output are re-asked of a stronger model
+            results = self.cascade.run(
+                batch,
+                self.generate_wbs_batch,
+                lambda raw, item: raw.get(item["work_name"]) if isinstance(raw, dict) else None,
+                self.is_valid_wbs,
+            )
+            for item, wbs in zip(batch, results):
+                # Templates never expire, so only a usable WBS becomes one
+                if self.is_valid_wbs(wbs):
+                    template_index.put(item["work_type"], item["unit"], reference_qty(item["unit"]), wbs, self.verbosity)
+            progress.advance()
+
+        wbs_library = {}
+        for key, v in work_summary.items():
+            wbs = template_index.instantiate(v["work_type"], v["unit"], v["qty"], self.verbosity)
+            if wbs is not None:
+                wbs_library[key] = wbs
 
         final_output = []
         for row in boq_data:
-            work_key = row.get("Work", "General")
+            work_key = (row.get("Project"), row.get("Work", "General"))
             defaults = { "planning": [], "procurement": [], "execution": [], "qc": [], "billing": [] }
             wbs_details = wbs_library.get(work_key, defaults)
             
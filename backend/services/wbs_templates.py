@@ -0,0 +1,111 @@
+import copy
+import logging
+import re
+from services.state_store import get_store
+from services.verbosity import DEFAULT_LEVEL, covering, trim_wbs
+
+logger = logging.getLogger(__name__)
+
+# Room vocabulary seen in interior BOQs ("<Room> <Work type>"); qualifiers and trailing numbers are optional.
+# Any "<word> Room" ("Guest Room", "Media Room") is a room name too.
+ROOM_QUALIFIERS = r"(?:master|guest|kids|kid's|kids'|children's|common|parents|attached|main|second|small|large|servant's|servant)"
+ROOM_NAMES = [
+    r"bed\s?room", r"living\s?room", r"living", r"drawing\s?room", r"dining\s?room", r"dining",
+    r"kitchen", r"bath\s?room", r"toilet", r"wash\s?room", r"powder\s?room", r"balcony",
+    r"foyer", r"entrance", r"lobby", r"passage", r"corridor", r"study(?:\s?room)?",
+    r"pooja\s?room", r"puja\s?room", r"utility(?:\s?area)?", r"store\s?room", r"hall",
+    r"family\s?lounge", r"lounge", r"terrace", r"office", r"cabin", r"conference\s?room",
+    r"reception", r"pantry", r"dressing(?:\s?room)?", r"wardrobe\s?area", r"staircase",
+    r"hallway", r"hall\s?way", r"servant(?:'?s)?\s?quarters?", r"[a-z']+\s+room", r"kids", r"pooja", r"puja",
+]
+ROOM_PATTERN = re.compile(
+    rf"^\s*(?P<room>(?:{ROOM_QUALIFIERS}\s+)?(?:{'|'.join(ROOM_NAMES)})(?:\s*-?\s*\d+)?)\s*[-:,]?\s+(?P<work>.+)$",
+    re.IGNORECASE,
+)
+
+
+def split_work_name(work_name: str):
+    """'Master Bedroom Plastic Emulsion Painting' -> ('Master Bedroom', 'Plastic Emulsion Painting')"""
+    match = ROOM_PATTERN.match(work_name or "")
+    if not match:
+        return "", (work_name or "").strip()
+    return match.group("room").strip(), match.group("work").strip()
+
+
+# Quantity each work type's WBS is generated at, per unit. Every size of the same work type
+# sends the identical prompt, so one generation (and one cached response) serves them all.
+REFERENCE_QTY = {
+    "sqft": 100, "sft": 100, "sqm": 10, "rft": 50, "rmt": 15, "m": 15, "cum": 5,
+    "nos": 1, "no": 1, "points": 10, "set": 1, "ls": 1, "liters": 5000, "litres": 5000, "l": 5000,
+}
+DEFAULT_REFERENCE_QTY = 100
+
+
+def reference_qty(unit: str) -> float:
+    return REFERENCE_QTY.get((unit or "").strip().lower().rstrip("."), DEFAULT_REFERENCE_QTY)
+
+
+def productivity_curves(wbs: dict, ref_qty: float) -> list:
+    """
+    Per execution step: [fixed setup hours, hours per unit], from the hours the model
+    gave at ref_qty and the part of them it marked as setup_hours.
+    """
+    curves = []
+    for step in wbs.get("execution", []):
+        hours = step.get("estimated_hours") if isinstance(step, dict) else None
+        if not isinstance(hours, (int, float)):
+            curves.append(None)
+            continue
+        setup = step.get("setup_hours")
+        setup = min(max(setup, 0), hours) if isinstance(setup, (int, float)) else 0
+        curves.append([setup, (hours - setup) / ref_qty if ref_qty else 0])
+    return curves
+
+
+def normalize_key(work_type: str, unit: str) -> str:
+    text = re.sub(r"[^a-z0-9]+", " ", (work_type or "").lower()).strip()
+    return f"{text}|{(unit or '').strip().lower()}"
+
+
+class WBSTemplateIndex:
+    """
+    WBS templates keyed by normalized work type and unit, kept in the shared state
+    store so every worker and project reuses them. Each template keeps a productivity
+    curve per execution step (fixed setup + per-unit rate) so hours can be derived for
+    any quantity without another model call.
+    """
+
+    def _key(self, work_type: str, unit: str, verbosity: str) -> str:
+        # Full templates keep the original key so existing entries stay valid
+        prefix = "" if verbosity == DEFAULT_LEVEL else f"{verbosity}:"
+        return f"wbs_tpl:{prefix}{normalize_key(work_type, unit)}"
+
+    def get(self, work_type: str, unit: str, verbosity: str = DEFAULT_LEVEL):
+        """The template at verbosity or any richer level (a full template serves every level)."""
+        store = get_store()
+        for level in covering(verbosity):
+            entry = store.get(self._key(work_type, unit, level))
+            if entry is not None:
+                return entry
+        return None
+
+    def put(self, work_type: str, unit: str, ref_qty: float, wbs: dict, verbosity: str = DEFAULT_LEVEL):
+        entry = {"ref_qty": ref_qty, "wbs": wbs, "curves": productivity_curves(wbs, ref_qty)}
+        get_store().set(self._key(work_type, unit, verbosity), entry)
+
+    def instantiate(self, work_type: str, unit: str, qty: float, verbosity: str = DEFAULT_LEVEL):
+        entry = self.get(work_type, unit, verbosity)
+        if entry is None:
+            return None
+        wbs = copy.deepcopy(entry["wbs"])
+        ref_qty = entry["ref_qty"]
+        # Templates stored before curves existed scale linearly (no setup share)
+        curves = entry.get("curves") or productivity_curves(wbs, ref_qty)
+        if ref_qty and qty:
+            for step, curve in zip(wbs.get("execution", []), curves):
+                if curve is not None:
+                    step["estimated_hours"] = round(curve[0] + curve[1] * qty, 1)
+        return trim_wbs(wbs, verbosity)
+
+
+template_index = WBSTemplateIndex()
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Offline, in-process setup: deterministic rule-based answers and a per-run state store
+os.environ.setdefault("LOGICLEAP_PROVIDER", "rules")
+os.environ.setdefault("LOGICLEAP_STATE_BACKEND", "memory")
+os.environ.setdefault("LOGICLEAP_PROJECT_DB", os.path.join(tempfile.mkdtemp(), "projects.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
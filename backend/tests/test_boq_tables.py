@@ -0,0 +1,27 @@
+from services.boq_tables import map_header, read_tables, rows_from_tables
+from services.schemas import BOQRow
+
+FIELDS = set(BOQRow.model_fields) | {"Item No."}
+
+ITEM_CODE_CSV = b"""Item Code,Description,Unit,Qty
+4.1.2,Vitrified tile flooring,sqft,420
+13.61.1,Plastic emulsion painting,sqft,1850
+9.2.7,Flush door with frame,nos,6
+"""
+
+
+def test_description_column_wins_over_item_code():
+    rows = rows_from_tables(read_tables(ITEM_CODE_CSV, "boq.csv"), BOQRow)
+    assert [row["Work"] for row in rows] == ["Vitrified tile flooring", "Plastic emulsion painting", "Flush door with frame"]
+    assert [row["Quantity"] for row in rows] == [420, 1850, 6]
+
+
+def test_code_and_number_headers_are_never_work():
+    assert "Work" not in map_header(["Item Code", "Qty", "Unit"], FIELDS)
+    assert "Work" not in map_header(["S.No", "Qty", "Unit"], FIELDS - {"Item No."})
+    assert map_header(["Sr No", "Item", "Particulars", "Qty"], FIELDS)["Work"][0] == 2
+
+
+def test_work_column_of_codes_is_rejected():
+    table = [["Item", "Qty", "Unit"], ["4.1.2", "420", "sqft"], ["13.61.1", "1850", "sqft"], ["A-12", "6", "nos"]]
+    assert rows_from_tables([table], BOQRow) is None
@@ -0,0 +1,55 @@
+from services.cost_service import CostService
+from services.llm_client import generate_text, prompt_fingerprint
+from services.llm_provider import LLMProvider
+from services.price_library import PriceLibrary
+from services.schemas import BOMLine, accepts
+from services.state_store import get_store
+
+
+class Replies(LLMProvider):
+    """Answers each call with the next scripted reply."""
+
+    name = "scripted"
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def generate(self, handle, contents, generation_config):
+        self.calls += 1
+        return self.replies.pop(0)
+
+
+GOOD = '[{"material": "Wall putty", "quantity": 40, "unit": "kg", "note": ""}]'
+
+
+def test_malformed_replies_are_not_cached():
+    provider = Replies('[{"material": "Wall pu', GOOD)
+    model = provider.bind("scripted-model", stage="bom")
+    accept = accepts(BOMLine)
+
+    assert generate_text(model, "malformed once", {}, accept=accept).endswith("Wall pu")
+    assert generate_text(model, "malformed once", {}, accept=accept) == GOOD
+    assert generate_text(model, "malformed once", {}, accept=accept) == GOOD
+    assert provider.calls == 2
+
+
+def test_waiting_worker_never_deletes_another_workers_lease(monkeypatch):
+    from services import llm_client
+
+    monkeypatch.setattr(llm_client, "LEASE_TTL", 0.3)
+    model = Replies(GOOD).bind("scripted-model", stage="bom")
+    lease_key = f"lease:{prompt_fingerprint(model, 'leased elsewhere', {})}"
+    store = get_store()
+    store.set(lease_key, "other worker", ttl=60)
+
+    assert generate_text(model, "leased elsewhere", {}, accept=accepts(BOMLine)) == GOOD
+    assert store.get(lease_key) == "other worker"
+
+
+def test_unpriced_materials_are_not_shared():
+    bom = [{"Room": "Store", "Material": "Xyz widget", "Est_Quantity": 3, "Unit": "nos"}]
+    priced = CostService(api_key="test").process(bom, "T1")
+
+    assert priced["line_items"][0]["Subtotal"] == 0
+    assert PriceLibrary("interior").get("T1", "Xyz widget", "nos") is None
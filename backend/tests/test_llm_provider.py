@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from services.llm_provider import GeminiProvider, LLMProvider, ModelHandle
+
+
+def _handle(provider):
+    return ModelHandle(provider, "gemini-2.5-flash", None, "wbs")
+
+
+def test_gemini_clients_are_per_key_and_never_configure_globally():
+    from google.generativeai import client as genai_client
+
+    a = GeminiProvider("key-tenant-a")
+    b = GeminiProvider("key-tenant-b")
+    model_a, model_b = a._model(_handle(a)), b._model(_handle(b))
+
+    assert model_a._client is not model_b._client
+    assert model_a._client._transport._credentials.token == "key-tenant-a"
+    assert model_b._client._transport._credentials.token == "key-tenant-b"
+    assert GeminiProvider("key-tenant-a").clients is a.clients
+    assert not genai_client._client_manager.client_config.get("api_key")
+
+
+def test_gemini_async_client_is_per_event_loop():
+    provider = GeminiProvider("key-tenant-a")
+
+    async def client():
+        return provider.clients.async_client()
+
+    first, second = asyncio.run(client()), asyncio.run(client())
+    assert first is not second
+
+
+def test_llm_provider_is_abstract():
+    with pytest.raises(TypeError):
+        LLMProvider()
@@ -0,0 +1,20 @@
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_unknown_project_fails_before_any_model_work(monkeypatch):
+    created = []
+    monkeypatch.setattr(main, "create_service", lambda *args: created.append(args))
+
+    response = TestClient(main.app).post(
+        "/generate-boq",
+        headers={"X-Gemini-Api-Key": "test"},
+        data={
+            "project_name": "Flat 4B", "project_type": "Interior", "location": "Karnataka",
+            "text_input": "Kitchen 10x8 ft, vitrified flooring", "project_id": "no-such-project",
+        },
+    )
+
+    assert response.status_code == 404
+    assert created == []
@@ -0,0 +1,20 @@
+from services import model_router
+from services.model_router import cascade_for
+
+
+def test_default_cascade_never_reaches_pro(monkeypatch):
+    monkeypatch.delenv("LOGICLEAP_CASCADE_WBS", raising=False)
+    monkeypatch.setattr(model_router, "ALLOW_PREMIUM", False)
+    assert cascade_for("wbs", "gemini-2.5-flash-lite") == ["gemini-2.5-flash-lite", "gemini-2.5-flash"]
+    assert cascade_for("wbs", "gemini-2.5-flash") == ["gemini-2.5-flash"]
+
+
+def test_pro_escalation_is_opt_in(monkeypatch):
+    monkeypatch.delenv("LOGICLEAP_CASCADE_WBS", raising=False)
+    monkeypatch.setattr(model_router, "ALLOW_PREMIUM", True)
+    assert cascade_for("wbs", "gemini-2.5-flash") == ["gemini-2.5-flash", "gemini-2.5-pro"]
+
+
+def test_configured_cascade_is_used_as_given(monkeypatch):
+    monkeypatch.setenv("LOGICLEAP_CASCADE_WBS", "gemini-2.5-flash, gemini-2.5-pro")
+    assert cascade_for("wbs", "gemini-2.5-flash-lite") == ["gemini-2.5-flash", "gemini-2.5-pro"]
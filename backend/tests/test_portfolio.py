@@ -0,0 +1,20 @@
+from services.portfolio_service import PortfolioService
+
+
+def kitchen_painting(quantity):
+    return [{"Item No.": 1, "Work": "Kitchen Painting", "State": "Karnataka", "Quantity": quantity, "Unit": "sqft"}]
+
+
+def test_projects_sharing_a_work_item_are_sized_separately():
+    result = PortfolioService(api_key="test").process([
+        {"project_id": "small", "project_type": "Interior", "boq": kitchen_painting(100)},
+        {"project_id": "large", "project_type": "Interior", "boq": kitchen_painting(1000)},
+    ])
+    small, large = result["projects"]["small"], result["projects"]["large"]
+
+    assert large["project_summary"]["total_cost"] > small["project_summary"]["total_cost"]
+    small_qty = {line["Material"]: line["Est_Quantity"] for line in small["bom"]}
+    large_qty = {line["Material"]: line["Est_Quantity"] for line in large["bom"]}
+    assert small_qty.keys() == large_qty.keys()
+    for material, qty in small_qty.items():
+        assert large_qty[material] == round(qty * 10, 2)
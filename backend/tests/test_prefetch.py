@@ -0,0 +1,33 @@
+from services.prefetch import iter_bom, row_key
+from services.state_store import get_store
+
+
+class CountingBOM:
+    """Explodes each WBS row into one line and counts library builds (the model calls)."""
+
+    def __init__(self):
+        self.builds = []
+
+    def build_library(self, rows):
+        works = [row["Work"] for row in rows]
+        self.builds.append(works)
+        return {work: [{"Material": f"{work} material"}] for work in works}
+
+    def explode_row(self, row, library):
+        return library[row["Work"]]
+
+
+def test_streaming_never_calls_the_model_for_rows_that_left_the_cache():
+    rows = [{"Work": "Stream Hit"}, {"Work": "Stream Miss"}]
+    stage = CountingBOM.__name__
+    store = get_store()
+    hit = [{"Material": "cached"}]
+    store.set(row_key(stage, rows[0], "m"), hit)
+
+    service = CountingBOM()
+    lines = iter_bom(service, rows, "m")
+    # The hit expires after the first pass, before the lines are consumed
+    store.delete(row_key(stage, rows[0], "m"))
+
+    assert list(lines) == [{"Material": "cached"}, {"Material": "Stream Miss material"}]
+    assert service.builds == [["Stream Miss"]]
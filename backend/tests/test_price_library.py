@@ -0,0 +1,17 @@
+from services.price_library import PriceLibrary
+
+RATE = {"rate_material": 395.0, "rate_labor": 12.5}
+
+
+def test_lean_rates_never_serve_a_full_request():
+    PriceLibrary("test-lean", "numbers").put("T1", "Cement OPC 53 grade", "bag", RATE)
+    assert PriceLibrary("test-lean", "full").get("T1", "Cement OPC 53 grade", "bag") is None
+    assert PriceLibrary("test-lean", "compact").get("T1", "Cement OPC 53 grade", "bag") is None
+    assert PriceLibrary("test-lean", "numbers").get("T1", "Cement OPC 53 grade", "bag") == RATE
+
+
+def test_full_rates_serve_every_level():
+    full = {**RATE, "remarks": "OPC 53 grade, delivered"}
+    PriceLibrary("test-full").put("T1", "Cement OPC 53 grade", "bag", full)
+    for level in ("full", "compact", "numbers"):
+        assert PriceLibrary("test-full", level).get("T1", "cement opc 53 grade", "Bag") == full
@@ -0,0 +1,31 @@
+import pytest
+
+from services import progress
+from services.progress import Cancelled, Job, cancel_job
+
+
+def batches(n):
+    progress.begin(n)
+    for _ in range(n):
+        progress.checkpoint()
+        progress.advance()
+    return n
+
+
+def test_cancel_stops_the_job_at_the_next_batch():
+    job = Job("req-cancel", "bom")
+    cancel_job("req-cancel")
+    with pytest.raises(Cancelled):
+        job.run(batches, 3)
+    assert progress.job_state("req-cancel")["status"] == "cancelled"
+
+
+def test_retry_with_the_same_request_id_is_not_cancelled():
+    first = Job("req-retry", "bom")
+    first.cancel()
+    with pytest.raises(Cancelled):
+        first.run(batches, 3)
+
+    assert Job("req-retry", "bom").run(batches, 3) == 3
+    state = progress.job_state("req-retry")
+    assert (state["status"], state["done"], state["total"]) == ("done", 3, 3)
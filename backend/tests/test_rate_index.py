@@ -0,0 +1,21 @@
+from services.rate_index import RateIndex
+
+DSR = [
+    {"code": "4.1.2", "description": "Cement OPC 43 grade", "unit": "bag", "rate material": 370, "rate labor": 12},
+    {"code": "5.22.6", "description": "TMT steel bar 10mm", "unit": "kg", "rate material": 68, "rate labor": 9},
+    {"code": "13.61.1", "description": "Plastic emulsion paint interior", "unit": "litre", "rate material": 240, "rate labor": 0},
+]
+
+
+def test_near_matches_ignore_word_order_and_spacing():
+    index = RateIndex(DSR)
+    assert index.match("OPC cement 43 grade", "Bags")["code"] == "4.1.2"
+    assert index.match("TMT steel bars 10 mm", "kgs")["code"] == "5.22.6"
+    assert index.match("Plastic emulsion paint", "ltr")["code"] == "13.61.1"
+
+
+def test_near_matches_never_cross_a_grade_or_size():
+    index = RateIndex(DSR)
+    assert index.match("Cement OPC 53 grade", "bag") is None
+    assert index.match("TMT steel bar 16mm", "kg") is None
+    assert index.match("TMT steel bar", "kg") is None
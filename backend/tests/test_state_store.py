@@ -0,0 +1,27 @@
+import time
+
+import pytest
+
+from services import state_store
+from services.state_store import MemoryStore, SQLiteStore, StateStore
+
+
+def test_state_store_is_abstract():
+    with pytest.raises(TypeError):
+        StateStore()
+
+
+@pytest.mark.parametrize("make", [MemoryStore, lambda: SQLiteStore(":memory:")], ids=["memory", "sqlite"])
+def test_expired_keys_are_purged_on_write(monkeypatch, make):
+    monkeypatch.setattr(state_store, "PURGE_EVERY", 3)
+    store = make()
+    store.set("expired", 1, ttl=0.01)
+    store.set("kept", 2)
+    time.sleep(0.02)
+    store.set("fresh", 3, ttl=60)
+
+    if isinstance(store, SQLiteStore):
+        keys = {row[0] for row in store._conn().execute("SELECT key FROM kv")}
+    else:
+        keys = set(store._data)
+    assert keys == {"kept", "fresh"}
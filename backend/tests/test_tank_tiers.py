@@ -0,0 +1,24 @@
+import pytest
+
+from services.tank_tiers import parse_capacity, tank_work_type
+
+
+@pytest.mark.parametrize("value, liters", [
+    (5000, 5000), ("5000", 5000), ("5,000 Liters", 5000), ("5000L", 5000),
+    ("12,500 litres", 12500), ("2.5 KL", 2500), ("10000 ltr", 10000),
+])
+def test_parse_capacity(value, liters):
+    assert parse_capacity(value) == liters
+
+
+@pytest.mark.parametrize("value", [None, "", "N/A", "0", "large"])
+def test_parse_capacity_unreadable(value):
+    assert parse_capacity(value) is None
+
+
+@pytest.mark.parametrize("tank_type, work_type", [
+    ("Septic", "Septic Tank"), ("Septic Tank", "Septic Tank"), ("Overhead tank", "Overhead Tank"),
+    ("", "Water Tank"), ("Tank", "Water Tank"), (None, "Water Tank"),
+])
+def test_tank_work_type_never_doubles_tank(tank_type, work_type):
+    assert tank_work_type(tank_type) == work_type
@@ -0,0 +1,47 @@
+import pytest
+
+from services.cost_service import CostService
+from services.rate_index import RateIndex
+from services.tank_cost_service import TankCostService
+from services.tier_pricing import TIERS
+
+BOM = [
+    {"Room": "Kitchen", "Material": "Cement OPC 53 grade", "Est_Quantity": 12, "Unit": "bag"},
+    {"Room": "Kitchen", "Material": "Vitrified tiles 600x600", "Est_Quantity": 180, "Unit": "sqft"},
+    {"Room": "Bedroom", "Material": "Plastic emulsion paint", "Est_Quantity": 9.5, "Unit": "l"},
+    {"Room": "Bedroom", "Material": "Wall putty", "Est_Quantity": 40, "Unit": "kg"},
+]
+
+DSR = [
+    {"code": "4.1.3", "description": "Cement OPC 53 grade", "unit": "bag", "rate material": 395, "rate labor": 12.5},
+]
+
+
+@pytest.fixture
+def service():
+    service = CostService(api_key="test")
+    service.rate_index = RateIndex(DSR)
+    return service
+
+
+@pytest.mark.parametrize("tier", TIERS)
+def test_compare_tiers_matches_single_tier_estimate(service, tier):
+    compared = service.process_tiers(BOM)["comparison"][tier]
+    assert compared == service.process(BOM, tier)["project_summary"]["total_cost"]
+
+
+def test_dsr_and_rule_rates_scale_down_by_tier(service):
+    totals = service.process_tiers(BOM)["comparison"]
+    assert totals["T1"] > totals["T2"] > totals["T3"] > 0
+
+
+TANK_BOM = [{"Tank/Area": "Overhead Tank", "Material": "Sodium hypochlorite solution", "Est_Quantity": 10, "Unit": "L"}]
+TANK_DSR = [{"code": "T-1", "description": "Sodium hypochlorite solution", "unit": "L", "rate material": 100, "rate labor": 20}]
+
+
+@pytest.mark.parametrize("tier", TIERS)
+def test_tank_dsr_items_agree_between_compare_and_single_tier(tier):
+    service = TankCostService(api_key="test")
+    service.rate_index = RateIndex(TANK_DSR)
+    compared = service.process_tiers(TANK_BOM)["comparison"][tier]
+    assert compared == service.process(TANK_BOM, tier)["project_summary"]["total_cost"]
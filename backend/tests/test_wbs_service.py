@@ -0,0 +1,26 @@
+from services.wbs_service import WBSService
+from services.wbs_templates import template_index
+
+
+def boq(*rows):
+    return [{"Item No.": i + 1, "Work": work, "Quantity": qty, "Unit": unit} for i, (work, qty, unit) in enumerate(rows)]
+
+
+def test_one_work_type_in_two_units_gets_a_template_per_unit():
+    rows = WBSService(api_key="test").process(boq(
+        ("Kitchen Texture Painting", 120, "sqft"),
+        ("Hall Texture Painting", 30, "sqm"),
+    ))
+    assert all(row["WBS_Execution"] for row in rows)
+    assert template_index.get("Texture Painting", "sqft") is not None
+    assert template_index.get("Texture Painting", "sqm") is not None
+
+
+def test_unusable_wbs_never_becomes_a_template():
+    service = WBSService(api_key="test")
+    empty = {"planning": [], "procurement": [], "execution": [], "qc": [], "billing": []}
+    service.generate_wbs_batch = lambda items, model=None: {"Stucco Cladding": empty}
+
+    rows = service.process(boq(("Lobby Stucco Cladding", 50, "sqft")))
+    assert rows[0]["WBS_Execution"] == []
+    assert template_index.get("Stucco Cladding", "sqft") is None
@@ -0,0 +1,25 @@
+import pytest
+
+from services.wbs_templates import split_work_name
+
+
+@pytest.mark.parametrize("work_name, room, work", [
+    ("Master Bedroom Plastic Emulsion Painting", "Master Bedroom", "Plastic Emulsion Painting"),
+    ("Guest Room Wooden Flooring", "Guest Room", "Wooden Flooring"),
+    ("Kids Room Wardrobe", "Kids Room", "Wardrobe"),
+    ("Kids' Room - Wardrobe", "Kids' Room", "Wardrobe"),
+    ("Kids Wardrobe", "Kids", "Wardrobe"),
+    ("Servant Room Electrical Points", "Servant Room", "Electrical Points"),
+    ("Servant Quarters Flooring", "Servant Quarters", "Flooring"),
+    ("Hallway Gypsum False Ceiling", "Hallway", "Gypsum False Ceiling"),
+    ("Puja Room Marble Cladding", "Puja Room", "Marble Cladding"),
+    ("Puja Unit Polishing", "Puja", "Unit Polishing"),
+    ("Media Room Acoustic Panelling", "Media Room", "Acoustic Panelling"),
+    ("Bedroom 2: Skirting", "Bedroom 2", "Skirting"),
+])
+def test_split_work_name(work_name, room, work):
+    assert split_work_name(work_name) == (room, work)
+
+
+def test_work_without_a_room_is_kept_whole():
+    assert split_work_name("Plastic Emulsion Painting") == ("", "Plastic Emulsion Painting")